@@ -0,0 +1,124 @@
+"""
+Benchmark the real-time query classifier against the previous implementation
+
+Reports accuracy, false-positive / false-negative rates on the labelled
+corpus in realtime_corpus.jsonl and the per-call cost of each classifier.
+Entries with a "canonical" label are also checked against canonicalize_query,
+so paraphrases that should share a search cache key actually do.
+
+Usage:
+    python benchmarks/realtime_classifier.py [--iterations N]
+"""
+import argparse
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.query import is_realtime_query, canonicalize_query
+
+CORPUS_PATH = Path(__file__).resolve().parent / "realtime_corpus.jsonl"
+
+# Previous implementation (six regexes searched in turn plus a substring scan)
+LEGACY_PATTERNS = [
+    r"(?:what|how) is (?:the )?(?:current|today'?s?|latest|present|right now) (.*?)(?: in | at | for | on )(.*?)(?:\?|$)",
+    r"(?:what|how) (?:is|are) (?:the )?(?:current|today'?s?|latest|present|right now) (.*?)(?:\?|$)",
+    r"what (?:is|are) (?:the )?(?:weather|temperature|forecast) (?:like )?(?:in|at|for) (.*?)(?:\?|$)",
+    r"what time is it(?: in| at) (.*?)(?:\?|$)",
+    r"what is happening(?: in| at) (.*?)(?:\?|$)",
+    r"latest news(?: about| on| in| regarding) (.*?)(?:\?|$)",
+]
+
+def legacy_is_realtime_query(message):
+    """The classifier as it was before the combined pattern"""
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, message, re.IGNORECASE):
+            return True
+
+    keywords = ["weather", "temperature", "current", "today", "now", "latest",
+               "news", "happening", "price", "stock", "score", "forecast"]
+
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in keywords)
+
+def load_corpus(path=CORPUS_PATH):
+    """Load (text, label) pairs"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item["text"], item["realtime"]) for item in map(json.loads, f) if item]
+
+def load_canonical_cases(path=CORPUS_PATH):
+    """Load (text, expected canonical query) pairs"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(item["text"], item["canonical"]) for item in map(json.loads, f) if item.get("canonical")]
+
+def evaluate(classifier, corpus):
+    """Confusion counts and rates for a classifier"""
+    tp = fp = tn = fn = 0
+    false_positives = []
+    false_negatives = []
+    for text, label in corpus:
+        predicted = classifier(text)
+        if predicted and label:
+            tp += 1
+        elif predicted and not label:
+            fp += 1
+            false_positives.append(text)
+        elif not predicted and label:
+            fn += 1
+            false_negatives.append(text)
+        else:
+            tn += 1
+    return {
+        "accuracy": (tp + tn) / len(corpus),
+        "false_positive_rate": fp / (fp + tn) if fp + tn else 0.0,
+        "false_negative_rate": fn / (fn + tp) if fn + tp else 0.0,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+    }
+
+def time_per_call(classifier, corpus, iterations):
+    """Mean time per classification in microseconds"""
+    texts = [text for text, _ in corpus]
+
+    def run():
+        for text in texts:
+            classifier(text)
+
+    seconds = min(timeit.repeat(run, number=iterations, repeat=5))
+    return seconds / (iterations * len(texts)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--verbose", action="store_true", help="List misclassified messages")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"Corpus: {len(corpus)} labelled messages ({sum(label for _, label in corpus)} real-time)\n")
+    print(f"{'classifier':<10} {'accuracy':>9} {'FP rate':>8} {'FN rate':>8} {'us/call':>8}")
+
+    for name, classifier in [("legacy", legacy_is_realtime_query), ("compiled", is_realtime_query)]:
+        result = evaluate(classifier, corpus)
+        cost = time_per_call(classifier, corpus, args.iterations)
+        print(
+            f"{name:<10} {result['accuracy']:>9.1%} {result['false_positive_rate']:>8.1%} "
+            f"{result['false_negative_rate']:>8.1%} {cost:>8.2f}"
+        )
+        if args.verbose:
+            for text in result["false_positives"]:
+                print(f"    FP: {text}")
+            for text in result["false_negatives"]:
+                print(f"    FN: {text}")
+
+    cases = load_canonical_cases()
+    mismatches = [(text, expected, canonicalize_query(text).text) for text, expected in cases]
+    mismatches = [case for case in mismatches if case[1] != case[2]]
+    print(f"\nCanonical keys: {len(cases) - len(mismatches)}/{len(cases)} as expected")
+    for text, expected, actual in mismatches:
+        print(f"    {text!r}: expected {expected!r}, got {actual!r}")
+
+if __name__ == "__main__":
+    main()
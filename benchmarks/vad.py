@@ -0,0 +1,128 @@
+"""
+Benchmark voice-activity detection and silence trimming
+
+For each WAV file (or, without arguments, a set of generated recordings
+with leading/trailing silence and pauses) reports how much audio the VAD
+removes, what the vectorized VAD costs compared to a per-frame Python
+loop, and the transcription CPU time with and without trimming.
+
+Usage:
+    python benchmarks/vad.py [--engine dummy|vosk] [--model PATH] [file.wav ...]
+"""
+import argparse
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from modules.audio import read_wav
+from modules.stt import create_stt_engine
+from modules.vad import detect_speech, trim_silence, to_float, UNVOICED_MARGIN_DB
+
+SAMPLE_RATE = 16000
+
+def loop_speech_frames(samples, sample_rate, energy_threshold_db=-45.0, zcr_threshold=0.25, frame_ms=20):
+    """Frame classification written as a plain Python loop (the unvectorized baseline)"""
+    samples = to_float(samples).tolist()
+    frame_length = int(sample_rate * frame_ms / 1000)
+    flags = []
+    for start in range(0, len(samples) - frame_length + 1, frame_length):
+        frame = samples[start:start + frame_length]
+        energy = sum(x * x for x in frame) / frame_length
+        energy_db = 10.0 * math.log10(max(energy, 1e-10))
+        crossings = sum(1 for a, b in zip(frame, frame[1:]) if (a < 0) != (b < 0))
+        zcr = crossings / (frame_length - 1)
+        flags.append(
+            energy_db >= energy_threshold_db
+            or (energy_db >= energy_threshold_db - UNVOICED_MARGIN_DB and zcr >= zcr_threshold)
+        )
+    return flags
+
+def synthetic_recording(seed, sample_rate=SAMPLE_RATE):
+    """
+    Speech-like test signal: harmonic "vowels" and noisy "fricatives"
+    between stretches of low background noise, as int16 PCM
+    """
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal(0, 0.001, int(sample_rate * rng.uniform(1.0, 3.0)))]
+    for _ in range(rng.integers(3, 7)):
+        duration = rng.uniform(0.6, 2.0)
+        t = np.arange(int(sample_rate * duration)) / sample_rate
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+        parts.append(0.2 * voiced * envelope + rng.normal(0, 0.001, len(t)))
+        parts.append(rng.normal(0, 0.03, int(sample_rate * 0.15)))  # fricative
+        parts.append(rng.normal(0, 0.001, int(sample_rate * rng.uniform(0.2, 1.5))))  # pause
+    parts.append(rng.normal(0, 0.001, int(sample_rate * rng.uniform(1.0, 3.0))))
+    signal = np.clip(np.concatenate(parts), -1, 1)
+    return (signal * 32767).astype(np.int16)
+
+def best_time(func, repeat=5):
+    """Fastest of several runs, in seconds of CPU time"""
+    times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        times.append(time.process_time() - started)
+    return min(times)
+
+def transcribe(engine, samples):
+    stream = engine.create_stream()
+    stream.accept(samples.tobytes())
+    return stream.finish()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", help="16-bit PCM WAV files (default: generated recordings)")
+    parser.add_argument("--engine", default="dummy", help="Transcription engine to time (dummy or vosk)")
+    parser.add_argument("--model", default="models/vosk", help="Model directory for the vosk engine")
+    args = parser.parse_args()
+
+    if args.files:
+        recordings = [(Path(path).name, *read_wav(path)) for path in args.files]
+    else:
+        recordings = [(f"synthetic-{seed}", synthetic_recording(seed), SAMPLE_RATE) for seed in range(5)]
+
+    engine = create_stt_engine(args.engine, args.model)
+    print(f"{'recording':<16} {'audio s':>8} {'speech s':>9} {'removed':>8} {'segs':>5} "
+          f"{'VAD ms':>7} {'loop ms':>8} {'STT full':>9} {'STT trim':>9}")
+
+    totals = {"audio": 0.0, "speech": 0.0, "full": 0.0, "trimmed": 0.0}
+    for name, samples, sample_rate in recordings:
+        result = detect_speech(samples, sample_rate)
+        trimmed, _ = trim_silence(samples, sample_rate)
+        vad_seconds = best_time(lambda: trim_silence(samples, sample_rate))
+        loop_seconds = best_time(lambda: loop_speech_frames(samples, sample_rate), repeat=1)
+
+        # Engines expect audio at their own rate
+        if sample_rate == engine.sample_rate:
+            full_seconds = best_time(lambda: transcribe(engine, samples), repeat=1)
+            trimmed_seconds = best_time(lambda: transcribe(engine, trimmed), repeat=1) + vad_seconds
+        else:
+            full_seconds = trimmed_seconds = float("nan")
+
+        audio = len(samples) / sample_rate
+        speech = result.speech_samples / sample_rate
+        totals["audio"] += audio
+        totals["speech"] += speech
+        totals["full"] += full_seconds
+        totals["trimmed"] += trimmed_seconds
+        print(
+            f"{name:<16} {audio:>8.2f} {speech:>9.2f} {1 - speech / audio:>8.1%} {len(result.segments):>5} "
+            f"{vad_seconds * 1000:>7.2f} {loop_seconds * 1000:>8.1f} {full_seconds:>9.3f} {trimmed_seconds:>9.3f}"
+        )
+
+    removed = totals["audio"] - totals["speech"]
+    print(f"\nRemoved {removed:.2f} of {totals['audio']:.2f} audio seconds ({removed / totals['audio']:.1%})")
+    print(f"Transcription CPU ({engine.name}): {totals['full']:.3f}s untrimmed, "
+          f"{totals['trimmed']:.3f}s trimmed including VAD")
+    if engine.name == "dummy":
+        print("The dummy engine does no real work; use --engine vosk to measure the CPU time saved")
+
+if __name__ == "__main__":
+    main()
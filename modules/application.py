@@ -0,0 +1,102 @@
+"""
+FastAPI application for Voice Avatar Chatbot (served from app.py)
+"""
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, HTMLResponse
+from contextlib import asynccontextmanager
+import traceback
+
+# Import modules
+from modules.config import setup_environment, MAX_JSON_BODY_BYTES
+from modules.logger import get_logger
+from modules.routes import setup_routes  # only this
+from modules.templates.fallback_html import FALLBACK_HTML
+from modules.openai_client import start_openai_client, close_openai_client
+from modules.routes.search import shutdown_search_executor, close_search_cache
+from modules.sessions import load_sessions, close_sessions
+from modules.tokens import load_tokenizer
+from modules.limits import RequestSizeLimitMiddleware
+from modules.routes.main import RequestTimingMiddleware
+from modules.routes.static import STATIC_ASSETS, load_static_assets
+from modules.routes.speech import load_stt_engine, shutdown_stt_executor
+from modules.audio_pool import start_audio_pool, shutdown_audio_pool
+from modules.routes.tts import load_tts_cache
+from modules.static_assets import asset_response
+
+# Setup logger
+logger = get_logger()
+
+# Setup environment
+setup_environment()
+
+# Shared resources created on startup and released on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    await start_openai_client()
+    load_sessions()
+    load_tokenizer()
+    load_static_assets()
+    load_stt_engine()
+    start_audio_pool()
+    load_tts_cache()
+    yield
+    await close_openai_client()
+    shutdown_search_executor()
+    shutdown_stt_executor()
+    shutdown_audio_pool()
+    close_search_cache()
+    close_sessions()
+
+# Initialize FastAPI
+app = FastAPI(title="Voice Avatar Chatbot API", lifespan=lifespan)
+
+# Reject oversized JSON bodies before they are parsed
+app.add_middleware(RequestSizeLimitMiddleware, max_bytes=MAX_JSON_BODY_BYTES)
+
+# Request IDs, request logging and Server-Timing headers
+app.add_middleware(RequestTimingMiddleware)
+
+# Add CORS middleware (added last, so it also wraps the size limit responses)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Conversation-Id", "X-Prompt-Tokens", "X-Request-ID", "Server-Timing"],
+)
+
+# Global exception handler
+@app.exception_handler(Exception)
+async def global_exception_handler(request, exc):
+    """Global exception handler for unhandled exceptions"""
+    logger.error(f"Unhandled exception: {str(exc)}")
+    logger.error(f"Traceback: {traceback.format_exc()}")
+    return JSONResponse(
+        status_code=500,
+        content={"detail": "Internal server error"}
+    )
+
+# Default route for serving the frontend
+@app.api_route("/", methods=["GET", "HEAD"])
+async def root(request: Request):
+    """Serve the main HTML page from memory (304 if the browser's copy is current)"""
+    try:
+        logger.debug("Root endpoint accessed - serving index.html")
+        
+        index = STATIC_ASSETS.index()
+        if index is not None:
+            return asset_response(index, request)
+        
+        logger.info("Static file not found, using embedded HTML")
+        return HTMLResponse(content=FALLBACK_HTML)
+    
+    except Exception as e:
+        logger.error(f"Error serving index.html: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return HTMLResponse(content=FALLBACK_HTML)
+
+# Add routes (imported)
+setup_routes(app)
@@ -0,0 +1,390 @@
+"""
+Audio decoding and resampling for uploaded recordings
+
+Uploads are decoded straight into one preallocated mono int16 array at
+the rate the speech engine wants. WAV files are parsed here and read in
+blocks into a reused buffer (numpy.frombuffer over a memoryview, no
+per-block bytes objects); other formats (webm/opus from browsers, ogg,
+mp3) are piped through ffmpeg. The spooled upload file is never read
+into memory as a whole, so peak memory stays close to the size of the
+decoded result, and it reaches the audio worker processes without being
+copied to disk again (see upload_source).
+"""
+import io
+import os
+import math
+import struct
+import shutil
+import tempfile
+import subprocess
+import threading
+from typing import NamedTuple
+import numpy as np
+
+class AudioDecodeError(ValueError):
+    """The upload is not audio we can decode"""
+
+class AudioTooLongError(AudioDecodeError):
+    """The recording is longer than the configured maximum"""
+
+class DecodedAudio(NamedTuple):
+    samples: np.ndarray  # mono int16
+    sample_rate: int
+    source_rate: int
+
+# Frames read from a WAV file per block
+BLOCK_FRAMES = 65536
+
+# Bytes piped to / read from ffmpeg at a time
+PIPE_CHUNK = 65536
+
+# Seconds ffmpeg decodes past max_seconds, so an over-long recording is
+# detected and rejected like a WAV file instead of being cut short
+FFMPEG_LENGTH_MARGIN = 0.5
+
+# WAVE_FORMAT_* tags
+_PCM = 0x0001
+_IEEE_FLOAT = 0x0003
+_EXTENSIBLE = 0xFFFE
+
+_WAV_DTYPES = {
+    (_PCM, 16): np.dtype("<i2"),
+    (_PCM, 32): np.dtype("<i4"),
+    (_IEEE_FLOAT, 32): np.dtype("<f4"),
+}
+
+# Full-scale value of each sample type
+_SCALE = {"<i2": 32768.0, "<i4": 2147483648.0, "<f4": 1.0}
+
+def _lowpass(cutoff, taps):
+    """Windowed-sinc low-pass FIR kernel; cutoff as a fraction of the input rate"""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+class Resampler:
+    """
+    Streaming sample-rate converter for mono float32 blocks: anti-alias
+    low-pass (when downsampling) followed by linear interpolation. State
+    is carried across blocks, so block boundaries leave no artifacts.
+    """
+
+    def __init__(self, source_rate, target_rate, taps=63):
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.ratio = source_rate / target_rate
+        if source_rate > target_rate:
+            # Keep the band below 90% of the new Nyquist frequency
+            self.kernel = _lowpass(0.45 / self.ratio, taps)
+            self.history = np.zeros(taps - 1, dtype=np.float32)
+            self.delay = (taps - 1) / 2
+        else:
+            self.kernel = None
+            self.delay = 0.0
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.pending_start = 0  # input index of pending[0]
+        self.next_output = 0
+
+    def process(self, block):
+        """Resample the next block; returns the output samples now available"""
+        block = np.asarray(block, dtype=np.float32)
+        if self.kernel is not None:
+            padded = np.concatenate((self.history, block))
+            self.history = padded[len(padded) - len(self.history):]
+            block = np.convolve(padded, self.kernel, mode="valid").astype(np.float32)
+        pending = np.concatenate((self.pending, block)) if len(self.pending) else block
+
+        # Output n sits at input position n * ratio (+ filter delay) and needs
+        # the input samples on both sides of it
+        last = self.pending_start + len(pending) - 1
+        stop = math.ceil((last - self.delay) / self.ratio) if last > self.delay else 0
+        if stop <= self.next_output:
+            self.pending = pending
+            return np.zeros(0, dtype=np.float32)
+
+        positions = np.arange(self.next_output, stop) * self.ratio + (self.delay - self.pending_start)
+        index = positions.astype(np.int64)
+        fraction = (positions - index).astype(np.float32)
+        output = pending[index] * (1 - fraction) + pending[index + 1] * fraction
+
+        self.next_output = stop
+        # Keep input from the left neighbour of the next output on (that may
+        # lie beyond the samples received so far)
+        keep_from = min(int(stop * self.ratio + self.delay) - self.pending_start, len(pending))
+        self.pending = pending[keep_from:]
+        self.pending_start += keep_from
+        return output
+
+    def flush(self):
+        """Output still held back by the filter and interpolation"""
+        return self.process(np.zeros(int(self.delay) + 2, dtype=np.float32))
+
+def resample_pcm16(resampler, pcm):
+    """Resample a chunk of 16-bit little-endian PCM with a (stateful) Resampler"""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32)
+    samples *= 1.0 / 32768.0
+    resampled = resampler.process(samples)
+    output = np.empty(len(resampled), dtype="<i2")
+    _to_int16(resampled, output)
+    return output.tobytes()
+
+def _to_int16(samples, out):
+    """Write float samples in [-1, 1] into an int16 array"""
+    np.multiply(samples, 32767.0, out=samples)
+    np.clip(samples, -32768, 32767, out=samples)
+    out[:] = samples
+
+class _Writer:
+    """Appends converted blocks to the preallocated output array"""
+
+    def __init__(self, length):
+        self.output = np.zeros(length, dtype=np.int16)
+        self.filled = 0
+
+    def write(self, samples):
+        count = min(len(samples), len(self.output) - self.filled)
+        if count > 0:
+            _to_int16(samples[:count], self.output[self.filled:self.filled + count])
+            self.filled += count
+
+def _read_wav_header(file):
+    """
+    Parse the RIFF header up to the data chunk.
+
+    Returns:
+        (dtype, channels, sample_rate, data size in bytes); the file is
+        left positioned at the first sample
+    """
+    header = file.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise AudioDecodeError("Not a WAV file")
+
+    fmt = None
+    while True:
+        chunk = file.read(8)
+        if len(chunk) < 8:
+            raise AudioDecodeError("WAV file has no data chunk")
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            body = file.read(size + (size & 1))
+            if len(body) < 16:
+                raise AudioDecodeError("Invalid WAV format chunk")
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", body[:16])
+            if format_tag == _EXTENSIBLE and len(body) >= 26:
+                # The actual format is the first two bytes of the subformat GUID
+                format_tag = struct.unpack("<H", body[24:26])[0]
+            fmt = (format_tag, channels, sample_rate, bits)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioDecodeError("WAV data before format chunk")
+            format_tag, channels, sample_rate, bits = fmt
+            dtype = _WAV_DTYPES.get((format_tag, bits))
+            if dtype is None or not channels or not sample_rate:
+                raise AudioDecodeError(f"Unsupported WAV encoding (format {format_tag}, {bits} bits)")
+            return dtype, channels, sample_rate, size
+        else:
+            file.seek(size + (size & 1), 1)
+
+def decode_wav(file, target_rate=None, max_seconds=None):
+    """
+    Decode a PCM or float WAV file block by block.
+
+    Args:
+        file: Binary file object (e.g. UploadFile.file), positioned at the start
+        target_rate: Output sample rate (None keeps the file's rate)
+        max_seconds: Reject longer recordings before decoding them
+    """
+    dtype, channels, source_rate, data_size = _read_wav_header(file)
+    frame_size = dtype.itemsize * channels
+    total_frames = data_size // frame_size
+    # Streamed WAVs may declare a placeholder size; trust the file length instead
+    position = file.tell()
+    file_size = file.seek(0, 2)
+    file.seek(position)
+    total_frames = min(total_frames, (file_size - position) // frame_size)
+
+    if max_seconds is not None and total_frames > max_seconds * source_rate:
+        raise AudioTooLongError(f"Recording is longer than {max_seconds:g} seconds")
+
+    target_rate = target_rate or source_rate
+    resampler = Resampler(source_rate, target_rate) if target_rate != source_rate else None
+    writer = _Writer(round(total_frames * target_rate / source_rate))
+    scale = _SCALE[dtype.str]
+
+    buffer = bytearray(BLOCK_FRAMES * frame_size)
+    view = memoryview(buffer)
+    remaining = total_frames * frame_size
+    while remaining > 0:
+        wanted = min(len(buffer), remaining)
+        read = file.readinto(view[:wanted])
+        if not read:
+            break
+        remaining -= read
+        read -= read % frame_size
+        frames = np.frombuffer(view[:read], dtype=dtype).reshape(-1, channels)
+        # One float copy per block: mixdown (or conversion) and scaling
+        if channels == 1:
+            block = frames[:, 0].astype(np.float32)
+        else:
+            block = frames.mean(axis=1, dtype=np.float32)
+        block *= 1.0 / scale
+        writer.write(resampler.process(block) if resampler else block)
+    if resampler:
+        writer.write(resampler.flush())
+    return DecodedAudio(writer.output, target_rate, source_rate)
+
+def decode_with_ffmpeg(file, target_rate, max_seconds=None, ffmpeg="ffmpeg"):
+    """
+    Decode any format ffmpeg understands (webm/opus, ogg, mp3, ...) to mono
+    int16 at target_rate. The upload is piped to ffmpeg in chunks and the
+    output is collected in one growing buffer.
+    """
+    executable = shutil.which(ffmpeg)
+    if executable is None:
+        raise AudioDecodeError("Decoding this audio format requires ffmpeg, which is not installed")
+
+    command = [executable, "-nostdin", "-loglevel", "error", "-i", "pipe:0"]
+    if max_seconds is not None:
+        command += ["-t", str(max_seconds + FFMPEG_LENGTH_MARGIN)]
+    command += ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(target_rate), "pipe:1"]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def feed():
+        try:
+            buffer = bytearray(PIPE_CHUNK)
+            view = memoryview(buffer)
+            while True:
+                read = file.readinto(view)
+                if not read:
+                    break
+                process.stdin.write(view[:read])
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    try:
+        # Feed stdin on a thread so a full stdout pipe cannot deadlock ffmpeg
+        feeder = threading.Thread(target=feed, name="ffmpeg-feed", daemon=True)
+        feeder.start()
+        output = bytearray()
+        while True:
+            chunk = process.stdout.read(PIPE_CHUNK)
+            if not chunk:
+                break
+            output += chunk
+        feeder.join()
+        errors = process.stderr.read().decode("utf-8", "replace").strip()
+        returncode = process.wait()
+    finally:
+        # Interrupted (e.g. by the audio job timeout): do not leave ffmpeg running
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for pipe in (process.stdout, process.stderr):
+            pipe.close()
+    if returncode != 0:
+        raise AudioDecodeError(f"Could not decode audio: {errors or 'ffmpeg failed'}")
+
+    if max_seconds is not None and len(output) // 2 > max_seconds * target_rate:
+        raise AudioTooLongError(f"Recording is longer than {max_seconds:g} seconds")
+    samples = np.frombuffer(output, dtype="<i2", count=len(output) // 2)
+    return DecodedAudio(samples, target_rate, target_rate)
+
+def _is_wav(file):
+    position = file.tell()
+    header = file.read(12)
+    file.seek(position)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+def decode_audio(file, target_rate, max_seconds=None, ffmpeg="ffmpeg"):
+    """
+    Decode an uploaded recording to mono int16 samples at target_rate.
+
+    Args:
+        file: Binary file object, positioned at the start of the recording
+        target_rate: Output sample rate
+        max_seconds: Longest recording accepted
+        ffmpeg: ffmpeg executable used for formats other than WAV
+    """
+    if _is_wav(file):
+        return decode_wav(file, target_rate, max_seconds)
+    return decode_with_ffmpeg(file, target_rate, max_seconds, ffmpeg)
+
+def wav_header(sample_rate, data_size=None, channels=1):
+    """
+    Header of a 16-bit PCM WAV file. Without data_size the sizes are set
+    to their maximum, which players treat as "read until the stream ends".
+    """
+    data_size = 0xFFFFFFFF - 36 if data_size is None else data_size
+    block_align = channels * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", data_size + 36, b"WAVE",
+        b"fmt ", 16, _PCM, channels, sample_rate, sample_rate * block_align, block_align, 16,
+        b"data", data_size,
+    )
+
+def save_upload(file, directory=None):
+    """
+    Copy an uploaded file to a named temporary file in chunks, so a worker
+    process can open it; returns the path (the caller deletes it)
+    """
+    file.seek(0)
+    handle, path = tempfile.mkstemp(prefix="upload-", suffix=".audio", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            shutil.copyfileobj(file, f, PIPE_CHUNK)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+def _in_memory(file):
+    """
+    Whether an upload is held in memory rather than in a file. A
+    SpooledTemporaryFile has no name until it rolls over to disk (its
+    fileno() would force the rollover), and neither has a BytesIO.
+    """
+    return getattr(file, "name", None) is None
+
+def upload_source(file):
+    """
+    Make an upload readable by a worker process without copying it to disk
+    again. Returns (source, temporary path or None), where source is the
+    bytes of an upload held in memory, or a path to the open file on disk
+    where the platform has one (/proc on Linux). Otherwise the upload is
+    copied to a temporary file, which the caller deletes.
+    """
+    file.seek(0)
+    if _in_memory(file):
+        # Small upload: sent through the pool's pipe
+        return file.read(), None
+    try:
+        # Opening this path gives the worker its own read position on the same file
+        path = f"/proc/{os.getpid()}/fd/{file.fileno()}"
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        path = None
+    if path is not None and os.path.exists(path):
+        return path, None
+    path = save_upload(file)
+    return path, path
+
+def read_wav(file):
+    """
+    Read a WAV file as mono int16 samples at its own rate.
+
+    Args:
+        file: Path or binary file object
+
+    Returns:
+        (samples, sample_rate)
+    """
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as f:
+            return read_wav(f)
+    decoded = decode_wav(file)
+    return decoded.samples, decoded.sample_rate
@@ -0,0 +1,115 @@
+"""
+CPU-bound audio jobs executed in the audio worker processes
+
+This module is imported by the worker processes of modules/audio_pool.py,
+so it must stay cheap to import: no application config, no web framework.
+Each worker builds its own speech engines on first use and keeps
+them until the worker is recycled.
+"""
+import io
+import time
+import signal
+from modules.audio import decode_audio
+from modules.stt import create_stt_engine
+from modules.tts import create_tts_engine
+from modules.vad import trim_silence
+
+# Settings and engine of this worker process (set by init_worker)
+_settings = {}
+_stt_engine = None
+_tts_engine = None
+
+class AudioJobTimeout(Exception):
+    """A job ran longer than its timeout and was interrupted"""
+
+def init_worker(settings):
+    """
+    Worker process initializer
+
+    Args:
+        settings: Dict with stt_engine, model_path, sample_rate, vad_enabled,
+                  vad_params, max_seconds, ffmpeg, tts_engine, tts_sample_rate,
+                  tts_voice and espeak
+    """
+    global _settings
+    _settings = settings
+    # Ctrl+C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def get_stt_engine():
+    """This worker's speech engine, loaded on first use"""
+    global _stt_engine
+    if _stt_engine is None:
+        _stt_engine = create_stt_engine(_settings.get("stt_engine"), _settings.get("model_path"), _settings.get("sample_rate", 16000))
+    return _stt_engine
+
+def get_tts_engine():
+    """This worker's synthesis engine, created on first use"""
+    global _tts_engine
+    if _tts_engine is None:
+        _tts_engine = create_tts_engine(
+            _settings.get("tts_engine"),
+            _settings.get("tts_sample_rate", 22050),
+            _settings.get("tts_voice", "en-us"),
+            _settings.get("espeak", "espeak-ng"),
+        )
+    return _tts_engine
+
+def _raise_timeout(signum, frame):
+    raise AudioJobTimeout("Audio job timed out")
+
+def run_job(func, args, timeout):
+    """
+    Run func(*args) in this worker with a timeout; returns
+    (start time, end time, result) so the parent can tell queue wait from run time
+    """
+    started_at = time.time()
+    if timeout:
+        # Jobs run on the worker's main thread, so a timer signal can interrupt them
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = func(*args)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return started_at, time.time(), result
+
+def warm_up():
+    """Load the engines so the first real job does not pay for it"""
+    get_stt_engine()
+    get_tts_engine()
+    return True
+
+def transcribe_samples(engine, samples):
+    """
+    Trim silence from mono int16 samples at the engine's rate and
+    transcribe the speech that is left
+
+    Returns:
+        (text, number of samples transcribed)
+    """
+    if _settings.get("vad_enabled", True):
+        samples, _ = trim_silence(samples, engine.sample_rate, **_settings.get("vad_params", {}))
+    if not len(samples):
+        return "", 0
+    stream = engine.create_stream()
+    stream.accept(samples.tobytes())
+    return stream.finish(), len(samples)
+
+def transcribe_file(source):
+    """
+    Decode a recording and transcribe it; returns (text, duration, speech duration)
+
+    Args:
+        source: Path of the recording, or its bytes (see modules.audio.upload_source)
+    """
+    engine = get_stt_engine()
+    with (io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")) as f:
+        decoded = decode_audio(f, engine.sample_rate, _settings.get("max_seconds"), _settings.get("ffmpeg", "ffmpeg"))
+    text, speech_samples = transcribe_samples(engine, decoded.samples)
+    return text, len(decoded.samples) / engine.sample_rate, speech_samples / engine.sample_rate
+
+def synthesize_sentence(text, voice, rate):
+    """Synthesize one sentence; returns 16-bit little-endian PCM bytes"""
+    return get_tts_engine().synthesize(text, voice, rate).astype("<i2", copy=False).tobytes()
@@ -0,0 +1,243 @@
+"""
+Process pool for CPU-bound audio work (decoding, VAD, transcription, synthesis)
+
+Audio jobs run in separate worker processes so they neither block the
+event loop nor compete with request handling for the GIL. The pool
+admits a bounded number of jobs (running plus queued) and rejects the
+rest right away, interrupts jobs that exceed their timeout, and replaces
+each worker after a number of jobs so leaks in native speech libraries
+cannot accumulate. Queue wait and run time are exported as metrics.
+"""
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from modules.logger import get_logger
+from modules.config import (
+    AUDIO_POOL_WORKERS,
+    AUDIO_POOL_MAX_QUEUE,
+    AUDIO_POOL_MAX_TASKS_PER_CHILD,
+    AUDIO_JOB_TIMEOUT,
+    AUDIO_QUEUE_TIMEOUT,
+    STT_ENGINE,
+    VOSK_MODEL_PATH,
+    STT_SAMPLE_RATE,
+    VAD_ENABLED,
+    VAD_ENERGY_THRESHOLD_DB,
+    VAD_ZCR_THRESHOLD,
+    VAD_FRAME_MS,
+    VAD_MIN_SPEECH_MS,
+    VAD_MIN_SILENCE_MS,
+    VAD_PADDING_MS,
+    AUDIO_MAX_SECONDS,
+    FFMPEG_PATH,
+    TTS_ENGINE,
+    TTS_SAMPLE_RATE,
+    TTS_VOICE,
+    ESPEAK_PATH,
+)
+from modules.audio_jobs import init_worker, run_job, warm_up, AudioJobTimeout
+from modules.metrics import AUDIO_QUEUE_WAIT_SECONDS, AUDIO_JOB_SECONDS, AUDIO_JOBS
+
+logger = get_logger("audio_pool")
+
+def _worker_context():
+    """
+    Start method for the workers. Forking a process with running threads is
+    unsafe and worker recycling requires a non-fork start method, so workers
+    come from a forkserver that has imported only the job module (new and
+    replacement workers start without importing numpy and the engines again),
+    or are spawned where forkserver is not available.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["modules.audio_jobs"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+class AudioPoolBusy(Exception):
+    """Too many audio jobs are running or queued"""
+
+class AudioPool:
+    """Bounded, self-healing process pool for audio jobs"""
+
+    def __init__(self, max_workers, max_queue, job_timeout, queue_timeout, max_tasks_per_child, settings):
+        """
+        Args:
+            max_workers: Worker processes
+            max_queue: Jobs allowed to wait for a worker; more are rejected
+            job_timeout: Seconds a job may run before it is interrupted
+            queue_timeout: Seconds a job may wait for a worker
+            max_tasks_per_child: Jobs after which a worker is replaced (0 = never)
+            settings: Passed to modules.audio_jobs.init_worker in every worker
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.queue_timeout = queue_timeout
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self.settings = settings
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats_counters = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "restarts": 0,
+        }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=_worker_context(),
+                    initializer=init_worker,
+                    initargs=(self.settings,),
+                    max_tasks_per_child=self.max_tasks_per_child,
+                )
+                logger.info(f"Audio pool started with {self.max_workers} worker processes")
+            return self._executor
+
+    def start(self):
+        """Start the workers and load their engines ahead of the first request"""
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(warm_up)
+
+    def shutdown(self):
+        """Stop the workers (called on application shutdown)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("Audio pool shut down")
+
+    def _reset(self, executor):
+        """Replace a pool whose worker died (e.g. killed for running out of memory)"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.stats_counters["restarts"] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _job_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, name, func, *args, timeout=None):
+        """
+        Run func(*args) in a worker process.
+
+        Args:
+            name: Job name used in metrics, e.g. "transcribe"
+            func: Picklable module-level function
+            timeout: Seconds the job may run (defaults to the pool's job timeout)
+
+        Raises:
+            AudioPoolBusy: The queue is full
+            asyncio.TimeoutError: The job waited or ran too long
+        """
+        timeout = timeout or self.job_timeout
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.stats_counters["rejected"] += 1
+                AUDIO_JOBS.labels(name, "rejected").inc()
+                raise AudioPoolBusy(f"{self._in_flight} audio jobs in progress")
+            self._in_flight += 1
+            self.stats_counters["submitted"] += 1
+
+        executor = self._get_executor()
+        submitted_at = time.time()
+        try:
+            future = executor.submit(run_job, func, args, timeout)
+        except BrokenProcessPool:
+            self._job_done(None)
+            self._reset(executor)
+            raise
+        # Counted until the worker is done, even if the caller gives up earlier
+        future.add_done_callback(self._job_done)
+
+        try:
+            # The worker interrupts the job itself; this only bounds the wait for a worker
+            started_at, finished_at, result = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.queue_timeout + timeout
+            )
+        except (asyncio.TimeoutError, AudioJobTimeout):
+            self.stats_counters["timeouts"] += 1
+            AUDIO_JOBS.labels(name, "timeout").inc()
+            logger.warning(f"Audio job {name} timed out")
+            raise asyncio.TimeoutError(f"Audio job {name} timed out")
+        except BrokenProcessPool:
+            self.stats_counters["errors"] += 1
+            AUDIO_JOBS.labels(name, "error").inc()
+            logger.error("An audio worker process died, restarting the pool")
+            self._reset(executor)
+            raise
+        except Exception:
+            self.stats_counters["errors"] += 1
+            AUDIO_JOBS.labels(name, "error").inc()
+            raise
+
+        self.stats_counters["completed"] += 1
+        AUDIO_JOBS.labels(name, "ok").inc()
+        AUDIO_QUEUE_WAIT_SECONDS.labels(name).observe(max(0.0, started_at - submitted_at))
+        AUDIO_JOB_SECONDS.labels(name).observe(finished_at - started_at)
+        return result
+
+    def stats(self):
+        """Pool configuration, load and job counts"""
+        stats = dict(self.stats_counters)
+        stats.update({
+            "in_flight": self._in_flight,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "job_timeout": self.job_timeout,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "running": self._executor is not None,
+        })
+        return stats
+
+AUDIO_POOL = AudioPool(
+    max_workers=AUDIO_POOL_WORKERS,
+    max_queue=AUDIO_POOL_MAX_QUEUE,
+    job_timeout=AUDIO_JOB_TIMEOUT,
+    queue_timeout=AUDIO_QUEUE_TIMEOUT,
+    max_tasks_per_child=AUDIO_POOL_MAX_TASKS_PER_CHILD,
+    settings={
+        "stt_engine": STT_ENGINE,
+        "model_path": VOSK_MODEL_PATH,
+        "sample_rate": STT_SAMPLE_RATE,
+        "vad_enabled": VAD_ENABLED,
+        "vad_params": {
+            "energy_threshold_db": VAD_ENERGY_THRESHOLD_DB,
+            "zcr_threshold": VAD_ZCR_THRESHOLD,
+            "frame_ms": VAD_FRAME_MS,
+            "min_speech_ms": VAD_MIN_SPEECH_MS,
+            "min_silence_ms": VAD_MIN_SILENCE_MS,
+            "padding_ms": VAD_PADDING_MS,
+        },
+        "max_seconds": AUDIO_MAX_SECONDS,
+        "ffmpeg": FFMPEG_PATH,
+        "tts_engine": TTS_ENGINE,
+        "tts_sample_rate": TTS_SAMPLE_RATE,
+        "tts_voice": TTS_VOICE,
+        "espeak": ESPEAK_PATH,
+    },
+)
+
+def start_audio_pool():
+    """Start the audio worker processes (called on application startup)"""
+    try:
+        AUDIO_POOL.start()
+    except Exception as e:
+        logger.error(f"Could not start audio pool: {str(e)}")
+
+def shutdown_audio_pool():
+    """Stop the audio worker processes (called on application shutdown)"""
+    AUDIO_POOL.shutdown()
@@ -0,0 +1,270 @@
+"""
+Frontend build step: bundle, minify and fingerprint the page scripts
+
+Usage:
+    python -m modules.build_assets [--static-dir static]
+
+Reads the local <script> tags of static/index.html in page order,
+concatenates and minifies those files into static/dist/<name>.<hash>.js
+(plus .gz and, if the brotli package is installed, .br variants), and
+writes static/dist/manifest.json. The server replaces the individual
+script tags with the bundle as long as the manifest's source hashes
+still match the files on disk, so a stale build is never served.
+"""
+import re
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_NAME = "js/bundle.js"
+
+# Local scripts referenced by the page, e.g. <script src="/static/js/app.js?v=3"></script>
+SCRIPT_TAG = re.compile(r'<script\s+src="/static/(?P<path>[^"?#]+\.js)(?:\?[^"#]*)?"\s*>\s*</script>')
+
+# After these characters (or keywords) a "/" starts a regular expression, not a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "instanceof", "yield", "await"}
+
+# Whitespace next to these characters can always be removed
+_TIGHT = set("{}()[];,:=<>?!&|*")
+
+def source_version(body):
+    """Version of a source file, identical to modules.static_assets.Asset.version"""
+    return hashlib.sha256(body).hexdigest()[:12]
+
+def _read_literal(source, start, quote):
+    """Index just past the string literal starting at start"""
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == quote or (char == "\n" and quote != "`"):
+            return i + 1
+        i += 1
+    return i
+
+def _read_regex(source, start):
+    """Index just past the regular expression literal starting at start"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "\n":
+            return i
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            while i < len(source) and (source[i].isalnum() or source[i] == "_"):
+                i += 1
+            return i
+        i += 1
+    return i
+
+def _read_template(source, start):
+    """Index just past the template literal starting at start (handles ${...})"""
+    i = start + 1
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "`":
+            return i + 1
+        if char == "$" and source.startswith("${", i):
+            i = _skip_code(source, i + 2)
+            continue
+        i += 1
+    return i
+
+def _skip_code(source, start):
+    """Index just past the code starting at start up to the closing brace"""
+    depth = 0
+    i = start
+    while i < len(source):
+        char = source[i]
+        if char in "'\"":
+            i = _read_literal(source, i, char)
+            continue
+        if char == "`":
+            i = _read_template(source, i)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            if depth == 0:
+                return i + 1
+            depth -= 1
+        i += 1
+    return i
+
+def _previous_token(output):
+    """Last significant character (or word) written so far"""
+    text = "".join(output[-8:]).rstrip()
+    if not text:
+        return ""
+    match = re.search(r"[A-Za-z_$][\w$]*$", text)
+    return match.group(0) if match else text[-1]
+
+def minify_js(source):
+    """
+    Conservative JavaScript minifier: removes comments and collapses
+    whitespace outside string, template and regex literals. Line breaks are
+    kept where automatic semicolon insertion might depend on them.
+    """
+    output = []
+    i = 0
+    length = len(source)
+    while i < length:
+        char = source[i]
+
+        if char in "'\"":
+            end = _read_literal(source, i, char)
+            output.append(source[i:end])
+            i = end
+        elif char == "`":
+            end = _read_template(source, i)
+            output.append(source[i:end])
+            i = end
+        elif char == "/" and source.startswith("//", i):
+            end = source.find("\n", i)
+            i = length if end == -1 else end
+        elif char == "/" and source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            comment = source[i:length if end == -1 else end + 2]
+            # A comment containing a line break still separates statements
+            output.append("\n" if "\n" in comment else " ")
+            i = length if end == -1 else end + 2
+        elif char == "/":
+            previous = _previous_token(output)
+            if not previous or previous in _REGEX_PRECEDERS or previous in _REGEX_KEYWORDS:
+                end = _read_regex(source, i)
+                output.append(source[i:end])
+                i = end
+            else:
+                output.append(char)
+                i += 1
+        elif char.isspace():
+            end = i
+            while end < length and source[end].isspace():
+                end += 1
+            output.append("\n" if "\n" in source[i:end] else " ")
+            i = end
+        else:
+            output.append(char)
+            i += 1
+
+    return _collapse_whitespace(output)
+
+def _collapse_whitespace(tokens):
+    """
+    Join the tokens, dropping whitespace tokens (" " or "\n") where it is
+    safe. Literal tokens always include their quotes or slashes, so they
+    are never mistaken for whitespace and are copied unchanged.
+    """
+    result = []
+    pending = None
+    for token in tokens:
+        if token in (" ", "\n"):
+            pending = "\n" if token == "\n" or pending == "\n" else " "
+            continue
+        if pending and result:
+            previous = result[-1][-1]
+            following = token[0]
+            if pending == "\n":
+                # Keep line breaks unless the neighbours make the statement boundary unambiguous
+                if previous not in ";{,([" and following not in ")]},;":
+                    result.append("\n")
+            elif (previous in _TIGHT or following in _TIGHT) and not (previous in "+-" and following in "+-"):
+                pass
+            else:
+                result.append(" ")
+        pending = None
+        result.append(token)
+    return "".join(result) + "\n"
+
+def find_page_scripts(index_html):
+    """Local script paths (relative to the static dir) in page order"""
+    return [match.group("path") for match in SCRIPT_TAG.finditer(index_html)]
+
+def write_compressed(path, body):
+    """Write .gz (and .br) variants next to a build artifact"""
+    Path(f"{path}.gz").write_bytes(gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        Path(f"{path}.br").write_bytes(brotli.compress(body, quality=11))
+
+def build(static_dir="static", index_name="index.html"):
+    """Build the script bundle and manifest; returns the manifest"""
+    static_dir = Path(static_dir)
+    index_html = (static_dir / index_name).read_text(encoding="utf-8")
+    sources = find_page_scripts(index_html)
+    if not sources:
+        raise SystemExit(f"No local scripts found in {static_dir / index_name}")
+
+    dist_dir = static_dir / DIST_DIR
+    dist_dir.mkdir(exist_ok=True)
+
+    parts = []
+    source_versions = {}
+    original_size = 0
+    for relative_path in sources:
+        body = (static_dir / relative_path).read_bytes()
+        original_size += len(body)
+        source_versions[relative_path] = source_version(body)
+        # Each file ends its last statement so concatenation cannot merge them
+        parts.append(minify_js(body.decode("utf-8")).rstrip("\n") + ";\n")
+    bundle = "".join(parts).encode("utf-8")
+
+    bundle_hash = hashlib.sha256(bundle).hexdigest()[:12]
+    stem = Path(BUNDLE_NAME).stem
+    bundle_file = f"{DIST_DIR}/{stem}.{bundle_hash}.js"
+
+    # Remove artifacts of earlier builds
+    for old in dist_dir.glob(f"{stem}.*.js*"):
+        old.unlink()
+
+    bundle_path = static_dir / bundle_file
+    bundle_path.write_bytes(bundle)
+    write_compressed(bundle_path, bundle)
+
+    manifest = {
+        "bundles": {
+            BUNDLE_NAME: {
+                "file": bundle_file,
+                "sources": source_versions,
+            }
+        }
+    }
+    (dist_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+
+    gzip_size = len(gzip.compress(bundle, compresslevel=9, mtime=0))
+    print(f"{len(sources)} scripts, {original_size} bytes -> {bundle_file}: "
+          f"{len(bundle)} bytes ({gzip_size} gzipped)")
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bundle, minify and fingerprint the frontend scripts")
+    parser.add_argument("--static-dir", default="static", help="Static files directory (default: static)")
+    args = parser.parse_args(argv)
+    build(args.static_dir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,427 @@
+"""
+Bounded in-memory cache with LRU eviction and TTL expiry
+
+Used in front of upstream calls (search, completions) so repeated
+requests are answered from memory. An optional shared second tier
+(SQLite on disk, or Redis) can sit behind it via TieredCache.
+"""
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from modules.logger import get_logger
+
+logger = get_logger("cache")
+
+def estimate_size(value):
+    """Approximate memory footprint of a cached value in bytes"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str))
+
+class TTLCache:
+    """
+    Thread-safe LRU cache where entries live for the same TTL.
+
+    Two ordered dicts are kept: one in access order for LRU eviction and
+    one in insertion order for expiry. Because the TTL is fixed, insertion
+    order is also expiry order, so expired entries are always at the front
+    and are dropped in amortized O(1) without scanning the whole cache.
+    An entry stored with a shorter TTL (see set) stops being returned when
+    it expires and is dropped once the entries in front of it expire.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, max_bytes=None, size_fn=None, name="cache", stale_ttl=0):
+        """
+        Args:
+            max_entries: Maximum number of entries kept
+            ttl: Time-to-live of an entry in seconds
+            stale_ttl: Extra seconds an expired entry is kept for get_stale()
+            max_bytes: Optional budget for the total estimated size of values
+            size_fn: Function returning the size of a value (defaults to estimate_size)
+            name: Name used in stats and logs
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn or estimate_size
+        self.name = name
+        self.stale_ttl = stale_ttl
+
+        self._entries = OrderedDict()  # key -> (value, expires_at, size), LRU order
+        self._expiry = OrderedDict()   # key -> expires_at + stale_ttl, insertion (= expiry) order
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            # Expired entries may still be held for get_stale()
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, key, default=None):
+        """
+        Return the value for key even if it expired less than stale_ttl
+        seconds ago (e.g. as a fallback when the upstream is slow)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            # Only count values that get() would no longer return
+            if entry[1] <= now:
+                self.stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, evicting least recently used entries if over budget.
+
+        Args:
+            ttl: Seconds the entry lives, capped at the cache's ttl (e.g. the
+                 time a copy from a shared tier has left); defaults to the cache's ttl
+        """
+        now = time.monotonic()
+        size = self.size_fn(value) if self.max_bytes else 0
+
+        with self._lock:
+            self._purge_expired(now)
+            if key in self._entries:
+                self._remove(key)
+
+            # A value larger than the whole budget is never cached
+            if self.max_bytes and size > self.max_bytes:
+                return
+
+            expires_at = now + (self.ttl if ttl is None else min(ttl, self.ttl))
+            self._entries[key] = (value, expires_at, size)
+            self._expiry[key] = expires_at + self.stale_ttl
+            self._total_bytes += size
+
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self._total_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._expiry.clear()
+            self._total_bytes = 0
+
+    def purge_expired(self):
+        """Drop all expired entries"""
+        with self._lock:
+            self._purge_expired(time.monotonic())
+
+    def stats(self):
+        """Cache counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_hits": self.stale_hits,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _purge_expired(self, now):
+        """Pop entries past their stale window from the front of the expiry order (lock held)"""
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def _remove(self, key):
+        """Remove a key from both orders (lock held)"""
+        _, _, size = self._entries.pop(key)
+        del self._expiry[key]
+        self._total_bytes -= size
+
+class CacheBackend:
+    """
+    Interface for a shared second-tier cache (e.g. on-disk or Redis).
+
+    Values must be JSON-serializable. Implementations are blocking and are
+    called off the event loop by TieredCache.
+    """
+
+    name = "backend"
+
+    def get(self, key):
+        """Return the value for key, or None if missing or expired"""
+        raise NotImplementedError
+
+    def get_with_ttl(self, key):
+        """Return (value, seconds until it expires), or None if missing or expired"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        """Store a value for ttl seconds"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove a key if present"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections"""
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    On-disk cache shared by every worker process on the host.
+
+    Uses SQLite in WAL mode so readers in different processes do not block
+    each other, and survives restarts. Expiry uses wall-clock time so all
+    processes agree on it.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, purge_interval=100):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._writes = 0
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)")
+        connection.commit()
+
+    def _connection(self):
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(str(self.path), timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_with_ttl(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        return (json.loads(row[0]), row[1] - now) if row else None
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+        self._writes += 1
+        # Expired rows are removed periodically instead of on every write
+        if self._writes % self.purge_interval == 0:
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        connection.commit()
+
+    def delete(self, key):
+        connection = self._connection()
+        connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        connection.commit()
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+class RedisCacheBackend(CacheBackend):
+    """Cache backend for Redis-compatible servers (requires the redis package)"""
+
+    name = "redis"
+
+    def __init__(self, url, prefix=""):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for the Redis cache backend")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def get_with_ttl(self, key):
+        pipeline = self.client.pipeline()
+        pipeline.get(self.prefix + key)
+        pipeline.pttl(self.prefix + key)
+        value, ttl_ms = pipeline.execute()
+        if value is None:
+            return None
+        # pttl is negative for keys without an expiry
+        return json.loads(value), ttl_ms / 1000 if ttl_ms >= 0 else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def close(self):
+        self.client.close()
+
+def create_cache_backend(kind, path=None, url=None, prefix=""):
+    """
+    Create a second-tier cache backend by name.
+
+    Args:
+        kind: "sqlite", "redis", or "none"/empty for no second tier
+        path: Database file for the sqlite backend
+        url: Server URL for the redis backend
+        prefix: Key prefix for the redis backend
+    """
+    kind = (kind or "none").lower()
+    if kind == "none":
+        return None
+    if kind == "sqlite":
+        return SQLiteCacheBackend(path)
+    if kind == "redis":
+        return RedisCacheBackend(url, prefix=prefix)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+class TieredCache:
+    """
+    In-memory TTLCache in front of an optional shared CacheBackend.
+
+    Lookups try memory first, then the backend (off the event loop); backend
+    hits are promoted into memory for no longer than the backend keeps them.
+    Backend errors are logged and treated as misses so a broken second tier
+    never fails a request.
+    """
+
+    def __init__(self, memory, backend=None):
+        self.memory = memory
+        self.backend = backend
+        self.backend_hits = 0
+        self.backend_misses = 0
+        self.backend_errors = 0
+
+    async def get(self, key):
+        """Return the cached value for key, or None"""
+        value = self.memory.get(key)
+        if value is not None or self.backend is None:
+            return value
+
+        try:
+            found = await asyncio.to_thread(self.backend.get_with_ttl, key)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"{self.backend.name} cache get failed: {str(e)}")
+            return None
+
+        if found is None:
+            self.backend_misses += 1
+            return None
+
+        self.backend_hits += 1
+        value, ttl = found
+        self.memory.set(key, value, ttl)
+        return value
+
+    async def set(self, key, value):
+        """Store a value in every tier"""
+        self.memory.set(key, value)
+        if self.backend is None:
+            return
+        try:
+            await asyncio.to_thread(self.backend.set, key, value, self.memory.ttl)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.warning(f"{self.backend.name} cache set failed: {str(e)}")
+
+    def get_stale(self, key):
+        """
+        Memory-tier lookup that also returns recently expired entries.
+
+        The backend is not consulted: it drops entries when they expire, and a
+        fresh backend entry would already have been found by get(). After a
+        restart, or in another worker, there is no stale value to fall back to.
+        """
+        return self.memory.get_stale(key)
+
+    def close(self):
+        """Close the backend"""
+        if self.backend is not None:
+            self.backend.close()
+
+    def stats(self):
+        """Memory tier stats plus backend counters"""
+        stats = self.memory.stats()
+        stats["backend"] = self.backend.name if self.backend else None
+        stats["backend_hits"] = self.backend_hits
+        stats["backend_misses"] = self.backend_misses
+        stats["backend_errors"] = self.backend_errors
+        return stats
@@ -5,7 +5,7 @@ Configuration module for the Voice Avatar Chatbot
 import os
 import sys
 from dotenv import load_dotenv
-from modules.logger import get_logger
+from modules.logger import get_logger, configure_logging, parse_logger_levels
 
 logger = get_logger("config")
 
@@ -76,13 +76,133 @@ DEBUG = get_env_variable("DEBUG", default="False").lower() in ["true", "1", "yes
 PORT = int(get_env_variable("PORT", default="8000"))
 HOST = get_env_variable("HOST", default="0.0.0.0")
 
+# Re-read changed static files on request (development)
+STATIC_RELOAD = get_env_variable("STATIC_RELOAD", default="True" if DEBUG else "False").lower() in ["true", "1", "yes"]
+
+# Logging configuration
+LOG_LEVEL = get_env_variable("LOG_LEVEL", default="DEBUG" if DEBUG else "INFO")
+# Per-logger overrides, e.g. "routes.chat=DEBUG,cache=WARNING"
+LOG_LEVELS = parse_logger_levels(get_env_variable("LOG_LEVELS", default=""))
+# "text" or "json" (one structured record per line)
+LOG_FORMAT = get_env_variable("LOG_FORMAT", default="text").lower()
+# Fraction of DEBUG records written (1.0 = all)
+LOG_DEBUG_SAMPLE_RATE = float(get_env_variable("LOG_DEBUG_SAMPLE_RATE", default="1.0"))
+
+configure_logging(
+    level=LOG_LEVEL,
+    logger_levels=LOG_LEVELS,
+    json_format=LOG_FORMAT == "json",
+    debug_sample_rate=LOG_DEBUG_SAMPLE_RATE
+)
+
 # OpenAI Configuration
 OPENAI_MODEL = get_env_variable("OPENAI_MODEL", default="gpt-3.5-turbo")
 MAX_TOKENS = int(get_env_variable("MAX_TOKENS", default="500"))
 TEMPERATURE = float(get_env_variable("TEMPERATURE", default="0.7"))
 
+# Total seconds a chat request may take (search + OpenAI) before it is abandoned
+CHAT_REQUEST_DEADLINE = float(get_env_variable("CHAT_REQUEST_DEADLINE", default="45"))
+
+# Exact-match completion cache for repeated conversations (opt-in)
+CHAT_CACHE_ENABLED = get_env_variable("CHAT_CACHE_ENABLED", default="False").lower() in ["true", "1", "yes"]
+CHAT_CACHE_TTL = int(get_env_variable("CHAT_CACHE_TTL", default="3600"))
+CHAT_CACHE_MAX_ENTRIES = int(get_env_variable("CHAT_CACHE_MAX_ENTRIES", default="500"))
+CHAT_CACHE_MAX_BYTES = int(get_env_variable("CHAT_CACHE_MAX_BYTES", default="5242880"))  # 5MB
+
+# Prompt token budget for a chat request (system prompt, search context and
+# history); older turns are dropped when it is exceeded (0 = no limit)
+CHAT_PROMPT_TOKEN_BUDGET = int(get_env_variable("CHAT_PROMPT_TOKEN_BUDGET", default="3000"))
+# Part of the budget used for a short summary of dropped turns (0 = drop silently)
+CHAT_SUMMARY_TOKEN_BUDGET = int(get_env_variable("CHAT_SUMMARY_TOKEN_BUDGET", default="300"))
+# Default /api/chat response body: "full" (OpenAI completion object),
+# "compact" (content and usage) or "passthrough" (upstream bytes as-is)
+CHAT_RESPONSE_MODE = get_env_variable("CHAT_RESPONSE_MODE", default="full")
+# Largest JSON request body accepted by the API, checked before parsing
+MAX_JSON_BODY_BYTES = int(get_env_variable("MAX_JSON_BODY_BYTES", default="262144"))  # 256KB
+
+# Server-side conversation sessions
+SESSION_TTL = int(get_env_variable("SESSION_TTL", default="3600"))
+SESSION_MAX = int(get_env_variable("SESSION_MAX", default="10000"))
+SESSION_MAX_MESSAGES = int(get_env_variable("SESSION_MAX_MESSAGES", default="200"))
+# Append-only log for persisting sessions across restarts (empty = memory only)
+SESSION_LOG_PATH = get_env_variable("SESSION_LOG_PATH", default="")
+
 # Default system message for chat
 DEFAULT_SYSTEM_MESSAGE = get_env_variable(
     "DEFAULT_SYSTEM_MESSAGE", 
     default="You are a helpful, friendly, and intelligent AI assistant."
-)
\ No newline at end of file
+)
+
+# OpenAI HTTP client configuration (shared keep-alive connection pool)
+OPENAI_BASE_URL = get_env_variable("OPENAI_BASE_URL", default="https://api.openai.com")
+OPENAI_POOL_SIZE = int(get_env_variable("OPENAI_POOL_SIZE", default="20"))
+OPENAI_MAX_KEEPALIVE = int(get_env_variable("OPENAI_MAX_KEEPALIVE", default="10"))
+OPENAI_KEEPALIVE_EXPIRY = float(get_env_variable("OPENAI_KEEPALIVE_EXPIRY", default="60"))
+OPENAI_CONNECT_TIMEOUT = float(get_env_variable("OPENAI_CONNECT_TIMEOUT", default="5"))
+OPENAI_READ_TIMEOUT = float(get_env_variable("OPENAI_READ_TIMEOUT", default="30"))
+OPENAI_WRITE_TIMEOUT = float(get_env_variable("OPENAI_WRITE_TIMEOUT", default="10"))
+OPENAI_POOL_TIMEOUT = float(get_env_variable("OPENAI_POOL_TIMEOUT", default="5"))
+
+# Search configuration
+SEARCH_MAX_WORKERS = int(get_env_variable("SEARCH_MAX_WORKERS", default="8"))
+SEARCH_CACHE_TTL = int(get_env_variable("SEARCH_CACHE_TTL", default="300"))
+SEARCH_CACHE_MAX_ENTRIES = int(get_env_variable("SEARCH_CACHE_MAX_ENTRIES", default="1000"))
+SEARCH_CACHE_MAX_BYTES = int(get_env_variable("SEARCH_CACHE_MAX_BYTES", default="10485760"))  # 10MB
+# Seconds an expired result may still be used when search is over its latency budget
+SEARCH_CACHE_STALE_TTL = int(get_env_variable("SEARCH_CACHE_STALE_TTL", default="900"))
+# Seconds chat waits for search before answering without it (0 = wait for search)
+SEARCH_LATENCY_BUDGET = float(get_env_variable("SEARCH_LATENCY_BUDGET", default="1.5"))
+
+# Optional shared second cache tier: "none", "sqlite" or "redis"
+SEARCH_CACHE_BACKEND = get_env_variable("SEARCH_CACHE_BACKEND", default="none")
+SEARCH_CACHE_PATH = get_env_variable("SEARCH_CACHE_PATH", default="cache/search_cache.sqlite3")
+REDIS_URL = get_env_variable("REDIS_URL", default="redis://localhost:6379/0")
+
+# Speech-to-text configuration
+# Transcription engine: "dummy" (deterministic stand-in) or "vosk" (local CPU model)
+STT_ENGINE = get_env_variable("STT_ENGINE", default="dummy")
+VOSK_MODEL_PATH = get_env_variable("VOSK_MODEL_PATH", default="models/vosk")
+# Sample rate of the 16-bit mono PCM the streaming endpoint expects
+STT_SAMPLE_RATE = int(get_env_variable("STT_SAMPLE_RATE", default="16000"))
+STT_MAX_WORKERS = int(get_env_variable("STT_MAX_WORKERS", default="2"))
+# Longest utterance accepted on the streaming endpoint before it is finalized
+STT_MAX_UTTERANCE_SECONDS = float(get_env_variable("STT_MAX_UTTERANCE_SECONDS", default="60"))
+
+# Voice activity detection: silence is trimmed from uploads before transcription
+VAD_ENABLED = get_env_variable("VAD_ENABLED", default="True").lower() in ["true", "1", "yes"]
+# Frame energy (dBFS) above which a frame counts as speech
+VAD_ENERGY_THRESHOLD_DB = float(get_env_variable("VAD_ENERGY_THRESHOLD_DB", default="-45"))
+# Zero-crossing rate above which a slightly quieter frame counts as (unvoiced) speech
+VAD_ZCR_THRESHOLD = float(get_env_variable("VAD_ZCR_THRESHOLD", default="0.25"))
+VAD_FRAME_MS = int(get_env_variable("VAD_FRAME_MS", default="20"))
+VAD_MIN_SPEECH_MS = int(get_env_variable("VAD_MIN_SPEECH_MS", default="120"))
+VAD_MIN_SILENCE_MS = int(get_env_variable("VAD_MIN_SILENCE_MS", default="300"))
+VAD_PADDING_MS = int(get_env_variable("VAD_PADDING_MS", default="150"))
+
+# Audio uploads are decoded and resampled to STT_SAMPLE_RATE mono; formats other than WAV need ffmpeg
+FFMPEG_PATH = get_env_variable("FFMPEG_PATH", default="ffmpeg")
+# Longest recording accepted (bounds the memory used for decoding)
+AUDIO_MAX_SECONDS = float(get_env_variable("AUDIO_MAX_SECONDS", default="300"))
+
+# Process pool for CPU-bound audio work (upload decoding, VAD, transcription, synthesis)
+AUDIO_POOL_WORKERS = int(get_env_variable("AUDIO_POOL_WORKERS", default="2"))
+# Jobs that may wait for a free worker; further jobs are rejected with 503
+AUDIO_POOL_MAX_QUEUE = int(get_env_variable("AUDIO_POOL_MAX_QUEUE", default="8"))
+# Jobs after which a worker process is replaced (0 = never)
+AUDIO_POOL_MAX_TASKS_PER_CHILD = int(get_env_variable("AUDIO_POOL_MAX_TASKS_PER_CHILD", default="100"))
+AUDIO_JOB_TIMEOUT = float(get_env_variable("AUDIO_JOB_TIMEOUT", default="60"))
+AUDIO_QUEUE_TIMEOUT = float(get_env_variable("AUDIO_QUEUE_TIMEOUT", default="30"))
+
+# Text-to-speech configuration
+# Synthesis engine: "tone" (deterministic stand-in) or "espeak" (local espeak-ng)
+TTS_ENGINE = get_env_variable("TTS_ENGINE", default="tone")
+TTS_SAMPLE_RATE = int(get_env_variable("TTS_SAMPLE_RATE", default="22050"))
+TTS_VOICE = get_env_variable("TTS_VOICE", default="en-us")
+ESPEAK_PATH = get_env_variable("ESPEAK_PATH", default="espeak-ng")
+# Sentences synthesized ahead of the one being streamed
+TTS_LOOKAHEAD = int(get_env_variable("TTS_LOOKAHEAD", default="2"))
+TTS_MAX_CHARS = int(get_env_variable("TTS_MAX_CHARS", default="5000"))
+# Disk cache of synthesized responses, so repeated phrases are not synthesized again
+TTS_CACHE_ENABLED = get_env_variable("TTS_CACHE_ENABLED", default="True").lower() in ["true", "1", "yes"]
+TTS_CACHE_DIR = get_env_variable("TTS_CACHE_DIR", default="cache/tts")
+TTS_CACHE_MAX_BYTES = int(get_env_variable("TTS_CACHE_MAX_BYTES", default="268435456"))  # 256MB
@@ -0,0 +1,63 @@
+"""
+Request-scoped deadlines shared by chat, search and the OpenAI call
+"""
+import time
+import httpx
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its deadline"""
+
+class Deadline:
+    """
+    Absolute point in time by which a request must be finished.
+
+    Created once per request and passed down, so every stage (search,
+    OpenAI) only gets the time that is actually left instead of its own
+    fixed timeout.
+    """
+
+    def __init__(self, timeout=None):
+        """
+        Args:
+            timeout: Seconds from now, or None for no deadline
+        """
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + timeout if timeout else None
+
+    def elapsed(self):
+        """Seconds since the deadline was created (i.e. since the request started)"""
+        return time.monotonic() - self.started_at
+
+    def remaining(self):
+        """Seconds left (never negative), or None if there is no deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        """Whether the deadline has passed"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def cap(self, timeout):
+        """The smaller of timeout and the time left (either may be None)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+    def check(self, stage="request"):
+        """Raise DeadlineExceeded if the deadline has passed"""
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def httpx_timeout(self, timeout: httpx.Timeout):
+        """Cap every phase of an httpx timeout by the time left"""
+        return httpx.Timeout(
+            connect=self.cap(timeout.connect),
+            read=self.cap(timeout.read),
+            write=self.cap(timeout.write),
+            pool=self.cap(timeout.pool),
+        )
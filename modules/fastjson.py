@@ -0,0 +1,39 @@
+"""
+Fast JSON encoding and decoding for the hot API paths
+
+Uses orjson when it is installed and falls back to the standard library
+json module otherwise, so the output is the same either way.
+"""
+import json
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def dumps(value) -> bytes:
+    """Serialize a value to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_str(value) -> str:
+    """Serialize a value to a compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONResponse(Response):
+    """JSON response rendered with dumps() instead of FastAPI's encoder"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
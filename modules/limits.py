@@ -0,0 +1,89 @@
+"""
+Request size limits enforced before request bodies are parsed
+"""
+import json
+from modules.logger import get_logger
+
+logger = get_logger("limits")
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject oversized JSON request bodies with 413 before FastAPI reads
+    them into pydantic models.
+
+    A declared Content-Length over the limit is rejected without reading
+    the body. Otherwise (e.g. chunked uploads) the body is read up to the
+    limit and replayed to the application. Only JSON requests are checked,
+    so audio uploads are not buffered here.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes or not self._is_json(scope):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = self._header(scope, b"content-length")
+        if content_length is not None:
+            try:
+                if int(content_length) > self.max_bytes:
+                    await self._reject(scope, send)
+                    return
+            except ValueError:
+                pass
+
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body = message.get("body", b"")
+            size += len(body)
+            if size > self.max_bytes:
+                await self._reject(scope, send)
+                return
+            chunks.append(body)
+            if not message.get("more_body", False):
+                break
+
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # After the body, hand over to the server (disconnect detection)
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    def _is_json(self, scope):
+        content_type = self._header(scope, b"content-type") or ""
+        return "json" in content_type.lower()
+
+    @staticmethod
+    def _header(scope, name):
+        for key, value in scope.get("headers", []):
+            if key == name:
+                return value.decode("latin-1")
+        return None
+
+    async def _reject(self, scope, send):
+        logger.warning(f"Rejected {scope.get('path')}: request body larger than {self.max_bytes} bytes")
+        body = json.dumps({"detail": f"Request body too large (limit {self.max_bytes} bytes)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,40 +1,156 @@
 """
 Logging configuration for the application
+
+Loggers only put records on an in-memory queue; a background listener
+thread formats them and does the console and file I/O, so request
+handlers never block on disk writes. Levels, output format and debug
+sampling are set from modules/config.py via configure_logging().
 """
+import json
+import queue
+import atexit
+import random
 import logging
-import os
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from pathlib import Path
+from modules.tracing import current_request_id
 
 # Create logs directory if it doesn't exist
 Path("logs").mkdir(exist_ok=True)
 
-# Configure root logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
 
-# Create a custom logger
-_logger = logging.getLogger("voice_avatar_chatbot")
-_logger.setLevel(logging.DEBUG)
+# Attributes every LogRecord has; anything else was passed via extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
 
-# Define formatter
-_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Records dropped because the queue was full, or skipped by debug sampling
+LOGGING_STATS = {
+    "dropped": 0,
+    "sampled_out": 0,
+}
 
-# Create console handler
-_console_handler = logging.StreamHandler()
-_console_handler.setFormatter(_formatter)
-_logger.addHandler(_console_handler)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra={...} fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestIdFilter(logging.Filter):
+    """Tag records with the ID of the request being handled ("-" outside requests)"""
+
+    def filter(self, record):
+        record.request_id = current_request_id() or "-"
+        return True
+
+class DebugSampler(logging.Filter):
+    """Pass only a fraction of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            return True
+        LOGGING_STATS["sampled_out"] += 1
+        return False
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records instead of blocking (or raising) when
+    the listener falls behind. The message is merged with its args here
+    (on the caller's thread); everything else happens on the listener thread.
+    """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOGGING_STATS["dropped"] += 1
 
-# Create file handler
+    def prepare(self, record):
+        # Only merge the message; formatting is left to the output handlers
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+# Create a custom logger; it does not propagate to the root logger, so each
+# record is written exactly once
+_logger = logging.getLogger("voice_avatar_chatbot")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+
+# Output handlers, driven by the listener thread
+_console_handler = logging.StreamHandler()
 _file_handler = RotatingFileHandler(
-    "logs/app.log", 
+    "logs/app.log",
     maxBytes=10485760,  # 10MB
     backupCount=5
 )
-_file_handler.setFormatter(_formatter)
-_logger.addHandler(_file_handler)
+for _handler in (_console_handler, _file_handler):
+    _handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+_queue = queue.Queue(maxsize=10000)
+_queue_handler = DroppingQueueHandler(_queue)
+_sampler = DebugSampler()
+_queue_handler.addFilter(_sampler)
+# Runs on the caller's thread, where the request context is available
+_queue_handler.addFilter(RequestIdFilter())
+_logger.addHandler(_queue_handler)
+
+_listener = QueueListener(_queue, _console_handler, _file_handler, respect_handler_level=True)
+_listener.start()
+# Flush whatever is still queued when the process exits
+atexit.register(_listener.stop)
+
+def configure_logging(level="INFO", logger_levels=None, json_format=False, debug_sample_rate=1.0):
+    """
+    Apply logging settings (called from modules/config.py once it is loaded)
+
+    Args:
+        level: Level of the application logger, e.g. "INFO"
+        logger_levels: Levels for child loggers, e.g. {"routes.chat": "DEBUG"}
+        json_format: Write structured JSON lines instead of plain text
+        debug_sample_rate: Fraction of DEBUG records kept (1.0 keeps all)
+    """
+    _logger.setLevel(level.upper())
+    for name, logger_level in (logger_levels or {}).items():
+        _logger.getChild(name).setLevel(logger_level.upper())
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    for handler in (_console_handler, _file_handler):
+        handler.setFormatter(formatter)
+
+    _sampler.rate = debug_sample_rate
+
+def parse_logger_levels(spec):
+    """Parse "routes.chat=DEBUG,cache=WARNING" into a dict"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip()
+    return levels
 
 def get_logger(name=None):
     """
@@ -43,4 +159,4 @@ def get_logger(name=None):
     """
     if name:
         return _logger.getChild(name)
-    return _logger
\ No newline at end of file
+    return _logger
@@ -0,0 +1,177 @@
+"""
+Request metrics in the Prometheus text exposition format
+
+Minimal counters and histograms without external dependencies. Metrics
+are updated from the event loop thread, so an update is a dict lookup and
+a couple of additions, cheap enough for the request path.
+"""
+import math
+from bisect import bisect_left
+
+# Latency buckets in seconds for network-bound stages
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets for in-process work measured in microseconds to milliseconds
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+
+_REGISTRY = []
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    """Base class: a named metric with optional labels, one child per label set"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _REGISTRY.append(self)
+
+    def labels(self, *values, **kwargs):
+        """Return the child for a set of label values"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increment an unlabelled counter"""
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Counts are stored per bucket and made cumulative when rendered
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. latencies in seconds)"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Record a value in an unlabelled histogram"""
+        self.labels().observe(value)
+
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+def render_metrics():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Chat turn stages
+CLASSIFY_SECONDS = Histogram(
+    "chat_classify_seconds", "Time spent classifying a message as a real-time query",
+    buckets=FAST_BUCKETS
+)
+SEARCH_SECONDS = Histogram(
+    "search_seconds", "Time spent answering a search request", ["cache"]
+)
+OPENAI_SECONDS = Histogram(
+    "openai_request_seconds", "Time spent waiting for OpenAI chat completions", ["mode"]
+)
+OPENAI_FIRST_TOKEN_SECONDS = Histogram(
+    "openai_first_token_seconds", "Time until the first streamed token arrived"
+)
+STT_SECONDS = Histogram(
+    "stt_seconds", "Time spent transcribing audio", ["stage"]
+)
+TTS_FIRST_AUDIO_SECONDS = Histogram(
+    "tts_first_audio_seconds", "Time until the first sentence of a text-to-speech response was ready"
+)
+AUDIO_QUEUE_WAIT_SECONDS = Histogram(
+    "audio_queue_wait_seconds", "Time audio jobs waited for a worker process", ["job"]
+)
+AUDIO_JOB_SECONDS = Histogram(
+    "audio_job_seconds", "Time audio jobs ran in a worker process", ["job"]
+)
+REQUEST_SECONDS = Histogram(
+    "chat_request_seconds", "Total chat request time", ["endpoint", "status"]
+)
+
+CACHE_HITS = Counter("cache_hits_total", "Cache hits", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "Cache misses", ["cache"])
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Failed upstream calls", ["upstream", "kind"])
+AUDIO_JOBS = Counter("audio_jobs_total", "Audio jobs by outcome", ["job", "status"])
+TOKENS = Counter("openai_tokens_total", "Tokens used by OpenAI chat completions", ["type"])
@@ -4,14 +4,32 @@
 Pydantic models for request and response validation
 """
 
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 # Define a single message structure (used in chat history)
 class Message(BaseModel):
     role: str  # "user" or "assistant"
     content: str  # The text content of the message
 
-# Define the full chat request expected by the /api/chat endpoint
+# Define the chat request expected by the /api/chat endpoints.
+# Either send the full history in `messages`, or use a server-side session:
+# send only the new turn in `message` plus the `conversation_id` returned by
+# the previous response (omit it to start a new conversation, optionally
+# seeding it with `messages`, e.g. a system prompt).
+# `response_mode` selects the /api/chat response body (defaults to
+# CHAT_RESPONSE_MODE): the full OpenAI completion, a compact
+# {content, finish_reason, usage} object, or the upstream bytes passed through.
 class ChatRequest(BaseModel):
-    messages: List[Message]
+    messages: Optional[List[Message]] = None
+    message: Optional[Message] = None
+    conversation_id: Optional[str] = None
+    response_mode: Optional[Literal["full", "compact", "passthrough"]] = None
+
+# Text-to-speech request for /api/tts. `rate` scales the speaking speed;
+# `format` selects a streamed WAV file or raw 16-bit PCM.
+class TTSRequest(BaseModel):
+    text: str
+    voice: Optional[str] = None
+    rate: float = Field(default=1.0, ge=0.5, le=2.0)
+    format: Literal["wav", "pcm"] = "wav"
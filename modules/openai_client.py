@@ -0,0 +1,80 @@
+"""
+Shared async HTTP client for the OpenAI API
+
+A single keep-alive, connection-pooled httpx.AsyncClient is created at
+application startup and reused by every chat request, so requests never
+block the event loop and do not pay a TCP/TLS handshake each time.
+"""
+import traceback
+import httpx
+from modules.logger import get_logger
+from modules.config import (
+    OPENAI_BASE_URL,
+    OPENAI_POOL_SIZE,
+    OPENAI_MAX_KEEPALIVE,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_CONNECT_TIMEOUT,
+    OPENAI_READ_TIMEOUT,
+    OPENAI_WRITE_TIMEOUT,
+    OPENAI_POOL_TIMEOUT,
+)
+
+logger = get_logger("openai_client")
+
+OPENAI_CHAT_PATH = "/v1/chat/completions"
+
+_client = None
+
+def _create_client():
+    """Create the pooled client from configuration"""
+    return httpx.AsyncClient(
+        base_url=OPENAI_BASE_URL,
+        limits=httpx.Limits(
+            max_connections=OPENAI_POOL_SIZE,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=OPENAI_CONNECT_TIMEOUT,
+            read=OPENAI_READ_TIMEOUT,
+            write=OPENAI_WRITE_TIMEOUT,
+            pool=OPENAI_POOL_TIMEOUT,
+        ),
+    )
+
+def get_openai_client():
+    """
+    Get the shared OpenAI client.
+    Created lazily if the application startup hook has not run (e.g. scripts).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+async def start_openai_client():
+    """Create the shared client and warm a pooled connection"""
+    client = get_openai_client()
+    logger.info(f"OpenAI client started (pool size: {OPENAI_POOL_SIZE})")
+
+    # Warm up: complete the TCP/TLS handshake so the first chat request
+    # reuses an already-open keep-alive connection. The status is irrelevant.
+    try:
+        response = await client.head("/v1/models")
+        logger.debug("OpenAI connection warmed (status %s)", response.status_code)
+    except Exception as e:
+        logger.warning(f"Could not warm OpenAI connection: {str(e)}")
+
+async def close_openai_client():
+    """Close the shared client and its pooled connections"""
+    global _client
+    if _client is None:
+        return
+    try:
+        await _client.aclose()
+        logger.info("OpenAI client closed")
+    except Exception as e:
+        logger.error(f"Error closing OpenAI client: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+    finally:
+        _client = None
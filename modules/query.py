@@ -0,0 +1,208 @@
+"""
+Real-time query detection and canonicalization for search
+"""
+import re
+from typing import Dict, NamedTuple, Optional
+
+# Real-time query patterns as (intent, trigger words, pattern), in priority
+# order. Patterns are matched against the lowercased message; named groups
+# capture the entity. A pattern is only tried when the message contains
+# one of its trigger words as a whole token.
+REAL_TIME_PATTERNS = [
+    ("current_in", {"current", "today", "today's", "todays", "latest", "present", "now"},
+     r"\b(?:what|how)(?:'s| is) (?:the )?(?:current|today'?s?|latest|present|right now) (?P<topic>.*?)(?: in | at | for | on )(?P<place>.*?)(?:\?|$)"),
+    ("current", {"current", "today", "today's", "todays", "latest", "present", "now"},
+     r"\b(?:what|how)(?:'s| is| are) (?:the )?(?:current|today'?s?|latest|present|right now) (?P<topic>.*?)(?:\?|$)"),
+    ("weather_in", {"weather", "temperature", "forecast"},
+     r"\b(?:what|how)(?:'s| is| are) (?:the )?(?P<topic>weather|temperature|forecast) (?:like )?(?:in|at|for) (?P<place>.*?)(?:\?|$)"),
+    ("time_in", {"time"},
+     r"\bwhat time is it(?: in| at) (?P<place>.*?)(?:\?|$)"),
+    ("happening_in", {"happening"},
+     r"\bwhat(?:'s| is) happening(?: in| at) (?P<place>.*?)(?:\?|$)"),
+    ("news_about", {"news"},
+     r"\blatest news(?: about| on| in| regarding) (?P<topic>.*?)(?:\?|$)"),
+    # Keyword intents, matched on whole words only ("now" must not fire on "know")
+    ("weather", {"weather", "temperature", "forecast", "raining", "snowing", "humidity"},
+     r"\b(?:weather|temperature|forecast|raining|snowing|humidity)\b"),
+    ("news", {"news", "headlines", "happening"},
+     r"\b(?:news|headlines|happening)\b"),
+    ("finance", {"stock", "stocks", "price", "prices", "exchange"},
+     r"\b(?:stock|stocks|share price|stock price|exchange rate|price of|prices of)\b"),
+    ("sports", {"score", "scores", "won", "match"},
+     r"\b(?:score|scores)\b(?= (?:of|in|for) | ?\?|$)|\b(?:who won|match result)\b"),
+    # Time-sensitive modifiers only count in a question
+    ("timely", {"now", "today", "tonight", "currently", "moment", "latest", "current", "week"},
+     r"^(?:what|what's|how|who|where|when|which|is|are|will|did|does|do)\b.*?\b(?:right now|today|tonight|currently|at the moment|latest|current|this week)\b"),
+]
+
+# Compact search text built from each intent's captured entity
+SEARCH_TEMPLATES = {
+    "current_in": "{topic} in {place}",
+    "current": "current {topic}",
+    "weather_in": "{topic} in {place}",
+    "time_in": "current time in {place}",
+    "happening_in": "latest news {place}",
+    "news_about": "latest news {topic}",
+}
+
+class QueryClassifier:
+    """
+    Keyword automaton over whole tokens in front of compiled intent patterns.
+
+    The message is lowercased and tokenized once; a trigger-word index maps
+    its tokens to the few intents that could match, and only those patterns
+    run, in priority order. Messages without trigger words (most chat turns)
+    are rejected after a single set intersection.
+    """
+
+    # Punctuation becomes whitespace; apostrophes are kept ("today's")
+    _TOKEN_TABLE = str.maketrans({c: " " for c in "!\"#$%&()*+,-./:;<=>?@[\\]^_`{|}~"})
+
+    def __init__(self, patterns):
+        self.intents = []
+        self.trigger_index = {}
+        for priority, (intent, triggers, pattern) in enumerate(patterns):
+            self.intents.append((intent, re.compile(pattern)))
+            for word in triggers:
+                self.trigger_index.setdefault(word, []).append(priority)
+        self.trigger_words = frozenset(self.trigger_index)
+
+    def match(self, message):
+        """Return (intent, match) for the highest-priority matching intent, or None"""
+        text = message.lower()
+        tokens = self.trigger_words.intersection(text.translate(self._TOKEN_TABLE).split())
+        if not tokens:
+            return None
+
+        candidates = set()
+        for token in tokens:
+            candidates.update(self.trigger_index[token])
+
+        for priority in sorted(candidates):
+            intent, pattern = self.intents[priority]
+            match = pattern.search(text)
+            if match:
+                return intent, match
+        return None
+
+_CLASSIFIER = QueryClassifier(REAL_TIME_PATTERNS)
+
+# Contractions expanded before matching so "what's" and "what is" share a key
+CONTRACTIONS = {
+    "what's": "what is",
+    "whats": "what is",
+    "what're": "what are",
+    "how's": "how is",
+    "hows": "how is",
+    "where's": "where is",
+    "who's": "who is",
+    "when's": "when is",
+    "it's": "it is",
+    "that's": "that is",
+    "there's": "there is",
+    "i'm": "i am",
+    "i'd": "i would",
+    "i've": "i have",
+    "you're": "you are",
+    "isn't": "is not",
+    "aren't": "are not",
+    "don't": "do not",
+    "doesn't": "does not",
+    "can't": "cannot",
+    "won't": "will not",
+}
+
+_CONTRACTION_PATTERN = re.compile(
+    r"\b(" + "|".join(re.escape(c) for c in CONTRACTIONS) + r")\b"
+)
+
+# Conversational filler stripped from the start of a query
+LEADING_STOP_PHRASES = [
+    "hey", "hi", "hello", "ok", "okay", "so", "um", "uh", "well", "please",
+    "can you tell me", "could you tell me", "would you tell me", "tell me",
+    "do you know", "i want to know", "i would like to know", "let me know",
+    "can you check", "could you check", "check",
+]
+
+# Filler stripped from the end of a query or an extracted entity
+TRAILING_STOP_PHRASES = [
+    "please", "right now", "now", "today", "currently", "at the moment", "for me",
+]
+
+_LEADING_PATTERN = re.compile(
+    r"^(?:" + "|".join(re.escape(p) for p in sorted(LEADING_STOP_PHRASES, key=len, reverse=True)) + r")\b\s*"
+)
+_TRAILING_PATTERN = re.compile(
+    r"\s*\b(?:" + "|".join(re.escape(p) for p in sorted(TRAILING_STOP_PHRASES, key=len, reverse=True)) + r")$"
+)
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s'-]+")
+
+class QueryIntent(NamedTuple):
+    intent: str               # name of the matching REAL_TIME_PATTERNS entry
+    entities: Dict[str, str]  # captured groups, e.g. {"topic": "weather", "place": "paris"}
+
+class CanonicalQuery(NamedTuple):
+    text: str                 # compact text used as cache key and sent to search
+    intent: Optional[str]     # name of the matching REAL_TIME_PATTERNS entry
+    entity: Optional[str]     # text extracted from the pattern capture groups
+
+def classify_query(message):
+    """
+    Classify a message as a real-time query.
+    Returns the matched intent and its captured (lowercased) entities, or None.
+    """
+    result = _CLASSIFIER.match(message)
+    if result is None:
+        return None
+
+    intent, match = result
+    entities = {name: value.strip() for name, value in match.groupdict().items() if value}
+    return QueryIntent(intent, entities)
+
+def is_realtime_query(message):
+    """Determine if a message is requesting real-time information"""
+    return _CLASSIFIER.match(message) is not None
+
+def _strip_stop_phrases(text):
+    """Repeatedly remove leading and trailing filler"""
+    previous = None
+    while text != previous:
+        previous = text
+        text = _LEADING_PATTERN.sub("", text).strip(" ,")
+        text = _TRAILING_PATTERN.sub("", text).strip(" ,")
+    return text
+
+def clean_query(query):
+    """Case-fold, expand contractions, drop punctuation and filler"""
+    text = query.casefold().replace("’", "'")
+    text = _CONTRACTION_PATTERN.sub(lambda m: CONTRACTIONS[m.group(1)], text)
+    text = _PUNCTUATION_PATTERN.sub(" ", text)
+    text = " ".join(text.split())
+    return _strip_stop_phrases(text)
+
+def canonicalize_query(query):
+    """
+    Reduce a user utterance to a compact canonical search query.
+
+    "Hey, what's the weather in Paris today?" and "what is the weather in
+    paris" both become "weather in paris".
+    """
+    text = clean_query(query)
+
+    result = classify_query(text)
+    if result and result.intent in SEARCH_TEMPLATES:
+        entities = {name: _strip_stop_phrases(value) for name, value in result.entities.items()}
+        if all(entities.values()):
+            try:
+                canonical_text = SEARCH_TEMPLATES[result.intent].format(**entities)
+                return CanonicalQuery(canonical_text, result.intent, " ".join(entities.values()))
+            except KeyError:
+                pass
+
+    # Nothing extracted: fall back to the cleaned text (or the raw query)
+    intent = result.intent if result else None
+    return CanonicalQuery(text or " ".join(query.lower().split()), intent, None)
+
+def make_cache_key(canonical_text, search_depth):
+    """Cache key for a canonical query at a given search depth"""
+    return f"{search_depth or 'basic'}:{canonical_text}"
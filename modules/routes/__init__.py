@@ -16,12 +16,12 @@ def setup_routes(app: FastAPI):
     """
     try:
         # Import route modules
-        from modules.routes import chat, search, test
+        from modules.routes import chat, search, test, metrics, static
         
         # Try to import text-to-speech module if available
         try:
-            from modules.routes import text_to_speech
-            app.include_router(text_to_speech.router)
+            from modules.routes import tts
+            app.include_router(tts.router)
             logger.info("Text-to-speech routes loaded")
         except ImportError:
             logger.warning("Text-to-speech module not available")
@@ -38,6 +38,8 @@ def setup_routes(app: FastAPI):
         app.include_router(chat.router)
         app.include_router(search.router)
         app.include_router(test.router)
+        app.include_router(metrics.router)
+        app.include_router(static.router)
         
         logger.info("API routes configured successfully")
         return True
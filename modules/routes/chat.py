@@ -3,157 +3,491 @@ Text generation route handlers with OpenAI integration
 """
 
 import json
+import time
+import logging
+import hashlib
 import traceback
-import requests
-import re
+import httpx
 import asyncio
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request
+from fastapi.responses import StreamingResponse, Response
+from typing import NamedTuple, Optional
 from modules.logger import get_logger
-from modules.config import get_openai_key, OPENAI_MODEL, MAX_TOKENS, TEMPERATURE
-from modules.models import ChatRequest
-from modules.routes.search import search, SearchRequest
+from modules.config import (
+    get_openai_key,
+    OPENAI_MODEL,
+    MAX_TOKENS,
+    TEMPERATURE,
+    SEARCH_LATENCY_BUDGET,
+    CHAT_REQUEST_DEADLINE,
+    CHAT_CACHE_ENABLED,
+    CHAT_CACHE_TTL,
+    CHAT_CACHE_MAX_ENTRIES,
+    CHAT_CACHE_MAX_BYTES,
+    CHAT_PROMPT_TOKEN_BUDGET,
+    CHAT_SUMMARY_TOKEN_BUDGET,
+    CHAT_RESPONSE_MODE,
+)
+from modules.models import ChatRequest, Message
+from modules.routes.search import search, SearchRequest, get_stale_search_results
+from modules.sentences import SentenceSplitter, split_sentences
+from modules.query import classify_query
+from modules.openai_client import get_openai_client, OPENAI_CHAT_PATH
+from modules.deadline import Deadline, DeadlineExceeded
+from modules.cache import TTLCache
+from modules.sessions import SESSION_STORE
+from modules.tokens import fit_context_window
+from modules.fastjson import dumps, dumps_str, loads, FastJSONResponse
+from modules.tracing import record_span, span
+from modules.metrics import (
+    CLASSIFY_SECONDS,
+    OPENAI_SECONDS,
+    OPENAI_FIRST_TOKEN_SECONDS,
+    REQUEST_SECONDS,
+    CACHE_HITS,
+    CACHE_MISSES,
+    UPSTREAM_ERRORS,
+    TOKENS,
+)
 
 # Setup API Router
 router = APIRouter()
 logger = get_logger("routes.chat")
 
-# Pattern to detect real-time queries
-REAL_TIME_PATTERNS = [
-    r"(?:what|how) is (?:the )?(?:current|today'?s?|latest|present|right now) (.*?)(?: in | at | for | on )(.*?)(?:\?|$)",
-    r"(?:what|how) (?:is|are) (?:the )?(?:current|today'?s?|latest|present|right now) (.*?)(?:\?|$)",
-    r"what (?:is|are) (?:the )?(?:weather|temperature|forecast) (?:like )?(?:in|at|for) (.*?)(?:\?|$)",
-    r"what time is it(?: in| at) (.*?)(?:\?|$)",
-    r"what is happening(?: in| at) (.*?)(?:\?|$)",
-    r"latest news(?: about| on| in| regarding) (.*?)(?:\?|$)",
-]
-
-def is_realtime_query(message):
-    """Determine if a message is requesting real-time information"""
-    # Check against patterns
-    for pattern in REAL_TIME_PATTERNS:
-        if re.search(pattern, message, re.IGNORECASE):
-            return True
-    
-    # Check keywords
-    keywords = ["weather", "temperature", "current", "today", "now", "latest", 
-               "news", "happening", "price", "stock", "score", "forecast"]
-    
-    message_lower = message.lower()
-    return any(keyword in message_lower for keyword in keywords)
+# Searches that outlived their latency budget and are finishing in the background
+_background_searches = set()
 
-@router.post("/api/chat")
-async def generate_text(request: ChatRequest = Body(...)):
+# Outcome of the search latency budget for chat requests
+SEARCH_BUDGET_STATS = {
+    "within_budget": 0,
+    "over_budget": 0,
+    "stale_served": 0,   # over budget, answered with stale cached results
+    "skipped": 0,        # over budget, answered without search context
+    "failed": 0,
+}
+
+# Upstream work abandoned because the client disconnected or the deadline passed
+CANCELLATION_STATS = {
+    "cancelled_requests": 0,
+    "cancelled_streams": 0,
+    "deadline_exceeded": 0,
+    "tokens_saved_estimate": 0,  # completion tokens not generated (MAX_TOKENS - streamed)
+}
+
+# Exact-match cache of completions, keyed on a hash of the assembled
+# messages and the generation settings. Only used when CHAT_CACHE_ENABLED.
+COMPLETION_CACHE = TTLCache(
+    max_entries=CHAT_CACHE_MAX_ENTRIES,
+    ttl=CHAT_CACHE_TTL,
+    max_bytes=CHAT_CACHE_MAX_BYTES,
+    name="completion"
+)
+
+COMPLETION_CACHE_STATS = {
+    "bypassed": 0,  # real-time queries are never served from the cache
+}
+
+# Prompt sizes after fitting the history into CHAT_PROMPT_TOKEN_BUDGET
+CONTEXT_STATS = {
+    "requests": 0,
+    "prompt_tokens_total": 0,
+    "prompt_tokens_max": 0,
+    "trimmed_requests": 0,
+    "dropped_messages": 0,
+    "summarized_messages": 0,
+}
+
+SYSTEM_PROMPT = (
+    "You are a helpful, friendly AI assistant integrated with a voice interface. "
+    "Always respond in English. Keep responses concise and conversational. "
+    "Be polite, engaging, and informative. Speak as if you're having a natural conversation."
+)
+
+def _finish_background_search(task):
+    """Forget a background search and log how it ended"""
+    _background_searches.discard(task)
+    if task.cancelled():
+        return
+    if task.exception():
+        logger.warning(f"Background search failed: {str(task.exception())}")
+    else:
+        logger.debug("Background search finished, cache warmed")
+
+async def run_search_with_budget(search_request: SearchRequest, deadline: Deadline):
     """
-    Generate text response using OpenAI's GPT API
+    Run a search, but wait at most SEARCH_LATENCY_BUDGET seconds (or until
+    the request deadline) for it.
+
+    If the budget runs out, fall back to stale cached results (or none) and
+    let the search finish in the background so it warms the cache for the
+    next request.
     """
+    started = time.monotonic()
+    search_task = asyncio.ensure_future(search(search_request, deadline))
     try:
-        # Log incoming messages safely
-        safe_messages = [
-            {
-                "role": msg.role,
-                "content": f"{msg.content[:30]}..." if len(msg.content) > 30 else msg.content
-            }
-            for msg in request.messages
-        ]
-        logger.info(f"Generate text request received with {len(request.messages)} messages")
-        logger.debug(f"Messages content: {json.dumps(safe_messages)}")
-
-        # Extract the latest user message
-        latest_user_message = next((msg.content for msg in reversed(request.messages) 
-                                  if msg.role == "user"), None)
+        done, _ = await asyncio.wait({search_task}, timeout=deadline.cap(SEARCH_LATENCY_BUDGET or None))
+    except asyncio.CancelledError:
+        # The chat request was cancelled (client disconnected): stop the search too
+        search_task.cancel()
+        raise
+    elapsed_ms = (time.monotonic() - started) * 1000
+    record_span("search", elapsed_ms / 1000)
+
+    if search_task in done:
+        SEARCH_BUDGET_STATS["within_budget"] += 1
+        logger.info("Search completed in %.0fms (budget %.0fms)", elapsed_ms, SEARCH_LATENCY_BUDGET * 1000)
+        return search_task.result()
+
+    # Over budget: keep a reference so the task is not garbage collected
+    SEARCH_BUDGET_STATS["over_budget"] += 1
+    _background_searches.add(search_task)
+    search_task.add_done_callback(_finish_background_search)
+
+    stale_results = get_stale_search_results(search_request)
+    if stale_results is not None:
+        SEARCH_BUDGET_STATS["stale_served"] += 1
+        logger.info("Search over budget after %.0fms, using stale cached results", elapsed_ms)
+    else:
+        SEARCH_BUDGET_STATS["skipped"] += 1
+        logger.info("Search over budget after %.0fms, answering without search context", elapsed_ms)
+    return stale_results
+
+async def get_search_results(request: ChatRequest, deadline: Deadline):
+    """
+    Run a search for the latest user message if it asks for real-time information.
+    Returns the search results (or None) and whether the message is real-time.
+    """
+    # Extract the latest user message
+    latest_user_message = next((msg.content for msg in reversed(request.messages) 
+                              if msg.role == "user"), None)
+    
+    # If we have a user message, check if it requires real-time information
+    search_results = None
+    started = time.perf_counter()
+    query_intent = classify_query(latest_user_message) if latest_user_message else None
+    elapsed = time.perf_counter() - started
+    CLASSIFY_SECONDS.observe(elapsed)
+    record_span("classify", elapsed)
+    if query_intent:
+        logger.info("Detected real-time query (%s): %s", query_intent.intent, latest_user_message)
+        try:
+            # IMPORTANT CHANGE: Call search function directly instead of making HTTP request
+            search_request = SearchRequest(query=latest_user_message)
+            search_results = await run_search_with_budget(search_request, deadline)
+        except Exception as e:
+            SEARCH_BUDGET_STATS["failed"] += 1
+            logger.error(f"Error performing search: {str(e)}")
+
+    return search_results, query_intent is not None
+
+def get_openai_headers():
+    """Build the OpenAI request headers, failing if the API key is missing"""
+    # Load OpenAI API key
+    openai_key = get_openai_key()
+    if not openai_key:
+        logger.error("OpenAI API key not found")
+        raise HTTPException(
+            status_code=500,
+            detail="OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable."
+        )
+
+    return {
+        "Authorization": f"Bearer {openai_key}",
+        "Content-Type": "application/json"
+    }
+
+def build_messages(request: ChatRequest, search_results):
+    """
+    Assemble the messages sent to OpenAI: system prompt, optional search
+    context and the conversation history, trimmed to the prompt token budget.
+    Returns a ContextWindow with the messages and their token count.
+    """
+    # Prepare the messages list with a system prompt
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        }
+    ]
+
+    # If we have search results, add them as context
+    if search_results and "organic" in search_results and search_results["organic"]:
+        search_context = "I've searched for real-time information and found these results:\n\n"
         
-        # If we have a user message, check if it requires real-time information
-        search_results = None
-        if latest_user_message and is_realtime_query(latest_user_message):
-            logger.info(f"Detected real-time query: {latest_user_message}")
-            try:
-                # IMPORTANT CHANGE: Call search function directly instead of making HTTP request
-                search_request = SearchRequest(query=latest_user_message)
-                search_results = await search(search_request)
-                logger.info("Search completed successfully")
-            except Exception as e:
-                logger.error(f"Error performing search: {str(e)}")
-
-        # Load OpenAI API key
-        openai_key = get_openai_key()
-        if not openai_key:
-            logger.error("OpenAI API key not found")
+        # Add organic search results
+        for i, result in enumerate(search_results["organic"][:3], 1):
+            title = result.get("title", "No title")
+            snippet = result.get("snippet", "No description")
+            search_context += f"{i}. {title}: {snippet}\n"
+        
+        # Add as a system message with instructions on how to use the data
+        search_context += "\n\nUse this information to answer the user's question accurately and naturally. Be specific when referring to any numeric data or factual information from the search results."
+        messages.append({
+            "role": "system", 
+            "content": search_context
+        })
+        
+        logger.info("Added search results as context to the prompt")
+
+    # Add user and assistant message history, dropping (and summarizing)
+    # the oldest turns if the prompt would exceed the budget
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    window = fit_context_window(messages, history, CHAT_PROMPT_TOKEN_BUDGET, CHAT_SUMMARY_TOKEN_BUDGET)
+    record_context(window)
+
+    return window
+
+def record_context(window):
+    """Update the prompt size counters and log trimmed prompts"""
+    CONTEXT_STATS["requests"] += 1
+    CONTEXT_STATS["prompt_tokens_total"] += window.prompt_tokens
+    CONTEXT_STATS["prompt_tokens_max"] = max(CONTEXT_STATS["prompt_tokens_max"], window.prompt_tokens)
+    if window.dropped:
+        CONTEXT_STATS["trimmed_requests"] += 1
+        CONTEXT_STATS["dropped_messages"] += window.dropped
+        CONTEXT_STATS["summarized_messages"] += window.summarized
+        logger.info(
+            f"Prompt trimmed to {window.prompt_tokens} tokens: dropped {window.dropped} "
+            f"older messages ({window.summarized} summarized)"
+        )
+
+def build_payload(messages, stream=False):
+    """Build the OpenAI chat completion payload"""
+    payload = {
+        "model": OPENAI_MODEL,
+        "messages": messages,
+        "max_tokens": MAX_TOKENS,
+        "temperature": TEMPERATURE,
+        "top_p": 0.9,
+        "frequency_penalty": 0.0,
+        "presence_penalty": 0.6
+    }
+    if stream:
+        payload["stream"] = True
+        # Ask for a final chunk with token usage (counted in /metrics)
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+def resolve_conversation(request: ChatRequest):
+    """
+    Make request.messages hold the full conversation history.
+
+    Stateless requests (only `messages`) are used as they are. Session
+    requests send only the new turn in `message`: it is added after the
+    stored conversation, which is created (seeded with `messages`, if any)
+    when no conversation_id is given. The new turn is only stored together
+    with its reply (see save_reply), so a failed or cancelled request does
+    not leave an unanswered user turn in the session. Returns the
+    conversation ID, or None for stateless requests.
+    """
+    if request.message is None:
+        if not request.messages:
+            raise HTTPException(status_code=422, detail="Either messages or message is required")
+        return None
+
+    conversation_id = request.conversation_id
+    if conversation_id:
+        history = SESSION_STORE.get(conversation_id)
+        if history is None and request.messages:
+            # Expired or served by another worker: the client re-seeded it
+            history = SESSION_STORE.append(conversation_id, list(request.messages))
+        elif history is None:
             raise HTTPException(
-                status_code=500,
-                detail="OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable."
+                status_code=404,
+                detail="Conversation not found or expired. Resend the full history in messages."
             )
+    else:
+        conversation_id = SESSION_STORE.create(list(request.messages or []))
+        history = SESSION_STORE.get(conversation_id) or []
 
-        headers = {
-            "Authorization": f"Bearer {openai_key}",
-            "Content-Type": "application/json"
-        }
+    # Snapshot, so a concurrent turn appending to the session does not change this request
+    request.messages = list(history) + [request.message]
+    return conversation_id
 
-        # Prepare the messages list with a system prompt
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are a helpful, friendly AI assistant integrated with a voice interface. "
-                    "Always respond in English. Keep responses concise and conversational. "
-                    "Be polite, engaging, and informative. Speak as if you're having a natural conversation."
-                )
-            }
-        ]
-
-        # If we have search results, add them as context
-        if search_results and "organic" in search_results and search_results["organic"]:
-            search_context = "I've searched for real-time information and found these results:\n\n"
-            
-            # Add organic search results
-            for i, result in enumerate(search_results["organic"][:3], 1):
-                title = result.get("title", "No title")
-                snippet = result.get("snippet", "No description")
-                search_context += f"{i}. {title}: {snippet}\n"
-            
-            # Add as a system message with instructions on how to use the data
-            search_context += "\n\nUse this information to answer the user's question accurately and naturally. Be specific when referring to any numeric data or factual information from the search results."
-            messages.append({
-                "role": "system", 
-                "content": search_context
-            })
-            
-            logger.info("Added search results as context to the prompt")
-
-        # Add user and assistant message history
-        for msg in request.messages:
-            messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+def save_reply(conversation_id, user_message, content):
+    """Append the user turn and the assistant reply to the session, if the request uses one"""
+    if conversation_id and content:
+        SESSION_STORE.append(conversation_id, [user_message, Message(role="assistant", content=content)])
 
-        payload = {
+def completion_cache_key(messages):
+    """Hash of the assembled messages and the settings that shape the answer"""
+    key_data = json.dumps(
+        {
             "model": OPENAI_MODEL,
-            "messages": messages,
             "max_tokens": MAX_TOKENS,
             "temperature": TEMPERATURE,
-            "top_p": 0.9,
-            "frequency_penalty": 0.0,
-            "presence_penalty": 0.6
-        }
+            "messages": messages,
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+def get_cached_completion(messages, realtime):
+    """
+    Look up a cached completion.
+    Returns (cache key or None if caching does not apply, cached result or None).
+    """
+    if not CHAT_CACHE_ENABLED:
+        return None, None
+    if realtime:
+        # Answers built on live search results must not be replayed
+        COMPLETION_CACHE_STATS["bypassed"] += 1
+        return None, None
+
+    cache_key = completion_cache_key(messages)
+    cached_result = COMPLETION_CACHE.get(cache_key)
+    if cached_result is not None:
+        CACHE_HITS.labels("completion").inc()
+    else:
+        CACHE_MISSES.labels("completion").inc()
+    return cache_key, cached_result
+
+def record_usage(usage):
+    """Count the tokens reported in an OpenAI usage object"""
+    if usage:
+        TOKENS.labels("prompt").inc(usage.get("prompt_tokens", 0))
+        TOKENS.labels("completion").inc(usage.get("completion_tokens", 0))
+
+def extract_usage(body):
+    """
+    The "usage" object of a raw completion body, without decoding the rest
+    (passthrough responses are forwarded as bytes). Returns None if absent.
+    """
+    key = body.rfind(b'"usage"')
+    if key == -1:
+        return None
+    start = key + len(b'"usage"')
+    while start < len(body) and body[start] in b" \t\r\n:":
+        start += 1
+    if body[start:start + 1] != b"{":
+        return None  # "usage": null
+    # The usage object only holds numbers and nested objects, never strings with braces
+    depth = 0
+    for end in range(start, len(body)):
+        if body[end] == 0x7B:    # {
+            depth += 1
+        elif body[end] == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                try:
+                    return loads(body[start:end + 1])
+                except ValueError:
+                    return None
+    return None
+
+def store_completion(cache_key, result):
+    """Cache a finished completion (truncated or empty answers are not cached)"""
+    if cache_key is None or not result.get("choices"):
+        return
+    choice = result["choices"][0]
+    if choice.get("finish_reason") not in (None, "stop"):
+        return
+    if not choice.get("message", {}).get("content"):
+        return
+    COMPLETION_CACHE.set(cache_key, result)
 
+async def wait_for_disconnect(http_request: Request):
+    """Return once the client has disconnected (the body is already consumed)"""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+def record_cancellation(kind, tokens_generated=0):
+    """Count cancelled upstream work and the completion tokens it saved"""
+    CANCELLATION_STATS[kind] += 1
+    CANCELLATION_STATS["tokens_saved_estimate"] += max(0, MAX_TOKENS - tokens_generated)
+
+class ChatCompletion(NamedTuple):
+    result: Optional[dict]   # parsed completion (None if only the raw body was needed)
+    body: Optional[bytes]    # raw upstream response body (None when served from cache)
+    prompt_tokens: int       # estimated prompt tokens sent
+
+async def complete_chat(request: ChatRequest, deadline: Deadline, parse=True):
+    """
+    Run search and the OpenAI completion for a chat request within its deadline.
+
+    Args:
+        request: Chat request with the full history in messages
+        deadline: Deadline for search and OpenAI together
+        parse: Whether the caller needs the parsed result; if not, the
+            upstream body is only decoded when the completion cache needs it
+    """
+    try:
+        logger.info("Generate text request received with %d messages", len(request.messages))
+
+        # Log incoming messages safely (only built when debug logging is on)
+        if logger.isEnabledFor(logging.DEBUG):
+            safe_messages = [
+                {
+                    "role": msg.role,
+                    "content": f"{msg.content[:30]}..." if len(msg.content) > 30 else msg.content
+                }
+                for msg in request.messages
+            ]
+            logger.debug("Messages content: %s", json.dumps(safe_messages))
+
+        search_results, realtime = await get_search_results(request, deadline)
+        window = build_messages(request, search_results)
+        messages = window.messages
+        logger.info("Prompt: %d messages, ~%d tokens", len(messages), window.prompt_tokens)
+
+        cache_key, cached_result = get_cached_completion(messages, realtime)
+        if cached_result is not None:
+            logger.info("Returning cached completion")
+            return ChatCompletion(cached_result, None, window.prompt_tokens)
+
+        headers = get_openai_headers()
+        payload = build_payload(messages)
+
+        deadline.check("OpenAI request")
         logger.debug("Sending request to OpenAI Chat API")
 
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        openai_started = time.perf_counter()
+        try:
+            client = get_openai_client()
+            response = await asyncio.wait_for(
+                client.post(
+                    OPENAI_CHAT_PATH,
+                    headers=headers,
+                    json=payload,
+                    timeout=deadline.httpx_timeout(client.timeout)
+                ),
+                deadline.remaining()
+            )
+        except asyncio.TimeoutError:
+            UPSTREAM_ERRORS.labels("openai", "timeout").inc()
+            raise DeadlineExceeded("Deadline exceeded waiting for OpenAI")
+        except httpx.TimeoutException as e:
+            UPSTREAM_ERRORS.labels("openai", "timeout").inc()
+            logger.error(f"OpenAI Chat API request timed out: {str(e)}")
+            raise HTTPException(status_code=504, detail="OpenAI API request timed out")
+        except httpx.HTTPError:
+            UPSTREAM_ERRORS.labels("openai", "error").inc()
+            raise
+        elapsed = time.perf_counter() - openai_started
+        OPENAI_SECONDS.labels("complete").observe(elapsed)
+        record_span("llm", elapsed)
 
-        logger.debug(f"OpenAI Chat API response status: {response.status_code}")
+        logger.debug("OpenAI Chat API response status: %s", response.status_code)
 
         if response.status_code == 200:
-            result = response.json()
+            body = response.content
+            if not parse and cache_key is None:
+                record_usage(extract_usage(body))
+                logger.info("Successfully generated text (%d bytes, passed through)", len(body))
+                return ChatCompletion(None, body, window.prompt_tokens)
+
+            result = loads(body)
+            record_usage(result.get("usage"))
             if result.get("choices") and len(result["choices"]) > 0:
                 content = result["choices"][0].get("message", {}).get("content", "")
-                logger.info(f"Successfully generated text: '{content[:30]}...'")
-            return result
+                logger.info("Successfully generated text: '%.30s...'", content)
+            store_completion(cache_key, result)
+            return ChatCompletion(result, body, window.prompt_tokens)
         else:
+            UPSTREAM_ERRORS.labels("openai", "status").inc()
             error_msg = f"Error from OpenAI API: {response.text}"
             logger.error(error_msg)
             raise HTTPException(
@@ -161,6 +495,11 @@ async def generate_text(request: ChatRequest = Body(...)):
                 detail=error_msg
             )
 
+    except DeadlineExceeded as e:
+        CANCELLATION_STATS["deadline_exceeded"] += 1
+        logger.error(f"Chat request deadline exceeded: {str(e)}")
+        raise HTTPException(status_code=504, detail="Chat request deadline exceeded")
+
     except HTTPException as he:
         logger.error(f"HTTP Exception in generate-text: {str(he)}")
         raise
@@ -169,4 +508,312 @@ async def generate_text(request: ChatRequest = Body(...)):
         error_msg = f"Error generating text: {str(e)}"
         logger.error(error_msg)
         logger.error(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=error_msg)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+def format_chat_response(completion: ChatCompletion, mode, conversation_id=None):
+    """
+    Build the /api/chat response body in the requested mode:
+    "full" (the OpenAI completion object), "compact" (content and usage
+    only) or "passthrough" (the upstream bytes, forwarded without re-encoding)
+    """
+    headers = {"X-Prompt-Tokens": str(completion.prompt_tokens)}
+    if conversation_id:
+        headers["X-Conversation-Id"] = conversation_id
+
+    if mode == "passthrough":
+        body = completion.body if completion.body is not None else dumps(completion.result)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    result = completion.result
+    if mode == "compact":
+        choice = result["choices"][0] if result.get("choices") else {}
+        compact = {
+            "content": choice.get("message", {}).get("content", ""),
+            "finish_reason": choice.get("finish_reason"),
+            "usage": result.get("usage"),
+        }
+        if conversation_id:
+            compact["conversation_id"] = conversation_id
+        return FastJSONResponse(compact, headers=headers)
+
+    if conversation_id:
+        result = {**result, "conversation_id": conversation_id}
+    return FastJSONResponse(result, headers=headers)
+
+@router.post("/api/chat")
+async def generate_text(http_request: Request, request: ChatRequest = Body(...)):
+    """
+    Generate text response using OpenAI's GPT API.
+    The upstream work is cancelled if the client disconnects first.
+    """
+    deadline = Deadline(CHAT_REQUEST_DEADLINE)
+    conversation_id = resolve_conversation(request)
+    mode = request.response_mode or CHAT_RESPONSE_MODE
+    # Passthrough only needs the parsed body to store the reply in a session
+    parse = mode != "passthrough" or conversation_id is not None
+    work = asyncio.ensure_future(complete_chat(request, deadline, parse))
+    disconnect = asyncio.ensure_future(wait_for_disconnect(http_request))
+
+    try:
+        await asyncio.wait({work, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+
+    if not work.done():
+        # Client went away (e.g. the user pressed stop): stop search and OpenAI
+        work.cancel()
+        record_cancellation("cancelled_requests")
+        REQUEST_SECONDS.labels("chat", 499).observe(deadline.elapsed())
+        logger.info("Client disconnected, cancelled chat request")
+        return Response(status_code=499)
+
+    try:
+        completion = work.result()
+    except HTTPException as he:
+        REQUEST_SECONDS.labels("chat", he.status_code).observe(deadline.elapsed())
+        raise
+    REQUEST_SECONDS.labels("chat", 200).observe(deadline.elapsed())
+    if conversation_id is not None and completion.result.get("choices"):
+        save_reply(conversation_id, request.message, completion.result["choices"][0].get("message", {}).get("content", ""))
+    with span("serialize"):
+        return format_chat_response(completion, mode, conversation_id)
+
+def format_sse(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
+
+def replay_cached_events(result, conversation_id=None, user_message=None):
+    """Serve a cached completion through the same SSE events as a live stream"""
+    choice = result["choices"][0]
+    content = choice["message"]["content"]
+    yield format_sse("token", {"content": content})
+    for index, sentence in enumerate(split_sentences(content)):
+        yield format_sse("sentence", {"index": index, "text": sentence})
+    save_reply(conversation_id, user_message, content)
+    yield format_sse("done", {
+        "content": content,
+        "finish_reason": choice.get("finish_reason"),
+        "conversation_id": conversation_id
+    })
+
+async def stream_openai_events(headers, payload, deadline: Deadline, cache_key=None, conversation_id=None, user_message=None):
+    """
+    Relay an OpenAI streaming completion as Server-Sent Events.
+
+    Emits a `token` event for every content delta, a `sentence` event as
+    soon as a full sentence is available (so the client can start speaking
+    it), then a final `done` event with the complete text. If the client
+    disconnects, the generator is closed, which closes the upstream stream
+    and stops OpenAI from generating further tokens.
+    """
+    splitter = SentenceSplitter()
+    sentence_index = 0
+    content = ""
+    finish_reason = None
+    # Fields of the completion object, taken from the chunks for the cache entry
+    completion_fields = {}
+    usage = None
+    tokens_generated = 0
+    completed = False
+    status = 200
+    openai_started = time.perf_counter()
+
+    try:
+        client = get_openai_client()
+        async with client.stream(
+            "POST",
+            OPENAI_CHAT_PATH,
+            headers=headers,
+            json=payload,
+            timeout=deadline.httpx_timeout(client.timeout)
+        ) as response:
+            logger.debug("OpenAI Chat API stream status: %s", response.status_code)
+
+            if response.status_code != 200:
+                completed = True
+                status = response.status_code
+                UPSTREAM_ERRORS.labels("openai", "status").inc()
+                error_body = (await response.aread()).decode("utf-8", errors="replace")
+                error_msg = f"Error from OpenAI API: {error_body}"
+                logger.error(error_msg)
+                yield format_sse("error", {"status": response.status_code, "detail": error_msg})
+                return
+
+            async for line in response.aiter_lines():
+                # OpenAI sends "data: {...}" lines separated by blank keep-alives
+                if not line or not line.startswith("data:"):
+                    continue
+
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+
+                chunk = loads(data)
+                if not completion_fields:
+                    completion_fields = {field: chunk[field] for field in ("id", "created", "model") if field in chunk}
+                choices = chunk.get("choices") or []
+                if not choices:
+                    # The final chunk carries the usage (stream_options.include_usage)
+                    usage = chunk.get("usage") or usage
+                    record_usage(chunk.get("usage"))
+                    continue
+
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+                delta = choices[0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+
+                # Each streamed delta is roughly one token
+                if not tokens_generated:
+                    OPENAI_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - openai_started)
+                tokens_generated += 1
+                content += delta
+                yield format_sse("token", {"content": delta})
+
+                for sentence in splitter.feed(delta):
+                    yield format_sse("sentence", {"index": sentence_index, "text": sentence})
+                    sentence_index += 1
+
+                deadline.check("next token")
+
+        completed = True
+        OPENAI_SECONDS.labels("stream").observe(time.perf_counter() - openai_started)
+
+        for sentence in splitter.flush():
+            yield format_sse("sentence", {"index": sentence_index, "text": sentence})
+            sentence_index += 1
+
+        logger.info("Successfully streamed text: '%.30s...'", content)
+        # Cached as a complete chat.completion object, since a later
+        # non-streaming request may be answered from it in any response mode
+        if "id" in completion_fields and usage is not None:
+            store_completion(cache_key, {
+                **completion_fields,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+        save_reply(conversation_id, user_message, content)
+        yield format_sse("done", {
+            "content": content,
+            "finish_reason": finish_reason,
+            "conversation_id": conversation_id
+        })
+
+    except DeadlineExceeded as e:
+        completed = True
+        status = 504
+        CANCELLATION_STATS["deadline_exceeded"] += 1
+        logger.error(f"Chat stream deadline exceeded: {str(e)}")
+        yield format_sse("error", {"status": 504, "detail": "Chat request deadline exceeded"})
+
+    except httpx.TimeoutException as e:
+        completed = True
+        status = 504
+        UPSTREAM_ERRORS.labels("openai", "timeout").inc()
+        logger.error(f"OpenAI Chat API stream timed out: {str(e)}")
+        yield format_sse("error", {"status": 504, "detail": "OpenAI API request timed out"})
+
+    except Exception as e:
+        completed = True
+        status = 500
+        UPSTREAM_ERRORS.labels("openai", "error").inc()
+        error_msg = f"Error streaming text: {str(e)}"
+        logger.error(error_msg)
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        yield format_sse("error", {"status": 500, "detail": error_msg})
+
+    finally:
+        # Closed early (client disconnect): the upstream stream was closed above
+        if not completed:
+            status = 499
+            record_cancellation("cancelled_streams", tokens_generated)
+            logger.info("Client disconnected, cancelled stream after %d tokens", tokens_generated)
+        REQUEST_SECONDS.labels("stream", status).observe(deadline.elapsed())
+
+@router.post("/api/chat/stream")
+async def generate_text_stream(request: ChatRequest = Body(...)):
+    """
+    Stream the OpenAI response to the browser as Server-Sent Events
+    """
+    deadline = Deadline(CHAT_REQUEST_DEADLINE)
+
+    try:
+        conversation_id = resolve_conversation(request)
+        logger.info("Streaming text request received with %d messages", len(request.messages))
+
+        search_results, realtime = await get_search_results(request, deadline)
+        window = build_messages(request, search_results)
+        messages = window.messages
+        logger.info("Prompt: %d messages, ~%d tokens", len(messages), window.prompt_tokens)
+        sse_headers = {
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Prompt-Tokens": str(window.prompt_tokens)
+        }
+        if conversation_id:
+            sse_headers["X-Conversation-Id"] = conversation_id
+
+        cache_key, cached_result = get_cached_completion(messages, realtime)
+        if cached_result is not None:
+            logger.info("Streaming cached completion")
+            return StreamingResponse(
+                replay_cached_events(cached_result, conversation_id, request.message),
+                media_type="text/event-stream",
+                headers=sse_headers
+            )
+
+        headers = get_openai_headers()
+        payload = build_payload(messages, stream=True)
+
+        deadline.check("OpenAI request")
+        logger.debug("Sending streaming request to OpenAI Chat API")
+
+        return StreamingResponse(
+            stream_openai_events(headers, payload, deadline, cache_key, conversation_id, request.message),
+            media_type="text/event-stream",
+            headers=sse_headers
+        )
+
+    except DeadlineExceeded as e:
+        CANCELLATION_STATS["deadline_exceeded"] += 1
+        logger.error(f"Chat stream deadline exceeded: {str(e)}")
+        raise HTTPException(status_code=504, detail="Chat request deadline exceeded")
+
+    except HTTPException as he:
+        logger.error(f"HTTP Exception in generate-text-stream: {str(he)}")
+        raise
+
+    except Exception as e:
+        error_msg = f"Error starting text stream: {str(e)}"
+        logger.error(error_msg)
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.get("/api/chat/stats")
+async def chat_stats_endpoint():
+    """
+    Search latency budget, cancellation, completion cache, session and
+    prompt size counters for chat requests
+    """
+    return {
+        "search_latency_budget": SEARCH_LATENCY_BUDGET,
+        "request_deadline": CHAT_REQUEST_DEADLINE,
+        "background_searches": len(_background_searches),
+        **SEARCH_BUDGET_STATS,
+        **CANCELLATION_STATS,
+        "completion_cache": {
+            "enabled": CHAT_CACHE_ENABLED,
+            **COMPLETION_CACHE.stats(),
+            **COMPLETION_CACHE_STATS
+        },
+        "sessions": SESSION_STORE.stats(),
+        "context": {
+            "prompt_token_budget": CHAT_PROMPT_TOKEN_BUDGET,
+            **CONTEXT_STATS
+        }
+    }
@@ -1,111 +1,69 @@
-# """
-# Main route handlers
-# """
-# import time
-# from fastapi import FastAPI, Request
-# from fastapi.responses import JSONResponse
-# from modules.logger import get_logger
-
-# # Setup logger
-# logger = get_logger("routes.main")
-
-# def add_main_routes(app: FastAPI):
-#     """Add main routes to the app"""
-    
-#     @app.middleware("http")
-#     async def log_requests(request: Request, call_next):
-#         """Middleware to log all requests and responses"""
-#         request_id = f"req-{time.time()}"
-#         logger.info(f"Request {request_id} started: {request.method} {request.url.path}")
-        
-#         # Process the request and get the response
-#         try:
-#             response = await call_next(request)
-#             logger.info(f"Request {request_id} completed with status code: {response.status_code}")
-#             return response
-#         except Exception as e:
-#             logger.error(f"Request {request_id} failed with error: {str(e)}")
-#             return JSONResponse(
-#                 status_code=500,
-#                 content={"detail": "Internal server error"}
-#             )
-    
-#     @app.get("/api/test")
-#     async def test_endpoint():
-#         """Test endpoint to verify API is working"""
-#         logger.info("Test endpoint accessed")
-#         return {
-#             "status": "ok", 
-#             "message": "API is working", 
-#             "timestamp": time.time()
-#         }
-
-
-
 """
-Voice Avatar Chatbot - Main application file
+Main request middleware: request IDs, request logging and Server-Timing
 """
-
-import os
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.cors import CORSMiddleware
-
-# Import modules
-from modules.config import setup_environment, HOST, PORT, DEBUG
+import re
+import time
 from modules.logger import get_logger
-from modules.routes import chat, search, text_to_speech, test
+from modules.tracing import new_request_id, start_request, end_request, server_timing
 
 # Setup logger
-logger = get_logger("voice_avatar_chatbot")
+logger = get_logger("routes.main")
+
+# Incoming X-Request-ID values are reused only if they look like an ID
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+class RequestTimingMiddleware:
+    """
+    Assign every HTTP request an ID (reusing a valid incoming X-Request-ID),
+    make it available to log records, and return it in X-Request-ID along
+    with a Server-Timing header listing the stages recorded with
+    modules.tracing (search, llm, serialize, ...).
 
-# Create FastAPI app
-app = FastAPI(
-    title="Voice Avatar Chatbot",
-    description="A chatbot with voice input/output and avatar visualization",
-    version="1.0.0"
-)
+    Streaming responses send their headers before the stream starts, so
+    their Server-Timing only covers the stages finished by then.
+    """
 
-# Load configuration
-if not setup_environment():
-    logger.error("Failed to load configuration. Exiting...")
-    exit(1)
+    def __init__(self, app):
+        self.app = app
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # For production, specify exact origins
-    allow_credentials=True, 
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+        request_id = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or new_request_id()
 
-# Include API routes
-app.include_router(chat.router)
-app.include_router(search.router)
-app.include_router(text_to_speech.router)
-app.include_router(test.router)
+        tokens = start_request(request_id)
+        started = time.perf_counter()
+        status_code = 500
+        path = scope.get("path", "")
+        logger.debug("Request started: %s %s", scope.get("method"), path)
 
-@app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    """Serve the main application page"""
-    logger.info("Root endpoint accessed - serving index.html")
-    
-    # Serve the index.html file
-    index_path = os.path.join("static", "index.html")
-    if os.path.exists(index_path):
-        logger.info(f"Serving {index_path} file")
-        return FileResponse(index_path)
-    else:
-        logger.error(f"File not found: {index_path}")
-        raise HTTPException(status_code=404, detail="Page not found")
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                headers.append((b"server-timing", server_timing(time.perf_counter() - started).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
 
-# Run the application when executed directly
-if __name__ == "__main__":
-    import uvicorn
-    logger.info(f"Starting server on {HOST}:{PORT}")
-    uvicorn.run("app:app", host=HOST, port=PORT, reload=DEBUG)
\ No newline at end of file
+        try:
+            await self.app(scope, receive, send_with_headers)
+        except Exception as e:
+            logger.error(f"Request failed with error: {str(e)}")
+            raise
+        finally:
+            logger.info(
+                "Request completed: %s %s %s in %.1fms",
+                scope.get("method"), path, status_code, (time.perf_counter() - started) * 1000
+            )
+            end_request(tokens)
@@ -0,0 +1,16 @@
+"""
+Prometheus metrics endpoint
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from modules.metrics import render_metrics
+
+# Setup API Router
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Latency histograms and counters in the Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
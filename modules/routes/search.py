@@ -3,14 +3,30 @@ Search route handler with Tavily API integration through LangChain
 """
 
 import json
+import time
 import traceback
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from modules.logger import get_logger
-from modules.config import get_env_variable
+from modules.config import (
+    get_env_variable,
+    SEARCH_MAX_WORKERS,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_MAX_BYTES,
+    SEARCH_CACHE_STALE_TTL,
+    SEARCH_CACHE_BACKEND,
+    SEARCH_CACHE_PATH,
+    REDIS_URL,
+)
+from modules.cache import TTLCache, TieredCache, create_cache_backend
+from modules.query import canonicalize_query, make_cache_key
+from modules.deadline import Deadline, DeadlineExceeded
+from modules.metrics import SEARCH_SECONDS, CACHE_HITS, CACHE_MISSES, UPSTREAM_ERRORS
 
 # Import LangChain's Tavily tool
 from langchain_community.tools.tavily_search import TavilySearchResults
@@ -19,98 +35,305 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 router = APIRouter()
 logger = get_logger("routes.search")
 
-# Simple in-memory cache to avoid repeated identical searches
-# Format: {query: {timestamp: timestamp, results: results}}
-SEARCH_CACHE = {}
-CACHE_TTL = 300  # Cache results for 5 minutes (300 seconds)
+def create_search_cache():
+    """
+    Bounded in-memory cache, optionally backed by a second tier shared by
+    all workers on the host (falls back to memory only if it cannot open)
+    """
+    memory = TTLCache(
+        max_entries=SEARCH_CACHE_MAX_ENTRIES,
+        ttl=SEARCH_CACHE_TTL,
+        max_bytes=SEARCH_CACHE_MAX_BYTES,
+        name="search",
+        stale_ttl=SEARCH_CACHE_STALE_TTL
+    )
+    try:
+        backend = create_cache_backend(
+            SEARCH_CACHE_BACKEND,
+            path=SEARCH_CACHE_PATH,
+            url=REDIS_URL,
+            prefix="search:"
+        )
+        if backend:
+            logger.info(f"Search cache second tier enabled: {backend.name}")
+    except Exception as e:
+        logger.error(f"Could not create search cache backend '{SEARCH_CACHE_BACKEND}': {str(e)}")
+        backend = None
+    return TieredCache(memory, backend)
+
+# Cache to avoid repeated identical searches
+# Format: {"<depth>:<canonical query>": results}, entries expire after SEARCH_CACHE_TTL seconds
+SEARCH_CACHE = create_search_cache()
+
+# Application-scoped, size-limited executor for the blocking Tavily calls
+# and one reusable search tool per search depth
+_search_executor = None
+_search_tools = {}
+_executor_lock = threading.Lock()
+
+# Executor queue metrics, used to size SEARCH_MAX_WORKERS
+SEARCH_EXECUTOR_STATS = {
+    "queued": 0,        # submitted, waiting for a free worker
+    "running": 0,       # currently executing
+    "completed": 0,
+    "failed": 0,
+    "max_queued": 0,    # high-water mark of the queue
+    "total_wait_time": 0.0,  # seconds spent waiting for a worker
+}
+
+# Upstream searches currently in flight, keyed by canonical cache key,
+# and the number of callers waiting on each
+_inflight_searches = {}
+_inflight_waiters = {}
+
+# Single-flight metrics: upstream calls made vs. callers that joined one,
+# plus searches abandoned by deadline or cancelled by their callers
+SEARCH_COALESCE_STATS = {
+    "upstream_calls": 0,
+    "coalesced": 0,
+    "deadline_exceeded": 0,
+    "cancelled": 0,
+}
 
 class SearchRequest(BaseModel):
     query: str
     search_depth: Optional[str] = "basic"  # basic or advanced
 
-async def search(request: SearchRequest):
+def get_search_executor():
+    """Get the shared search executor, creating it on first use"""
+    global _search_executor
+    with _executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(
+                max_workers=SEARCH_MAX_WORKERS,
+                thread_name_prefix="tavily-search"
+            )
+            logger.info(f"Search executor created with {SEARCH_MAX_WORKERS} workers")
+        return _search_executor
+
+def shutdown_search_executor():
+    """Shut down the shared search executor (called on application shutdown)"""
+    global _search_executor
+    with _executor_lock:
+        if _search_executor is not None:
+            _search_executor.shutdown(wait=False, cancel_futures=True)
+            _search_executor = None
+            logger.info("Search executor shut down")
+
+def close_search_cache():
+    """Close the search cache backend (called on application shutdown)"""
+    SEARCH_CACHE.close()
+
+def get_search_tool(search_depth):
+    """Get the reusable Tavily search tool for the given search depth"""
+    search_tool = _search_tools.get(search_depth)
+    if search_tool is None:
+        search_tool = TavilySearchResults(
+            search_depth=search_depth,  # "basic" or "advanced"
+            k=5  # Number of results to return
+        )
+        _search_tools[search_depth] = search_tool
+    return search_tool
+
+def get_search_executor_stats():
+    """Snapshot of the search executor queue metrics"""
+    with _executor_lock:
+        stats = dict(SEARCH_EXECUTOR_STATS)
+    stats["max_workers"] = SEARCH_MAX_WORKERS
+    stats.update(SEARCH_COALESCE_STATS)
+    stats["in_flight"] = len(_inflight_searches)
+    stats["cache"] = SEARCH_CACHE.stats()
+    return stats
+
+async def run_search_tool(search_tool, query):
+    """
+    Run the blocking search tool on the shared executor while
+    tracking queue depth and wait time
+    """
+    submitted_at = time.monotonic()
+    with _executor_lock:
+        SEARCH_EXECUTOR_STATS["queued"] += 1
+        SEARCH_EXECUTOR_STATS["max_queued"] = max(
+            SEARCH_EXECUTOR_STATS["max_queued"], SEARCH_EXECUTOR_STATS["queued"]
+        )
+
+    def invoke():
+        with _executor_lock:
+            SEARCH_EXECUTOR_STATS["queued"] -= 1
+            SEARCH_EXECUTOR_STATS["running"] += 1
+            SEARCH_EXECUTOR_STATS["total_wait_time"] += time.monotonic() - submitted_at
+        try:
+            result = search_tool.invoke(query)
+            with _executor_lock:
+                SEARCH_EXECUTOR_STATS["completed"] += 1
+            return result
+        except Exception:
+            with _executor_lock:
+                SEARCH_EXECUTOR_STATS["failed"] += 1
+            raise
+        finally:
+            with _executor_lock:
+                SEARCH_EXECUTOR_STATS["running"] -= 1
+
+    future = get_search_executor().submit(invoke)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # Drop the job if it never started so the queue count stays accurate
+        if future.cancel():
+            with _executor_lock:
+                SEARCH_EXECUTOR_STATS["queued"] -= 1
+        raise
+
+async def fetch_search_results(query, search_depth, cache_key):
+    """
+    Call Tavily for a (canonical) query, format and cache the results.
+    Runs at most once per concurrent identical query (see search()).
+    """
+    # Make sure Tavily API key is defined in environment variables
+    # The TavilySearchResults class reads from TAVILY_API_KEY env var automatically
+    tavily_api_key = get_env_variable("TAVILY_API_KEY")
+    if not tavily_api_key:
+        logger.error("Tavily API key not found")
+        raise HTTPException(
+            status_code=500,
+            detail="Tavily API key not configured. Please set the TAVILY_API_KEY environment variable."
+        )
+
+    # Reuse the Tavily search tool for this depth
+    search_tool = get_search_tool(search_depth)
+    
+    logger.debug("Calling Tavily search API with query: %s", query)
+    
+    # Execute the search in a separate thread to avoid blocking
+    try:
+        # Run the blocking search on the shared, bounded executor
+        results = await run_search_tool(search_tool, query)
+            
+        logger.info("Search successful with %d results", len(results))
+        
+        # Format the response to match your frontend expectations
+        formatted_results = {
+            "organic": [],
+            "query": query,
+            "searchDepth": search_depth
+        }
+        
+        for item in results:
+            formatted_results["organic"].append({
+                "title": item.get("title", ""),
+                "link": item.get("url", ""),
+                "snippet": item.get("content", ""),
+                "source": item.get("source", "Tavily")
+            })
+        
+        # Cache the results for future use
+        await SEARCH_CACHE.set(cache_key, formatted_results)
+            
+        return formatted_results
+        
+    except Exception as e:
+        UPSTREAM_ERRORS.labels("tavily", "error").inc()
+        logger.error(f"Tavily search error: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Tavily search error: {str(e)}"
+        )
+
+def get_search_cache_key(request: SearchRequest):
+    """Canonical cache key for a search request"""
+    canonical = canonicalize_query(request.query)
+    return make_cache_key(canonical.text, request.search_depth)
+
+def get_stale_search_results(request: SearchRequest):
+    """
+    Cached results for a request, including recently expired ones.
+    Used as a fallback when a fresh search is over its latency budget.
+    Only this process's memory tier keeps expired results.
+    """
+    return SEARCH_CACHE.get_stale(get_search_cache_key(request))
+
+def _finish_inflight_search(flight_key, task):
+    """Forget a finished in-flight search and consume its exception"""
+    if _inflight_searches.get(flight_key) is task:
+        del _inflight_searches[flight_key]
+    if not task.cancelled():
+        # Retrieved here so an unawaited failure is not logged as "never retrieved"
+        task.exception()
+
+async def search(request: SearchRequest, deadline: Optional[Deadline] = None):
     """
     Functional implementation of search logic that can be called directly
     or via the HTTP endpoint
+
+    Args:
+        request: The search request
+        deadline: Optional request deadline; the search gives up (504) when it passes
     """
+    started = time.perf_counter()
     try:
         query = request.query
-        logger.info(f"Search request received: {query[:30]}...")
+        logger.info("Search request received: %.30s...", query)
         
-        # Check cache first
-        import time
-        current_time = time.time()
+        # Reduce the utterance to a compact canonical query; it is both the
+        # cache key (together with the depth) and the text sent to Tavily
+        canonical = canonicalize_query(query)
+        cache_key = make_cache_key(canonical.text, request.search_depth)
+        logger.debug("Canonical search query: %s (key: %s)", canonical.text, cache_key)
         
-        if query in SEARCH_CACHE:
-            cache_entry = SEARCH_CACHE[query]
-            # If cache is still valid (not expired)
-            if current_time - cache_entry["timestamp"] < CACHE_TTL:
-                logger.info(f"Using cached search results for query: {query[:30]}...")
-                return cache_entry["results"]
+        # Check cache first
+        cached_results = await SEARCH_CACHE.get(cache_key)
+        if cached_results is not None:
+            CACHE_HITS.labels("search").inc()
+            SEARCH_SECONDS.labels("hit").observe(time.perf_counter() - started)
+            logger.info("Using cached search results for query: %.30s...", query)
+            return cached_results
+        CACHE_MISSES.labels("search").inc()
         
-        # Make sure Tavily API key is defined in environment variables
-        # The TavilySearchResults class reads from TAVILY_API_KEY env var automatically
-        tavily_api_key = get_env_variable("TAVILY_API_KEY")
-        if not tavily_api_key:
-            logger.error("Tavily API key not found")
-            raise HTTPException(
-                status_code=500,
-                detail="Tavily API key not configured. Please set the TAVILY_API_KEY environment variable."
+        # Coalesce concurrent identical queries onto one upstream call.
+        # The upstream call runs in its own task, so a caller that is
+        # cancelled does not cancel it for the others.
+        flight_key = cache_key
+        task = _inflight_searches.get(flight_key)
+        if task is None:
+            # Do not start upstream work that can no longer be used
+            if deadline is not None:
+                deadline.check("search")
+            SEARCH_COALESCE_STATS["upstream_calls"] += 1
+            task = asyncio.ensure_future(
+                fetch_search_results(canonical.text, request.search_depth, cache_key)
             )
-
-        # Initialize Tavily search tool
-        search_tool = TavilySearchResults(
-            search_depth=request.search_depth,  # "basic" or "advanced"
-            k=5  # Number of results to return
-        )
+            _inflight_searches[flight_key] = task
+            task.add_done_callback(lambda t: _finish_inflight_search(flight_key, t))
+        else:
+            SEARCH_COALESCE_STATS["coalesced"] += 1
+            logger.info("Joining in-flight search for query: %.30s...", query)
         
-        logger.debug(f"Calling Tavily search API with query: {query}")
-        
-        # Execute the search in a separate thread to avoid blocking
+        _inflight_waiters[flight_key] = _inflight_waiters.get(flight_key, 0) + 1
         try:
-            # Run the blocking search in a thread pool
-            with ThreadPoolExecutor() as executor:
-                results = await asyncio.get_event_loop().run_in_executor(
-                    executor, 
-                    search_tool.invoke,
-                    query
-                )
-                
-            logger.info(f"Search successful with {len(results)} results")
-            
-            # Format the response to match your frontend expectations
-            formatted_results = {
-                "organic": [],
-                "query": query,
-                "searchDepth": request.search_depth
-            }
-            
-            for item in results:
-                formatted_results["organic"].append({
-                    "title": item.get("title", ""),
-                    "link": item.get("url", ""),
-                    "snippet": item.get("content", ""),
-                    "source": item.get("source", "Tavily")
-                })
-            
-            # Cache the results for future use
-            SEARCH_CACHE[query] = {
-                "timestamp": current_time,
-                "results": formatted_results
-            }
-            
-            # Cleanup old cache entries
-            cleanup_cache(current_time)
-                
-            return formatted_results
-            
-        except Exception as e:
-            logger.error(f"Tavily search error: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Tavily search error: {str(e)}"
+            results = await asyncio.wait_for(
+                asyncio.shield(task),
+                deadline.remaining() if deadline is not None else None
             )
+            SEARCH_SECONDS.labels("miss").observe(time.perf_counter() - started)
+            return results
+        except asyncio.CancelledError:
+            # The last interested caller went away (e.g. the client
+            # disconnected): cancel the upstream work if still pending
+            if _inflight_waiters.get(flight_key) == 1 and not task.done():
+                task.cancel()
+                SEARCH_COALESCE_STATS["cancelled"] += 1
+                logger.info("Cancelled upstream search for query: %.30s...", query)
+            raise
+        finally:
+            _inflight_waiters[flight_key] -= 1
+            if not _inflight_waiters[flight_key]:
+                del _inflight_waiters[flight_key]
             
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        SEARCH_COALESCE_STATS["deadline_exceeded"] += 1
+        logger.warning(f"Search deadline exceeded for query: {request.query[:30]}...")
+        raise HTTPException(status_code=504, detail="Search deadline exceeded")
     except HTTPException:
         raise
     except Exception as e:
@@ -119,22 +342,18 @@ async def search(request: SearchRequest):
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=error_msg)
 
-def cleanup_cache(current_time):
-    """Remove expired entries from cache"""
-    global SEARCH_CACHE
-    keys_to_remove = []
-    
-    for key, cache_entry in SEARCH_CACHE.items():
-        if current_time - cache_entry["timestamp"] > CACHE_TTL:
-            keys_to_remove.append(key)
-    
-    for key in keys_to_remove:
-        del SEARCH_CACHE[key]
-
 @router.post("/api/search")
 async def search_endpoint(request: SearchRequest = Body(...)):
     """
     HTTP endpoint for the search functionality
     This now just wraps the functional implementation
     """
-    return await search(request)
\ No newline at end of file
+    return await search(request)
+
+@router.get("/api/search/stats")
+async def search_stats_endpoint():
+    """
+    Search executor queue metrics (queue depth, wait time, worker count)
+    plus single-flight and cache counters
+    """
+    return get_search_executor_stats()
@@ -1,28 +1,266 @@
 """
 Speech-to-Text (STT) route handlers
 """
+import os
+import json
+import time
+import asyncio
+import threading
 import traceback
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
 from modules.logger import get_logger
+from modules.config import (
+    STT_ENGINE,
+    VOSK_MODEL_PATH,
+    STT_SAMPLE_RATE,
+    STT_MAX_WORKERS,
+    STT_MAX_UTTERANCE_SECONDS,
+    VAD_ENABLED,
+)
+from modules.stt import create_stt_engine, SAMPLE_WIDTH
+from modules.audio import upload_source, resample_pcm16, Resampler, AudioDecodeError, AudioTooLongError
+from modules.audio_jobs import transcribe_file
+from modules.audio_pool import AUDIO_POOL, AudioPoolBusy
+from modules.metrics import STT_SECONDS
 
 router = APIRouter()
 logger = get_logger("routes.speech")
 
+# Engine and executor shared by all connections (created on first use)
+_stt_engine = None
+_stt_executor = None
+_stt_lock = threading.Lock()
+
+STT_STATS = {
+    "connections": 0,
+    "active": 0,
+    "utterances": 0,
+    "partials": 0,
+    "audio_seconds": 0.0,
+    "errors": 0,
+    "uploads": 0,
+    "upload_audio_seconds": 0.0,
+    "trimmed_seconds": 0.0,
+}
+
+def get_stt_engine():
+    """Get the shared transcription engine, loading it on first use"""
+    global _stt_engine
+    with _stt_lock:
+        if _stt_engine is None:
+            _stt_engine = create_stt_engine(STT_ENGINE, VOSK_MODEL_PATH, STT_SAMPLE_RATE)
+            logger.info(f"Speech-to-text engine: {_stt_engine.name} ({_stt_engine.sample_rate} Hz)")
+        return _stt_engine
+
+def load_stt_engine():
+    """Load the transcription engine on startup so the first utterance does not wait for the model"""
+    try:
+        get_stt_engine()
+    except Exception as e:
+        logger.error(f"Could not load speech-to-text engine {STT_ENGINE}: {str(e)}")
+
+def get_stt_executor():
+    """Get the shared transcription executor, creating it on first use"""
+    global _stt_executor
+    with _stt_lock:
+        if _stt_executor is None:
+            _stt_executor = ThreadPoolExecutor(
+                max_workers=STT_MAX_WORKERS,
+                thread_name_prefix="stt"
+            )
+        return _stt_executor
+
+def shutdown_stt_executor():
+    """Shut down the transcription executor (called on application shutdown)"""
+    global _stt_executor
+    with _stt_lock:
+        if _stt_executor is not None:
+            _stt_executor.shutdown(wait=False, cancel_futures=True)
+            _stt_executor = None
+            logger.info("Speech-to-text executor shut down")
+
+async def run_stt(stage, func, *args):
+    """Run a (CPU-bound) engine call off the event loop and time it"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_stt_executor(), func, *args)
+    finally:
+        STT_SECONDS.labels(stage).observe(time.perf_counter() - started)
+
+class Utterance:
+    """Transcription stream of the utterance currently being spoken on a connection"""
+
+    def __init__(self, engine):
+        self.stream = engine.create_stream()
+        self.received = 0
+        self.max_bytes = int(STT_MAX_UTTERANCE_SECONDS * engine.sample_rate) * SAMPLE_WIDTH
+        self.bytes_per_second = engine.sample_rate * SAMPLE_WIDTH
+        STT_STATS["utterances"] += 1
+
+    @property
+    def full(self):
+        return self.received >= self.max_bytes
+
+    async def accept(self, pcm, resampler=None):
+        """Feed a frame (converted by resampler first, if any); returns the new partial text or None"""
+        size, partial = await run_stt("partial", self._accept, pcm, resampler)
+        self.received += size
+        STT_STATS["audio_seconds"] += size / self.bytes_per_second
+        return partial
+
+    def _accept(self, pcm, resampler):
+        # Runs in the STT executor, so resampling stays off the event loop as well
+        if resampler is not None:
+            pcm = resample_pcm16(resampler, pcm)
+        return len(pcm), self.stream.accept(pcm)
+
+    async def finish(self):
+        text = await run_stt("final", self.stream.finish)
+        return {"type": "final", "text": text, "duration": round(self.received / self.bytes_per_second, 3)}
+
 @router.post("/api/speech")
 async def speech_to_text(audio: UploadFile = File(...)):
     """
     Receive audio file and return transcribed text.
+    Decoding, silence trimming and transcription run in the audio process pool.
     """
+    path = None
     try:
         logger.info(f"Received audio file: {audio.filename}")
+        source, path = await asyncio.to_thread(upload_source, audio.file)
+        text, duration, speech_duration = await AUDIO_POOL.run("transcribe", transcribe_file, source)
+
+        STT_STATS["uploads"] += 1
+        STT_STATS["upload_audio_seconds"] += duration
+        STT_STATS["trimmed_seconds"] += duration - speech_duration
+        logger.info(f"Transcribed {speech_duration:.2f}s of speech from {duration:.2f}s of audio")
 
-        # (Simulation) Transcribe here using your model
-        # For now, just return a dummy text
-        transcribed_text = "Hello, this is a dummy transcription."
+        return {
+            "text": text,
+            "duration": round(duration, 3),
+            "speech_duration": round(speech_duration, 3),
+        }
 
-        return {"text": transcribed_text}
-    
+    except AudioPoolBusy as e:
+        logger.warning(f"Rejected audio upload: {str(e)}")
+        raise HTTPException(status_code=503, detail="Audio processing is busy, please retry.", headers={"Retry-After": "2"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Transcription timed out.")
+    except AudioTooLongError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except AudioDecodeError as e:
+        logger.warning(f"Could not decode audio upload: {str(e)}")
+        raise HTTPException(status_code=415, detail=str(e))
     except Exception as e:
         logger.error(f"Error in speech-to-text: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Failed to transcribe audio.")
+    finally:
+        if path is not None:
+            os.unlink(path)
+
+@router.websocket("/api/speech/stream")
+async def speech_stream(websocket: WebSocket):
+    """
+    Stream audio and receive transcripts while the user speaks.
+
+    Client messages:
+        binary frames                     16-bit little-endian mono PCM
+        {"type": "start", "sample_rate"}  optional; audio at other rates than the engine's is resampled
+        {"type": "end"}                   ends the utterance; the next audio starts a new one
+
+    Server messages:
+        {"type": "ready", "sample_rate", "engine"}
+        {"type": "partial", "text"}       whenever the partial transcript changes
+        {"type": "final", "text", "duration"}
+        {"type": "error", "detail"}
+    """
+    await websocket.accept()
+    try:
+        engine = get_stt_engine()
+    except Exception as e:
+        logger.error(f"Speech-to-text engine not available: {str(e)}")
+        await websocket.send_json({"type": "error", "detail": "Speech-to-text engine not available."})
+        await websocket.close(code=1011)
+        return
+
+    STT_STATS["connections"] += 1
+    STT_STATS["active"] += 1
+    utterance = None
+    resampler = None
+    try:
+        await websocket.send_json({"type": "ready", "sample_rate": engine.sample_rate, "engine": engine.name})
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            pcm = message.get("bytes")
+            if pcm is not None:
+                if len(pcm) % SAMPLE_WIDTH:
+                    await websocket.send_json({"type": "error", "detail": "Audio frames must contain whole 16-bit samples."})
+                    continue
+                if utterance is None:
+                    utterance = Utterance(engine)
+                partial = await utterance.accept(pcm, resampler)
+                if partial is not None:
+                    STT_STATS["partials"] += 1
+                    await websocket.send_json({"type": "partial", "text": partial})
+                if utterance.full:
+                    logger.info("Utterance reached the maximum length, finalizing")
+                    await websocket.send_json(await utterance.finish())
+                    utterance = None
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "")
+            except ValueError:
+                control = None
+            if not isinstance(control, dict):
+                await websocket.send_json({"type": "error", "detail": "Invalid control message."})
+                continue
+
+            if control.get("type") == "start":
+                sample_rate = control.get("sample_rate", engine.sample_rate)
+                if not isinstance(sample_rate, int) or not 8000 <= sample_rate <= 192000:
+                    await websocket.send_json({"type": "error", "detail": f"Unsupported sample rate {sample_rate}."})
+                elif sample_rate != engine.sample_rate:
+                    resampler = Resampler(sample_rate, engine.sample_rate)
+                else:
+                    resampler = None
+            elif control.get("type") == "end":
+                if utterance is None:
+                    await websocket.send_json({"type": "final", "text": "", "duration": 0.0})
+                else:
+                    await websocket.send_json(await utterance.finish())
+                    utterance = None
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown message type: {control.get('type')}"})
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        STT_STATS["errors"] += 1
+        logger.error(f"Error in speech stream: {str(e)}")
+        logger.error(traceback.format_exc())
+        try:
+            await websocket.send_json({"type": "error", "detail": "Failed to transcribe audio."})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        STT_STATS["active"] -= 1
+
+@router.get("/api/speech/stats")
+async def speech_stats():
+    """Streaming transcription statistics"""
+    stats = dict(STT_STATS)
+    for key in ("audio_seconds", "upload_audio_seconds", "trimmed_seconds"):
+        stats[key] = round(stats[key], 3)
+    stats["vad_enabled"] = VAD_ENABLED
+    stats["engine"] = _stt_engine.name if _stt_engine is not None else None
+    stats["max_workers"] = STT_MAX_WORKERS
+    stats["pool"] = AUDIO_POOL.stats()
+    return stats
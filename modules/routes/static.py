@@ -0,0 +1,39 @@
+"""
+Static asset and index page route handlers (served from memory)
+"""
+from fastapi import APIRouter, HTTPException, Request
+from modules.logger import get_logger
+from modules.config import STATIC_RELOAD
+from modules.static_assets import AssetStore, asset_response, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+# Setup API Router
+router = APIRouter()
+logger = get_logger("routes.static")
+
+# Application-wide asset store, loaded on startup
+STATIC_ASSETS = AssetStore("static", reload=STATIC_RELOAD)
+
+def load_static_assets():
+    """Read the static directory into memory (called on application startup)"""
+    STATIC_ASSETS.load()
+
+@router.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_file(path: str, request: Request):
+    """
+    Serve a static file from memory. Requests for the current content hash
+    (?v=<version>) may be cached forever; others must revalidate.
+    """
+    asset = STATIC_ASSETS.get(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    versioned = request.query_params.get("v") == asset.version
+    cache_control = IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL
+    return asset_response(asset, request, cache_control)
+
+@router.get("/api/static/stats")
+async def static_stats_endpoint():
+    """
+    Number and size of the static assets held in memory
+    """
+    return STATIC_ASSETS.stats()
@@ -1,29 +1,239 @@
 """
 Text-to-Speech (TTS) route handlers
 """
+import os
+import time
+import asyncio
+import weakref
 import traceback
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from collections import deque
+from typing import Annotated
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from modules.logger import get_logger
-from io import BytesIO
+from modules.models import TTSRequest
+from modules.config import (
+    TTS_SAMPLE_RATE,
+    TTS_VOICE,
+    TTS_LOOKAHEAD,
+    TTS_MAX_CHARS,
+    TTS_ENGINE,
+    TTS_CACHE_ENABLED,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MAX_BYTES,
+)
+from modules.sentences import split_sentences
+from modules.audio import wav_header
+from modules.audio_jobs import synthesize_sentence
+from modules.audio_pool import AUDIO_POOL, AudioPoolBusy
+from modules.metrics import TTS_FIRST_AUDIO_SECONDS, CACHE_HITS, CACHE_MISSES
+from modules.tts_cache import TTSCache
+from modules.static_assets import etag_matches, REVALIDATE_CACHE_CONTROL
 
 router = APIRouter()
 logger = get_logger("routes.tts")
 
-@router.post("/api/tts")
-async def text_to_speech(text: dict):
+TTS_STATS = {
+    "requests": 0,
+    "sentences": 0,
+    "characters": 0,
+    "audio_seconds": 0.0,
+    "errors": 0,
+    "not_modified": 0,
+}
+
+# Bytes per second of the 16-bit mono output
+_BYTES_PER_SECOND = TTS_SAMPLE_RATE * 2
+
+# Complete responses by content address; audio from another engine or rate never matches
+TTS_CACHE = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, namespace=f"{TTS_ENGINE}:{TTS_SAMPLE_RATE}")
+
+def load_tts_cache():
+    """Index the speech cache directory (called on application startup)"""
+    if TTS_CACHE_ENABLED:
+        TTS_CACHE.load()
+
+async def synthesize_sentences(sentences, voice, rate):
+    """
+    Yield the PCM of each sentence in order. Up to TTS_LOOKAHEAD later
+    sentences are synthesized in the audio pool while earlier ones are sent.
+    """
+    remaining = iter(sentences)
+    tasks = deque()
+
+    def submit():
+        sentence = next(remaining, None)
+        if sentence is not None:
+            tasks.append(asyncio.ensure_future(AUDIO_POOL.run("tts", synthesize_sentence, sentence, voice, rate)))
+
+    for _ in range(1 + max(0, TTS_LOOKAHEAD)):
+        submit()
+    try:
+        while tasks:
+            pcm = await tasks.popleft()
+            submit()
+            TTS_STATS["sentences"] += 1
+            TTS_STATS["audio_seconds"] += len(pcm) / _BYTES_PER_SECOND
+            yield pcm
+    finally:
+        # The client went away or a sentence failed: stop synthesizing the rest
+        for task in tasks:
+            task.cancel()
+
+async def stream_audio(header, first, rest, entry=None):
+    """
+    Response body: the header and first sentence, then each later sentence as it is ready.
+    A complete body is also stored in the cache through entry.
+    """
+    completed = False
+    try:
+        if entry is not None:
+            await asyncio.to_thread(entry.write, header + first)
+        yield header + first
+        async for pcm in rest:
+            if entry is not None:
+                await asyncio.to_thread(entry.write, pcm)
+            yield pcm
+        completed = True
+    except Exception as e:
+        # Headers are already sent; the audio just ends early
+        TTS_STATS["errors"] += 1
+        logger.error(f"Error while streaming speech: {str(e)}")
+    finally:
+        await rest.aclose()
+        if entry is not None:
+            if not completed:
+                await asyncio.to_thread(entry.discard)
+            elif header:
+                # The streamed WAV header has open-ended sizes; the stored file gets the real ones
+                await asyncio.to_thread(entry.commit, wav_header(TTS_SAMPLE_RATE, entry.size - len(header)))
+            else:
+                await asyncio.to_thread(entry.commit)
+
+def media_type_for(fmt):
+    if fmt == "wav":
+        return "audio/wav"
+    return f"audio/L16;rate={TTS_SAMPLE_RATE};channels=1"
+
+def cache_headers(key):
+    return {
+        "ETag": f'"{key}"',
+        "Cache-Control": REVALIDATE_CACHE_CONTROL,
+        "X-Sample-Rate": str(TTS_SAMPLE_RATE),
+        "X-TTS-Cache": "hit",
+    }
+
+class CachedFileResponse(FileResponse):
+    """
+    FileResponse for an open cache file, closed once it is sent, or when the
+    response is discarded unsent. The path is the descriptor's /proc path,
+    so the file can be evicted meanwhile. FileResponse hands the path to
+    the server (http.response.pathsend) when it supports it.
+    """
+
+    def __init__(self, hit, key, fmt):
+        self.fd = hit.fd
+        self._close = weakref.finalize(self, os.close, hit.fd)
+        super().__init__(hit.path, media_type=media_type_for(fmt), headers=cache_headers(key))
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._close()
+
+async def speak(request: TTSRequest, http_request: Request):
     """
-    Convert text to speech and return audio file.
+    Convert text to speech: a cached file if this exact speech was produced
+    before, otherwise audio streamed sentence by sentence, starting as soon
+    as the first sentence is synthesized.
     """
     try:
-        logger.info(f"Received text for TTS: {text}")
+        text = request.text.strip()
+        if not text:
+            raise HTTPException(status_code=400, detail="No text to synthesize.")
+        if len(text) > TTS_MAX_CHARS:
+            raise HTTPException(status_code=413, detail=f"Text is longer than {TTS_MAX_CHARS} characters.")
+
+        TTS_STATS["requests"] += 1
+        voice = request.voice or TTS_VOICE
+        key = None
+        if TTS_CACHE.enabled:
+            key = TTS_CACHE.key(text, voice, request.rate, request.format)
+            # The key is the content address: a client holding it has this audio
+            if_none_match = http_request.headers.get("if-none-match")
+            if if_none_match is not None and etag_matches(if_none_match, f'"{key}"'):
+                CACHE_HITS.labels("tts").inc()
+                TTS_STATS["not_modified"] += 1
+                return Response(status_code=304, headers=cache_headers(key))
+            hit = await asyncio.to_thread(TTS_CACHE.open, key, request.format)
+            if hit is not None:
+                CACHE_HITS.labels("tts").inc()
+                return CachedFileResponse(hit, key, request.format)
+            CACHE_MISSES.labels("tts").inc()
 
-        # (Simulation) Generate dummy audio
-        dummy_audio = BytesIO(b"This is dummy audio content.")
+        sentences = split_sentences(text)
+        logger.info(f"Synthesizing {len(text)} characters in {len(sentences)} sentences")
+        TTS_STATS["characters"] += len(text)
 
-        return StreamingResponse(dummy_audio, media_type="audio/mpeg")
-    
+        started = time.perf_counter()
+        pcm_stream = synthesize_sentences(sentences, voice, request.rate)
+        try:
+            # Errors in the first sentence can still be reported with a status code
+            first = await pcm_stream.__anext__()
+        except BaseException:
+            await pcm_stream.aclose()
+            raise
+        TTS_FIRST_AUDIO_SECONDS.observe(time.perf_counter() - started)
+
+        header = wav_header(TTS_SAMPLE_RATE) if request.format == "wav" else b""
+        entry = await asyncio.to_thread(TTS_CACHE.writer, key, request.format) if key is not None else None
+        return StreamingResponse(
+            stream_audio(header, first, pcm_stream, entry),
+            media_type=media_type_for(request.format),
+            headers={
+                "X-Sample-Rate": str(TTS_SAMPLE_RATE),
+                "X-Sentences": str(len(sentences)),
+                "X-TTS-Cache": "miss" if key is not None else "off",
+                # The stream may still end early; only the cached file carries an ETag
+                "Cache-Control": "no-store",
+            },
+        )
+
+    except HTTPException:
+        raise
+    except AudioPoolBusy as e:
+        logger.warning(f"Rejected text-to-speech request: {str(e)}")
+        raise HTTPException(status_code=503, detail="Audio processing is busy, please retry.", headers={"Retry-After": "2"})
+    except asyncio.TimeoutError:
+        TTS_STATS["errors"] += 1
+        raise HTTPException(status_code=504, detail="Speech synthesis timed out.")
     except Exception as e:
+        TTS_STATS["errors"] += 1
         logger.error(f"Error in text-to-speech: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Failed to generate audio.")
+
+@router.post("/api/tts")
+async def text_to_speech(request: TTSRequest, http_request: Request):
+    """Convert text to speech"""
+    return await speak(request, http_request)
+
+@router.get("/api/tts")
+async def text_to_speech_get(request: Annotated[TTSRequest, Query()], http_request: Request):
+    """
+    Convert text to speech; same as POST /api/tts with the fields as query
+    parameters, so browsers can cache the audio and revalidate it by ETag
+    """
+    return await speak(request, http_request)
+
+@router.get("/api/tts/stats")
+async def tts_stats():
+    """Text-to-speech statistics"""
+    stats = dict(TTS_STATS)
+    stats["audio_seconds"] = round(stats["audio_seconds"], 3)
+    stats["engine"] = TTS_ENGINE
+    stats["sample_rate"] = TTS_SAMPLE_RATE
+    stats["lookahead"] = TTS_LOOKAHEAD
+    stats["cache"] = TTS_CACHE.stats()
+    return stats
@@ -0,0 +1,57 @@
+"""
+Incremental sentence splitting for streamed text
+"""
+import re
+from typing import List
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes/brackets)
+# when the next character is whitespace
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+# Short tokens that end with a period but do not end a sentence
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc",
+    "e.g", "i.e", "a.m", "p.m", "no", "approx", "u.s", "u.k",
+}
+
+class SentenceSplitter:
+    """
+    Accumulates text fragments (e.g. streamed tokens) and returns complete
+    sentences as soon as their boundary has been seen
+    """
+
+    def __init__(self, min_length: int = 2):
+        self.buffer = ""
+        self.min_length = min_length
+
+    def feed(self, text: str) -> List[str]:
+        """Add a fragment and return any sentences it completed"""
+        self.buffer += text
+        sentences = []
+        start = 0
+
+        for match in SENTENCE_END_PATTERN.finditer(self.buffer):
+            end = match.end()
+            candidate = self.buffer[start:end].strip()
+
+            # Skip abbreviations such as "Dr." and fragments that are too short
+            last_word = candidate.rsplit(None, 1)[-1].rstrip(".").lower() if candidate else ""
+            if last_word in ABBREVIATIONS or len(candidate) < self.min_length:
+                continue
+
+            sentences.append(candidate)
+            start = end
+
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Return whatever is left in the buffer as a final sentence"""
+        remainder = self.buffer.strip()
+        self.buffer = ""
+        return [remainder] if remainder else []
+
+def split_sentences(text: str) -> List[str]:
+    """Split a complete block of text into sentences"""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
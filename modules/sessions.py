@@ -0,0 +1,198 @@
+"""
+Server-side conversation sessions
+
+Clients create a conversation once and then send only the newest turn;
+the server keeps the history. Sessions live in memory (bounded, expiring
+after SESSION_TTL seconds of inactivity) and can optionally be written to
+an append-only JSON-lines log so they survive restarts. Several worker
+processes may share the log; it is compacted on startup only by a worker
+that has it to itself.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from pathlib import Path
+from modules.logger import get_logger
+from modules.cache import TTLCache
+from modules.models import Message
+from modules.config import SESSION_MAX, SESSION_TTL, SESSION_MAX_MESSAGES, SESSION_LOG_PATH
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = get_logger("sessions")
+
+class SessionStore:
+    """
+    Conversation histories keyed by conversation ID
+    """
+
+    def __init__(self, max_sessions=10000, ttl=3600, max_messages=200, log_path=None):
+        """
+        Args:
+            max_sessions: Maximum number of sessions kept in memory (LRU)
+            ttl: Seconds of inactivity after which a session is dropped
+            max_messages: Maximum number of messages kept per session
+            log_path: Optional append-only log file for persistence
+        """
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.log_path = Path(log_path) if log_path else None
+        # Each append re-inserts the session, which refreshes its TTL
+        self._sessions = TTLCache(max_entries=max_sessions, ttl=ttl, name="sessions")
+        self._log_file = None
+        self._log_lock = threading.Lock()
+        # Shared lock held while the log is open, exclusive while compacting
+        self._lock_file = None
+
+    def create(self, messages=None):
+        """Create a session, optionally seeded with messages; returns its ID"""
+        conversation_id = uuid.uuid4().hex
+        self._sessions.set(conversation_id, [])
+        if messages:
+            self.append(conversation_id, messages)
+        return conversation_id
+
+    def get(self, conversation_id):
+        """Return the message history of a session, or None if unknown or expired"""
+        return self._sessions.get(conversation_id)
+
+    def append(self, conversation_id, messages):
+        """Append messages to a session (creating it if needed) and log them"""
+        history = self._sessions.get(conversation_id)
+        if history is None:
+            history = []
+        history.extend(messages)
+        if len(history) > self.max_messages:
+            del history[:len(history) - self.max_messages]
+        self._sessions.set(conversation_id, history)
+        self._write_log(conversation_id, messages)
+        return history
+
+    def stats(self):
+        """Session store counters"""
+        stats = self._sessions.stats()
+        stats["persistent"] = self.log_path is not None
+        return stats
+
+    def load(self):
+        """
+        Replay the on-disk log into memory (dropping expired sessions) and
+        compact it so it only contains live sessions
+        """
+        if self.log_path is None:
+            return
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        compact = self._lock_log()
+
+        sessions = {}
+        last_seen = {}
+        if self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Partially written last line
+                    conversation_id = record["id"]
+                    sessions.setdefault(conversation_id, []).append(
+                        Message(role=record["role"], content=record["content"])
+                    )
+                    last_seen[conversation_id] = record["ts"]
+
+        cutoff = time.time() - self.ttl
+        live = {cid: history[-self.max_messages:] for cid, history in sessions.items()
+                if last_seen[cid] > cutoff}
+
+        # Oldest first so the most recently active sessions end up most recent in the LRU
+        for conversation_id in sorted(live, key=last_seen.get):
+            self._sessions.set(conversation_id, live[conversation_id])
+
+        if compact:
+            # Rewrite the log with live sessions only, then keep appending to it
+            temp_path = self.log_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for conversation_id, history in live.items():
+                    for msg in history:
+                        f.write(self._log_line(conversation_id, msg, last_seen[conversation_id]))
+            temp_path.replace(self.log_path)
+            if self._lock_file is not None:
+                # Let other workers open the compacted log
+                fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+
+        self._log_file = open(self.log_path, "a", encoding="utf-8")
+        logger.info(f"Loaded {len(live)} sessions from {self.log_path}")
+
+    def close(self):
+        """Close the log file"""
+        with self._log_lock:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _lock_log(self):
+        """
+        Lock the log for this process. Returns True if no other worker has it
+        open, so it can be compacted: replacing it under a worker that is
+        appending to it would lose that worker's writes.
+        """
+        if fcntl is None:
+            return True
+        self._lock_file = open(self.log_path.with_suffix(".lock"), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            # Waits while another worker compacts, then shares the log with it
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+            return False
+
+    def _log_line(self, conversation_id, msg, timestamp):
+        return json.dumps({
+            "id": conversation_id,
+            "role": msg.role,
+            "content": msg.content,
+            "ts": timestamp
+        }) + "\n"
+
+    def _write_log(self, conversation_id, messages):
+        """Append messages to the log (small buffered write, flushed per turn)"""
+        if self._log_file is None:
+            return
+        timestamp = time.time()
+        try:
+            with self._log_lock:
+                for msg in messages:
+                    self._log_file.write(self._log_line(conversation_id, msg, timestamp))
+                self._log_file.flush()
+        except Exception as e:
+            logger.error(f"Error writing session log: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+
+# Application-wide session store
+SESSION_STORE = SessionStore(
+    max_sessions=SESSION_MAX,
+    ttl=SESSION_TTL,
+    max_messages=SESSION_MAX_MESSAGES,
+    log_path=SESSION_LOG_PATH or None
+)
+
+def load_sessions():
+    """Restore persisted sessions (called on application startup)"""
+    try:
+        SESSION_STORE.load()
+    except Exception as e:
+        logger.error(f"Error loading sessions: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+
+def close_sessions():
+    """Close the session log (called on application shutdown)"""
+    SESSION_STORE.close()
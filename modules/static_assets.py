@@ -0,0 +1,322 @@
+"""
+In-memory static asset store with precompression and cache validation
+
+Files under the static directory are read once (on startup), hashed and
+compressed, and then served from memory with ETag / Last-Modified
+validation. URLs carrying the content hash (?v=<version>) are cached by
+browsers for a year; all other requests revalidate and get a 304 when
+nothing changed. In development the store notices changed files and
+reloads them. If modules/build_assets.py has produced a script bundle,
+the index page loads it instead of the individual scripts.
+"""
+import os
+import re
+import gzip
+import json
+import time
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from fastapi import Request
+from fastapi.responses import Response
+from modules.logger import get_logger
+from modules.build_assets import SCRIPT_TAG, DIST_DIR, MANIFEST_NAME
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger("static_assets")
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Compressed variants smaller than this are not worth the extra response header
+MIN_COMPRESS_SIZE = 512
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# References to local assets in the index page, e.g. src="/static/js/app.js?v=3"
+_ASSET_REFERENCE = re.compile(r'(?P<attr>src|href)="/static/(?P<path>[^"?#]+)(?:\?[^"#]*)?"')
+
+mimetypes.add_type("application/javascript", ".js")
+
+class Asset:
+    """One file held in memory with its compressed variants and validators"""
+
+    __slots__ = ("path", "body", "gzip", "br", "content_type", "etag", "version", "mtime", "last_modified")
+
+    def __init__(self, path, body, content_type, mtime, gzip_body=None, br_body=None):
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.gzip = gzip_body
+        self.br = br_body
+        digest = hashlib.sha256(body).hexdigest()
+        self.version = digest[:12]
+        self.etag = f'"{digest[:32]}"'
+        self.mtime = mtime
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+    def variant(self, accept_encoding):
+        """Best (body, content-encoding) pair for an Accept-Encoding header"""
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if self.gzip is not None and "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.body, None
+
+def _is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def _read_precompressed(file_path, suffix, mtime):
+    """Read a build-time compressed sibling (e.g. app.js.br) if it is up to date"""
+    compressed_path = file_path.with_name(file_path.name + suffix)
+    try:
+        if compressed_path.stat().st_mtime >= mtime:
+            return compressed_path.read_bytes()
+    except OSError:
+        pass
+    return None
+
+def build_asset(relative_path, body, content_type, mtime, file_path=None):
+    """
+    Create an Asset, compressing compressible content. Compressed files
+    written next to the source at build time are used when present.
+    """
+    gzip_body = br_body = None
+    if _is_compressible(content_type) and len(body) >= MIN_COMPRESS_SIZE:
+        if file_path is not None:
+            gzip_body = _read_precompressed(file_path, ".gz", mtime)
+            br_body = _read_precompressed(file_path, ".br", mtime)
+        if gzip_body is None:
+            gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        if br_body is None and brotli is not None:
+            br_body = brotli.compress(body, quality=11)
+        # Keep only variants that actually save bytes
+        if gzip_body is not None and len(gzip_body) >= len(body):
+            gzip_body = None
+        if br_body is not None and len(br_body) >= len(body):
+            br_body = None
+    return Asset(relative_path, body, content_type, mtime, gzip_body, br_body)
+
+class AssetStore:
+    """
+    Static files of one directory, loaded into memory
+    """
+
+    def __init__(self, root, index_name="index.html", reload=False):
+        """
+        Args:
+            root: Directory with the static files
+            index_name: Page served at "/", with asset URLs rewritten to versioned ones
+            reload: Check file modification times on every lookup (development)
+        """
+        self.root = Path(root)
+        self.index_name = index_name
+        self.reload = reload
+        self._assets = {}
+        self._index = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read every file under the root directory into memory"""
+        assets = {}
+        if self.root.is_dir():
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    # Build-time compressed variants are picked up with their source
+                    if filename.endswith((".gz", ".br")):
+                        continue
+                    file_path = Path(dirpath) / filename
+                    relative_path = file_path.relative_to(self.root).as_posix()
+                    asset = self._load_file(relative_path, file_path)
+                    if asset is not None:
+                        assets[relative_path] = asset
+
+        with self._lock:
+            self._assets = assets
+            self._index = self._render_index()
+            self._loaded = True
+
+        total = sum(len(asset.body) for asset in assets.values())
+        logger.info(f"Loaded {len(assets)} static assets ({total} bytes) from {self.root}")
+
+    def get(self, relative_path):
+        """Return the Asset for a path relative to the root, or None"""
+        if not self._loaded:
+            self.load()
+        if self.reload:
+            self._refresh(relative_path)
+        return self._assets.get(relative_path)
+
+    def index(self):
+        """The index page with versioned asset URLs, or None if there is none"""
+        if not self._loaded:
+            self.load()
+        if self.reload:
+            # Any referenced asset may have changed its version
+            for relative_path in list(self._assets):
+                self._refresh(relative_path)
+            self._refresh(self.index_name)
+        return self._index
+
+    def url(self, relative_path):
+        """Versioned URL for an asset (unversioned if the asset is unknown)"""
+        asset = self._assets.get(relative_path)
+        if asset is None:
+            return f"/static/{relative_path}"
+        return f"/static/{relative_path}?v={asset.version}"
+
+    def stats(self):
+        """Number and size of the assets held in memory"""
+        assets = list(self._assets.values())
+        return {
+            "assets": len(assets),
+            "bytes": sum(len(asset.body) for asset in assets),
+            "gzip_bytes": sum(len(asset.gzip) for asset in assets if asset.gzip is not None),
+            "br_bytes": sum(len(asset.br) for asset in assets if asset.br is not None),
+            "brotli_available": brotli is not None,
+            "reload": self.reload,
+        }
+
+    def _load_file(self, relative_path, file_path):
+        try:
+            stat = file_path.stat()
+            body = file_path.read_bytes()
+        except OSError as e:
+            logger.warning(f"Could not read static file {file_path}: {str(e)}")
+            return None
+        content_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        return build_asset(relative_path, body, content_type, stat.st_mtime, file_path)
+
+    def _refresh(self, relative_path):
+        """Reload a file if it changed (or appeared) on disk"""
+        file_path = (self.root / relative_path).resolve()
+        if self.root.resolve() not in file_path.parents:
+            return
+        try:
+            mtime = file_path.stat().st_mtime
+        except OSError:
+            if self._assets.pop(relative_path, None) is not None:
+                self._index = self._render_index()
+            return
+
+        current = self._assets.get(relative_path)
+        if current is not None and current.mtime == mtime:
+            return
+        asset = self._load_file(relative_path, file_path)
+        if asset is None:
+            return
+        with self._lock:
+            self._assets[relative_path] = asset
+            self._index = self._render_index()
+        logger.info(f"Reloaded static asset {relative_path}")
+
+    def _render_index(self):
+        """
+        Rewrite asset references in the index page: scripts that are part of
+        a current bundle are replaced by the bundle, and all URLs get the
+        content hash of the file they point to
+        """
+        source = self._assets.get(self.index_name)
+        if source is None:
+            return None
+        html = self._apply_bundles(source.body.decode("utf-8"))
+        html = _ASSET_REFERENCE.sub(
+            lambda m: f'{m.group("attr")}="{self.url(m.group("path"))}"', html
+        )
+        body = html.encode("utf-8")
+        # The page changes with the versions of the files it references, so
+        # it is as new as the newest of them
+        mtime = max(asset.mtime for asset in self._assets.values())
+        if self._index is not None and self._index.body != body and mtime <= self._index.mtime:
+            # Changed without any file getting newer (e.g. one was deleted)
+            mtime = time.time()
+        return build_asset("", body, source.content_type, mtime)
+
+    def _apply_bundles(self, html):
+        """Replace the script tags of bundled sources with one tag for the bundle"""
+        manifest_asset = self._assets.get(f"{DIST_DIR}/{MANIFEST_NAME}")
+        if manifest_asset is None:
+            return html
+        try:
+            bundles = json.loads(manifest_asset.body).get("bundles", {})
+        except ValueError as e:
+            logger.warning(f"Invalid asset manifest: {str(e)}")
+            return html
+
+        for name, bundle in bundles.items():
+            sources = bundle.get("sources", {})
+            current = bundle.get("file") in self._assets and all(
+                path in self._assets and self._assets[path].version == version
+                for path, version in sources.items()
+            )
+            if not current:
+                # Never serve a bundle built from different sources
+                logger.warning(f"Bundle {name} is out of date, serving its sources (run python -m modules.build_assets)")
+                continue
+
+            replaced = False
+
+            def replace(match):
+                nonlocal replaced
+                if match.group("path") not in sources:
+                    return match.group(0)
+                if replaced:
+                    return ""
+                replaced = True
+                return f'<script src="/static/{bundle["file"]}"></script>'
+
+            html = SCRIPT_TAG.sub(replace, html)
+        return html
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header matches etag (weak comparison)"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag == etag or tag == f"W/{etag}" for tag in candidates)
+
+def _not_modified_since(if_modified_since, mtime):
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def asset_response(asset: Asset, request: Request, cache_control=REVALIDATE_CACHE_CONTROL):
+    """
+    Serve an asset from memory: 304 if the client's copy is current,
+    otherwise the best compressed variant it accepts
+    """
+    headers = {
+        "ETag": asset.etag,
+        "Last-Modified": asset.last_modified,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, asset.etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = if_modified_since is not None and _not_modified_since(if_modified_since, asset.mtime)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    body, encoding = asset.variant(request.headers.get("accept-encoding", ""))
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(body))
+        return Response(status_code=200, headers=headers, media_type=asset.content_type)
+    return Response(content=body, headers=headers, media_type=asset.content_type)
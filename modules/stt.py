@@ -0,0 +1,140 @@
+"""
+Pluggable speech-to-text engines for streaming transcription
+
+An engine creates one stream per utterance. Audio is fed to the stream
+as it arrives (16-bit little-endian mono PCM at the engine's sample
+rate) and the stream returns partial transcripts along the way and a
+final transcript when the utterance ends.
+
+Engines:
+    dummy  Deterministic stand-in (no model) for development and tests
+    vosk   Local CPU model via the optional vosk package
+"""
+import json
+from typing import Optional
+
+# Bytes per sample of 16-bit PCM
+SAMPLE_WIDTH = 2
+
+class STTStream:
+    """Transcription state of one utterance"""
+
+    def accept(self, pcm: bytes) -> Optional[str]:
+        """Feed audio; returns the current partial transcript (or None if unchanged)"""
+        raise NotImplementedError
+
+    def finish(self) -> str:
+        """End the utterance and return the final transcript"""
+        raise NotImplementedError
+
+class STTEngine:
+    """Factory for transcription streams"""
+
+    name = "engine"
+    sample_rate = 16000
+
+    def create_stream(self) -> STTStream:
+        raise NotImplementedError
+
+class DummySTTStream(STTStream):
+    """
+    Reveals one word of a fixed phrase per `seconds_per_word` of audio, so
+    partial results depend only on how much audio was received
+    """
+
+    def __init__(self, words, bytes_per_word):
+        self.words = words
+        self.bytes_per_word = bytes_per_word
+        self.received = 0
+        self.revealed = 0
+
+    def _text(self, count):
+        return " ".join(self.words[:count])
+
+    def accept(self, pcm):
+        self.received += len(pcm)
+        count = min(len(self.words), self.received // self.bytes_per_word)
+        if count == self.revealed:
+            return None
+        self.revealed = count
+        return self._text(count)
+
+    def finish(self):
+        if not self.received:
+            return ""
+        return self._text(len(self.words))
+
+class DummySTTEngine(STTEngine):
+    """Deterministic stand-in that needs no model"""
+
+    name = "dummy"
+
+    def __init__(self, phrase="Hello, this is a dummy transcription.", seconds_per_word=0.3, sample_rate=16000):
+        self.words = phrase.split()
+        self.sample_rate = sample_rate
+        self.bytes_per_word = max(1, int(seconds_per_word * sample_rate) * SAMPLE_WIDTH)
+
+    def create_stream(self):
+        return DummySTTStream(self.words, self.bytes_per_word)
+
+class VoskSTTStream(STTStream):
+    """Wraps a Vosk KaldiRecognizer; finished segments are kept until the utterance ends"""
+
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.segments = []
+        self.last_partial = None
+
+    def _combined(self, current):
+        return " ".join(part for part in self.segments + [current] if part)
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(pcm):
+            # Vosk detected a pause and finalized a segment
+            self.segments.append(json.loads(self.recognizer.Result()).get("text", ""))
+            partial = self._combined("")
+        else:
+            partial = self._combined(json.loads(self.recognizer.PartialResult()).get("partial", ""))
+        if partial == self.last_partial:
+            return None
+        self.last_partial = partial
+        return partial
+
+    def finish(self):
+        return self._combined(json.loads(self.recognizer.FinalResult()).get("text", ""))
+
+class VoskSTTEngine(STTEngine):
+    """Local CPU transcription with a Vosk model (requires the vosk package)"""
+
+    name = "vosk"
+
+    def __init__(self, model_path, sample_rate=16000):
+        try:
+            import vosk
+        except ImportError:
+            raise ImportError("The vosk package is required for the vosk speech-to-text engine")
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.sample_rate = sample_rate
+        # Loading the model is slow and it is shared by all streams
+        self.model = vosk.Model(model_path)
+
+    def create_stream(self):
+        recognizer = self._vosk.KaldiRecognizer(self.model, self.sample_rate)
+        return VoskSTTStream(recognizer)
+
+def create_stt_engine(kind, model_path=None, sample_rate=16000):
+    """
+    Create a speech-to-text engine by name.
+
+    Args:
+        kind: "dummy" or "vosk"
+        model_path: Model directory for the vosk engine
+        sample_rate: Sample rate of the PCM audio fed to the engine
+    """
+    kind = (kind or "dummy").lower()
+    if kind == "dummy":
+        return DummySTTEngine(sample_rate=sample_rate)
+    if kind == "vosk":
+        return VoskSTTEngine(model_path, sample_rate=sample_rate)
+    raise ValueError(f"Unknown speech-to-text engine: {kind}")
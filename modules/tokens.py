@@ -0,0 +1,170 @@
+"""
+Prompt token counting and context window management for chat
+
+Token counts use tiktoken when it is installed and its encoding can be
+loaded; otherwise a character-based estimate is used. Either way the
+counts are only used for budgeting, the authoritative numbers are the
+usage figures OpenAI returns.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple
+from modules.logger import get_logger
+from modules.config import OPENAI_MODEL
+from modules.sentences import split_sentences
+
+logger = get_logger("tokens")
+
+# Tokens the chat format adds per message (role, separators) and per reply
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+# Rough characters per token for English text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+SUMMARY_HEADER = "Summary of the earlier conversation (older messages were shortened):"
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Token counts of recently seen texts, keyed by digest and length so the
+# cache holds no message text (request bodies may be up to 256 KB each)
+TOKEN_COUNT_CACHE_SIZE = 4096
+_token_counts = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def load_tokenizer(model=OPENAI_MODEL):
+    """
+    Load the tiktoken encoding for the model once (called on startup, since
+    tiktoken may download the encoding the first time). Returns None if
+    tiktoken is not installed or the encoding cannot be loaded.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if _encoding_loaded:
+            return _encoding
+        _encoding_loaded = True
+        try:
+            import tiktoken
+        except ImportError:
+            logger.info("tiktoken not installed, estimating prompt tokens from text length")
+            return None
+        try:
+            try:
+                _encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            logger.info(f"Loaded tiktoken encoding {_encoding.name} for {model}")
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding, estimating prompt tokens: {str(e)}")
+        return _encoding
+
+def _count_tokens_uncached(text):
+    encoding = _encoding if _encoding_loaded else load_tokenizer()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def count_tokens(text):
+    """
+    Number of tokens in a piece of text. Cached, because the same history
+    messages are counted again on every turn of a conversation.
+    """
+    key = (hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest(), len(text))
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+
+    count = _count_tokens_uncached(text)
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+def count_message_tokens(message):
+    """Tokens used by one chat message ({"role", "content"} dict)"""
+    return TOKENS_PER_MESSAGE + count_tokens(message["content"])
+
+class ContextWindow(NamedTuple):
+    messages: List[dict]     # messages to send, oldest first
+    prompt_tokens: int       # estimated prompt tokens of those messages
+    dropped: int             # history messages that did not fit the budget
+    summarized: int          # dropped messages represented in the summary
+
+def summarize_messages(messages, budget):
+    """
+    Cheap extractive summary of dropped turns: the first sentence of each,
+    newest first, until the token budget is used up. Returns a system
+    message and the number of turns it covers, or (None, 0).
+    """
+    lines = []
+    used = TOKENS_PER_MESSAGE + count_tokens(SUMMARY_HEADER)
+    for message in reversed(messages):
+        sentences = split_sentences(message["content"])
+        if not sentences:
+            continue
+        line = f"- {message['role']}: {sentences[0]}"
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+
+    if not lines:
+        return None, 0
+    lines.reverse()
+    return {"role": "system", "content": "\n".join([SUMMARY_HEADER] + lines)}, len(lines)
+
+def fit_context_window(preamble, history, budget, summary_budget=0):
+    """
+    Trim the conversation history so the prompt fits the token budget.
+
+    The preamble (system prompt, search context) and the newest history
+    message are always kept; older messages are dropped oldest first. If
+    summary_budget is set, dropped turns are replaced by a short summary.
+
+    Args:
+        preamble: System messages placed before the history
+        history: Conversation messages, oldest first
+        budget: Maximum prompt tokens (0 disables trimming)
+        summary_budget: Tokens reserved for the summary of dropped turns
+    """
+    history_tokens = [count_message_tokens(message) for message in history]
+    preamble_tokens = sum(count_message_tokens(message) for message in preamble) + TOKENS_PER_REPLY
+    total = preamble_tokens + sum(history_tokens)
+
+    if not budget or total <= budget:
+        return ContextWindow(preamble + history, total, 0, 0)
+
+    # Keep the newest messages that fit next to the summary allowance
+    # (which never takes more than half of what the preamble leaves)
+    summary_budget = min(summary_budget, max(0, budget - preamble_tokens) // 2)
+    available = budget - preamble_tokens - summary_budget
+    kept = 0
+    used = 0
+    for tokens in reversed(history_tokens):
+        if kept and used + tokens > available:
+            break
+        kept += 1
+        used += tokens
+
+    dropped_messages = history[:len(history) - kept]
+    kept_messages = history[len(history) - kept:]
+
+    summary, summarized = (None, 0)
+    summary_budget = min(summary_budget, budget - preamble_tokens - used)
+    if summary_budget > 0 and dropped_messages:
+        summary, summarized = summarize_messages(dropped_messages, summary_budget)
+
+    messages = list(preamble)
+    if summary is not None:
+        messages.append(summary)
+        used += count_message_tokens(summary)
+    messages.extend(kept_messages)
+
+    return ContextWindow(messages, preamble_tokens + used, len(dropped_messages), summarized)
@@ -0,0 +1,53 @@
+"""
+Request-scoped tracing: request IDs and per-stage timing spans
+
+Both live in context variables, so they follow a request into the tasks
+it creates (search, OpenAI) without being passed around explicitly.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_request_id = ContextVar("request_id", default=None)
+_spans = ContextVar("spans", default=None)
+
+def new_request_id():
+    """Short random request ID"""
+    return uuid.uuid4().hex[:16]
+
+def start_request(request_id):
+    """Begin tracing a request in the current context; returns a reset token"""
+    return _request_id.set(request_id), _spans.set([])
+
+def end_request(tokens):
+    """Restore the context saved by start_request"""
+    request_token, spans_token = tokens
+    _request_id.reset(request_token)
+    _spans.reset(spans_token)
+
+def current_request_id():
+    """ID of the request being handled, or None outside a request"""
+    return _request_id.get()
+
+def record_span(name, duration):
+    """Record that a stage of the current request took duration seconds"""
+    spans = _spans.get()
+    if spans is not None:
+        spans.append((name, duration))
+
+@contextmanager
+def span(name):
+    """Time a block as a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+def server_timing(total=None):
+    """Server-Timing header value for the spans recorded so far"""
+    entries = [f"{name};dur={duration * 1000:.2f}" for name, duration in _spans.get() or ()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
@@ -0,0 +1,110 @@
+"""
+Pluggable text-to-speech engines
+
+An engine turns one sentence into mono int16 samples at its sample rate.
+Sentences are synthesized independently, so a reply can be streamed
+sentence by sentence (see modules/routes/tts.py).
+
+Engines:
+    tone    Deterministic stand-in (one tone per word) for development and tests
+    espeak  Local CPU synthesis with the espeak-ng command line tool
+"""
+import io
+import shutil
+import subprocess
+import numpy as np
+from modules.audio import decode_wav, AudioDecodeError
+
+class TTSEngine:
+    """Synthesizes one sentence at a time"""
+
+    name = "engine"
+    sample_rate = 22050
+
+    def synthesize(self, text, voice=None, rate=1.0):
+        """Return the speech for text as mono int16 samples at self.sample_rate"""
+        raise NotImplementedError
+
+class ToneTTSEngine(TTSEngine):
+    """
+    Renders every word as a short tone whose pitch and length depend only
+    on the word, so the same text always gives the same audio
+    """
+
+    name = "tone"
+
+    def __init__(self, sample_rate=22050, seconds_per_char=0.06, word_gap=0.05, sentence_pause=0.25):
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+        self.word_gap = word_gap
+        self.sentence_pause = sentence_pause
+
+    def _tone(self, word, rate):
+        length = int(self.sample_rate * self.seconds_per_char * max(2, len(word)) / rate)
+        frequency = 140.0 + (sum(word.encode("utf-8")) % 40) * 5.0
+        t = np.arange(length, dtype=np.float32) / self.sample_rate
+        tone = 0.3 * np.sin(2 * np.pi * frequency * t)
+        # 5 ms fades avoid clicks at the word edges
+        fade = min(length // 2, int(self.sample_rate * 0.005))
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            tone[:fade] *= ramp
+            tone[length - fade:] *= ramp[::-1]
+        return tone
+
+    def synthesize(self, text, voice=None, rate=1.0):
+        gap = np.zeros(int(self.sample_rate * self.word_gap / rate), dtype=np.float32)
+        parts = []
+        for word in text.split():
+            parts.append(self._tone(word, rate))
+            parts.append(gap)
+        parts.append(np.zeros(int(self.sample_rate * self.sentence_pause / rate), dtype=np.float32))
+        return (np.concatenate(parts) * 32767).astype(np.int16)
+
+class EspeakTTSEngine(TTSEngine):
+    """Local synthesis with espeak-ng (must be installed)"""
+
+    name = "espeak"
+
+    # espeak-ng's default speed in words per minute
+    BASE_WPM = 175
+
+    def __init__(self, executable="espeak-ng", sample_rate=22050, default_voice="en-us", timeout=30):
+        self.executable = shutil.which(executable)
+        if self.executable is None:
+            raise RuntimeError(f"{executable} is required for the espeak text-to-speech engine")
+        self.sample_rate = sample_rate
+        self.default_voice = default_voice
+        self.timeout = timeout
+
+    def synthesize(self, text, voice=None, rate=1.0):
+        command = [
+            self.executable, "--stdout",
+            "-v", voice or self.default_voice,
+            "-s", str(int(self.BASE_WPM * rate)),
+            "--", text,
+        ]
+        result = subprocess.run(command, capture_output=True, timeout=self.timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"espeak-ng failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        try:
+            return decode_wav(io.BytesIO(result.stdout), self.sample_rate).samples
+        except AudioDecodeError as e:
+            raise RuntimeError(f"espeak-ng returned invalid audio: {str(e)}")
+
+def create_tts_engine(kind, sample_rate=22050, default_voice="en-us", espeak_path="espeak-ng"):
+    """
+    Create a text-to-speech engine by name.
+
+    Args:
+        kind: "tone" or "espeak"
+        sample_rate: Sample rate of the produced audio
+        default_voice: Voice used when a request does not name one (espeak)
+        espeak_path: espeak-ng executable
+    """
+    kind = (kind or "tone").lower()
+    if kind == "tone":
+        return ToneTTSEngine(sample_rate=sample_rate)
+    if kind == "espeak":
+        return EspeakTTSEngine(espeak_path, sample_rate=sample_rate, default_voice=default_voice)
+    raise ValueError(f"Unknown text-to-speech engine: {kind}")
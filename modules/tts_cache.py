@@ -0,0 +1,284 @@
+"""
+Content-addressed disk cache for synthesized speech
+
+The avatar says the same phrases over and over (greetings, "let me check
+that for you", error messages). Each complete /api/tts response body is
+stored as a file named after the hash of what produced it: the normalized
+text, voice, rate and format plus the engine and sample rate. A repeated
+request is then answered with the file itself (sent by the server without
+copying it through Python where the server supports it) and the hash as
+a strong ETag. Files are evicted least recently used first once the cache
+is over its size limit; the order survives restarts through file mtimes.
+
+Worker processes can share the directory. Each keeps its own index and
+size total, picks up files stored by the others when they are requested,
+and recounts the directory every RESCAN_INTERVAL stores, so the size limit
+holds for the directory as a whole give or take the files stored since
+the last recount.
+
+All methods do blocking disk I/O; call them off the event loop.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import NamedTuple
+from modules.logger import get_logger
+
+logger = get_logger("tts_cache")
+
+# Bump to invalidate every stored file (e.g. when an engine's output changes)
+CACHE_VERSION = 1
+
+# Stores after which the directory is recounted to include other workers' files
+RESCAN_INTERVAL = 50
+
+# Seconds after which a temporary file is assumed to be left behind by a
+# crashed writer; younger ones may still be written by a live worker
+TEMP_MAX_AGE = 3600
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Text as far as synthesis is concerned: NFC with whitespace collapsed"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+class CacheHit(NamedTuple):
+    fd: int    # open descriptor of the cached file (the caller closes it)
+    path: str  # path to send: the descriptor's /proc path where available
+
+class CacheEntryWriter:
+    """A response body being written to a temporary file until it is complete"""
+
+    def __init__(self, cache, key, fmt, file, temp_path):
+        self.cache = cache
+        self.key = key
+        self.format = fmt
+        self.size = 0
+        self._file = file
+        self._temp_path = temp_path
+
+    def write(self, data):
+        if self._file is None:
+            return
+        try:
+            self._file.write(data)
+            self.size += len(data)
+        except OSError as e:
+            logger.warning(f"Could not write speech cache entry: {str(e)}")
+            self.discard()
+
+    def commit(self, header=None):
+        """
+        Store the file in the cache.
+
+        Args:
+            header: Bytes written over the start of the file first, e.g. a WAV
+                    header with the final sizes in place of the streamed one
+        """
+        if self._file is None:
+            return
+        try:
+            if header:
+                self._file.seek(0)
+                self._file.write(header)
+            self._file.close()
+            self._file = None
+            self.cache._store(self.key, self.format, self._temp_path, self.size)
+        except OSError as e:
+            logger.warning(f"Could not store speech cache entry: {str(e)}")
+            self.discard()
+
+    def discard(self):
+        """Drop an incomplete body (synthesis failed or the client went away)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.unlink(self._temp_path)
+        except OSError:
+            pass
+
+class TTSCache:
+    """Size-bounded, least recently used file cache of speech responses"""
+
+    def __init__(self, directory, max_bytes, namespace=""):
+        """
+        Args:
+            directory: Where the files are kept
+            max_bytes: Total size of the stored files
+            namespace: Part of every key, e.g. the engine name and sample rate,
+                       so changing them does not serve audio made by the old ones
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.namespace = namespace
+        self.enabled = False
+        self._entries = OrderedDict()  # key -> (path, size), least recently used first
+        self._size = 0
+        self._stores = 0
+        self._lock = threading.Lock()
+        self.stats_counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def key(self, text, voice, rate, fmt):
+        """Content address of a response"""
+        key_data = json.dumps(
+            [CACHE_VERSION, self.namespace, normalize_text(text), voice, round(float(rate), 3), fmt],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def path(self, key, fmt):
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def load(self):
+        """Create the directory and index the files already in it"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._rescan(remove_temp=True)
+        except OSError as e:
+            logger.error(f"Speech cache disabled, cannot use {self.directory}: {str(e)}")
+            return
+        self.enabled = True
+        logger.info(f"Speech cache loaded: {len(self._entries)} files, {self._size} bytes in {self.directory}")
+
+    def open(self, key, fmt):
+        """
+        Open the cached file for key; returns a CacheHit, or None on a miss.
+        The open descriptor keeps the file readable even if it is evicted
+        (here or by another worker) while it is being sent.
+        """
+        if not self.enabled:
+            return None
+        path = self.path(key, fmt)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            with self._lock:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    # Evicted by another worker
+                    self._size -= entry[1]
+            self.stats_counters["misses"] += 1
+            return None
+
+        try:
+            size = os.fstat(fd).st_size
+            # Record the use on disk, so the eviction order is shared and survives restarts
+            os.utime(fd if os.utime in os.supports_fd else path)
+        except OSError:
+            os.close(fd)
+            self.stats_counters["misses"] += 1
+            return None
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                # Stored by another worker
+                self._size += size
+            self._entries[key] = (path, size)
+        self.stats_counters["hits"] += 1
+
+        proc_path = f"/proc/self/fd/{fd}"
+        return CacheHit(fd, proc_path if os.path.exists(proc_path) else path)
+
+    def writer(self, key, fmt):
+        """Start writing a response body for key; None if it cannot be cached"""
+        if not self.enabled:
+            return None
+        try:
+            # Same directory as the final file, so storing it is an atomic rename
+            directory = os.path.dirname(self.path(key, fmt))
+            os.makedirs(directory, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=directory)
+            return CacheEntryWriter(self, key, fmt, os.fdopen(handle, "wb"), temp_path)
+        except OSError as e:
+            logger.warning(f"Could not start speech cache entry: {str(e)}")
+            return None
+
+    def _store(self, key, fmt, temp_path, size):
+        if size > self.max_bytes:
+            os.unlink(temp_path)
+            return
+        path = self.path(key, fmt)
+        os.replace(temp_path, path)
+        self.stats_counters["stores"] += 1
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                # The same response, finished by a concurrent request
+                self._size -= previous[1]
+            self._entries[key] = (path, size)
+            self._size += size
+            self._stores += 1
+            rescan = self._stores % RESCAN_INTERVAL == 0
+            evicted = [] if rescan else self._evict_locked()
+        if rescan:
+            self._rescan()
+        else:
+            self._unlink(evicted)
+
+    def _rescan(self, remove_temp=False):
+        """Rebuild the index and size total from the directory, then evict"""
+        found = []
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith(".tmp"):
+                        if remove_temp and now - stat.st_mtime > TEMP_MAX_AGE:
+                            # Left behind by an interrupted write
+                            os.unlink(path)
+                        continue
+                except FileNotFoundError:
+                    # Evicted or renamed by another worker meanwhile
+                    continue
+                found.append((stat.st_mtime, name.split(".", 1)[0], path, stat.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            for _, key, path, size in sorted(found):
+                self._entries[key] = (path, size)
+                self._size += size
+            evicted = self._evict_locked()
+        self._unlink(evicted)
+
+    def _evict_locked(self):
+        evicted = []
+        while self._size > self.max_bytes and self._entries:
+            _, (path, size) = self._entries.popitem(last=False)
+            self._size -= size
+            evicted.append(path)
+        self.stats_counters["evictions"] += len(evicted)
+        return evicted
+
+    def _unlink(self, paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        stats = dict(self.stats_counters)
+        stats.update({
+            "enabled": self.enabled,
+            "files": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        })
+        return stats
@@ -0,0 +1,125 @@
+"""
+Voice activity detection and silence trimming
+
+Audio is cut into fixed-length frames; each frame's energy (dBFS) and
+zero-crossing rate are computed for all frames at once with NumPy.
+A frame is speech if it is loud enough (voiced), or slightly quieter
+but with a high zero-crossing rate (unvoiced sounds such as "s" or
+"f"). Short pauses inside speech are kept, short noise bursts are
+dropped, and every segment gets some padding so word edges survive.
+"""
+from typing import List, NamedTuple, Tuple
+import numpy as np
+
+# Unvoiced sounds are quieter than vowels; they may be this much below the energy threshold
+UNVOICED_MARGIN_DB = 10.0
+
+# Floor for the energy of digital silence (avoids log10(0))
+_MIN_ENERGY = 1e-10
+
+class VADResult(NamedTuple):
+    """Speech segments found in a signal"""
+    segments: List[Tuple[int, int]]  # (start, end) sample indices
+    speech_samples: int
+    total_samples: int
+
+def to_float(samples):
+    """Samples as float32 in [-1, 1] (int16 PCM is scaled, float input is used as is)"""
+    samples = np.asarray(samples)
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
+
+def frame_features(samples, frame_length):
+    """
+    Energy in dBFS and zero-crossing rate of consecutive, non-overlapping
+    frames (a trailing partial frame is ignored)
+
+    Args:
+        samples: Mono float samples in [-1, 1]
+        frame_length: Samples per frame
+    """
+    count = len(samples) // frame_length
+    frames = samples[:count * frame_length].reshape(count, frame_length)
+    energy = np.einsum("ij,ij->i", frames, frames) / frame_length
+    energy_db = 10.0 * np.log10(np.maximum(energy, _MIN_ENERGY))
+    signs = np.signbit(frames)
+    crossings = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy_db, crossings / max(1, frame_length - 1)
+
+def _runs(mask):
+    """Start and end (exclusive) indices of the True runs in a boolean array"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+def _mask_from_runs(starts, ends, length):
+    """Boolean array that is True inside the given runs (overlapping runs merge)"""
+    delta = np.zeros(length + 1, dtype=np.int32)
+    np.add.at(delta, starts, 1)
+    np.add.at(delta, ends, -1)
+    return np.cumsum(delta[:-1]) > 0
+
+def detect_speech(samples, sample_rate, energy_threshold_db=-45.0, zcr_threshold=0.25,
+                  frame_ms=20, min_speech_ms=120, min_silence_ms=300, padding_ms=150):
+    """
+    Find the speech segments of a mono signal.
+
+    Args:
+        samples: Mono int16 PCM or float samples in [-1, 1]
+        sample_rate: Sample rate in Hz
+        energy_threshold_db: Frame energy (dBFS) above which a frame is voiced speech
+        zcr_threshold: Zero-crossing rate above which a quieter frame counts as unvoiced speech
+        frame_ms: Frame length
+        min_speech_ms: Shorter bursts of sound are dropped as noise
+        min_silence_ms: Shorter pauses inside speech are kept
+        padding_ms: Audio kept before and after each segment
+    """
+    samples = to_float(samples)
+    total = len(samples)
+    frame_length = max(1, int(sample_rate * frame_ms / 1000))
+    energy_db, zcr = frame_features(samples, frame_length)
+    count = len(energy_db)
+    if not count:
+        return VADResult([], 0, total)
+
+    voiced = energy_db >= energy_threshold_db
+    unvoiced = (energy_db >= energy_threshold_db - UNVOICED_MARGIN_DB) & (zcr >= zcr_threshold)
+    speech = voiced | unvoiced
+
+    # Fill pauses that are too short to end an utterance (not leading/trailing silence)
+    starts, ends = _runs(~speech)
+    short = (ends - starts < min_silence_ms / frame_ms) & (starts > 0) & (ends < count)
+    speech |= _mask_from_runs(starts[short], ends[short], count)
+
+    # Drop sounds too short to be speech
+    starts, ends = _runs(speech)
+    keep = ends - starts >= min_speech_ms / frame_ms
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return VADResult([], 0, total)
+
+    # Pad the segments; padded segments that overlap are merged
+    padding = int(round(padding_ms / frame_ms))
+    speech = _mask_from_runs(np.maximum(starts - padding, 0), np.minimum(ends + padding, count), count)
+    starts, ends = _runs(speech)
+
+    segment_starts = starts * frame_length
+    # The trailing partial frame belongs to a segment that reaches the last frame
+    segment_ends = np.where(ends == count, total, ends * frame_length)
+    segments = list(zip(segment_starts.tolist(), segment_ends.tolist()))
+    return VADResult(segments, int((segment_ends - segment_starts).sum()), total)
+
+def trim_silence(samples, sample_rate, **params):
+    """
+    Remove silence from a signal; returns (speech samples, VADResult).
+    The result has the dtype of the input. Parameters as for detect_speech.
+    """
+    samples = np.asarray(samples)
+    result = detect_speech(samples, sample_rate, **params)
+    if not result.segments:
+        return samples[:0], result
+    if len(result.segments) == 1:
+        start, end = result.segments[0]
+        return samples[start:end], result
+    return np.concatenate([samples[start:end] for start, end in result.segments]), result
@@ -175,6 +175,27 @@
 // Add a global speech synthesis variable to track current speech
 let currentSpeechSynthesis = null;
 
+// Abort controller for the chat request in flight, so stopping speech also
+// cancels the server-side work (search, OpenAI generation)
+let currentChatController = null;
+
+// Start a new chat request, aborting any previous one
+function beginChatRequest() {
+    if (currentChatController) {
+        currentChatController.abort();
+    }
+    currentChatController = new AbortController();
+    return currentChatController.signal;
+}
+
+// Abort the chat request in flight, if any
+function abortChatRequest() {
+    if (currentChatController) {
+        currentChatController.abort();
+        currentChatController = null;
+    }
+}
+
 // Function to test the API connection
 async function testAPI() {
     try {
@@ -188,16 +209,48 @@ async function testAPI() {
     }
 }
 
+// Server-side conversation ID; after the first turn only the newest
+// message is sent and the server keeps the history
+let conversationId = null;
+
+// POST a chat request. Sends only the last message when a conversation is
+// open, and resends the full history if the server no longer has it.
+// Extra request fields (e.g. response_mode) are passed in options.
+async function postChatRequest(url, messages, options = {}) {
+    const history = messages.slice(0, -1);
+    const message = messages[messages.length - 1];
+    const signal = beginChatRequest();
+
+    const post = (body) => fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ ...options, ...body }),
+        signal
+    });
+
+    if (conversationId) {
+        const response = await post({ conversation_id: conversationId, message });
+        if (response.status !== 404) {
+            return response;
+        }
+        console.info('Conversation expired on the server, resending history');
+        return post({ conversation_id: conversationId, messages: history, message });
+    }
+    return post({ messages: history, message });
+}
+
+// Forget the server-side conversation (e.g. when the chat is cleared)
+function resetConversation() {
+    conversationId = null;
+}
+
 // Function to send user message and get AI response
 async function sendMessage(messages) {
     try {
-        const response = await fetch('/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ messages })
-        });
+        // Compact mode: the server returns just the content and usage
+        const response = await postChatRequest('/api/chat', messages, { response_mode: 'compact' });
         
         if (!response.ok) {
             throw new Error(`API error: ${response.status}`);
@@ -205,9 +258,12 @@ async function sendMessage(messages) {
         
         const data = await response.json();
         console.info('AI response received:', data);
+        if (data.conversation_id) {
+            conversationId = data.conversation_id;
+        }
         
-        if (data.choices && data.choices.length > 0) {
-            return data.choices[0].message.content;
+        if (typeof data.content === 'string') {
+            return data.content;
         } else {
             throw new Error('Invalid response format');
         }
@@ -217,6 +273,68 @@ async function sendMessage(messages) {
     }
 }
 
+// Function to stream the AI response as Server-Sent Events.
+// Calls onToken for every text fragment and onSentence for every complete
+// sentence, so speech can start before the whole reply has been generated.
+// Resolves with the full response text.
+async function streamMessage(messages, { onToken, onSentence } = {}) {
+    const response = await postChatRequest('/api/chat/stream', messages);
+
+    if (!response.ok || !response.body) {
+        throw new Error(`API error: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            }
+
+            const payload = data ? JSON.parse(data) : {};
+
+            if (eventName === 'token') {
+                content += payload.content;
+                if (onToken) onToken(payload.content);
+            } else if (eventName === 'sentence') {
+                if (onSentence) onSentence(payload.text);
+            } else if (eventName === 'done') {
+                content = payload.content;
+                if (payload.conversation_id) {
+                    conversationId = payload.conversation_id;
+                }
+            } else if (eventName === 'error') {
+                throw new Error(payload.detail || 'Streaming error');
+            }
+        }
+    }
+
+    console.info('AI streamed response received:', content);
+    return content;
+}
+
 // Function to convert text to speech
 async function textToSpeech(text) {
     console.info('textToSpeech called with text:', text);
@@ -227,6 +345,13 @@ async function textToSpeech(text) {
             stopSpeech();
         }
 
+        // The server splits the reply into sentences and streams them
+        if (useServerSpeech()) {
+            speakSentenceOnServer(text);
+            finishSpeechQueue();
+            return true;
+        }
+
         // Get available voices
         const voices = window.speechSynthesis.getVoices();
         console.info('Available voices:', voices.length);
@@ -276,16 +401,252 @@ async function textToSpeech(text) {
     }
 }
 
+// Sentence speech queue used while a response is being streamed
+const speechQueue = {
+    pending: 0,
+    started: false,
+    finished: false
+};
+
+// Pick the voice used for the avatar
+function selectVoice() {
+    const voices = window.speechSynthesis.getVoices();
+    return voices.find(v => v.name.includes('David')) || 
+           voices.find(v => v.lang === 'en-US') || 
+           voices[0];
+}
+
+// Signal the end of speech once the queue is drained and the stream is done
+function checkSpeechQueueEnded() {
+    if (speechQueue.finished && speechQueue.pending === 0) {
+        const wasStarted = speechQueue.started;
+        speechQueue.started = false;
+        speechQueue.finished = false;
+        currentSpeechSynthesis = null;
+        document.getElementById('stopButton').disabled = true;
+        if (wasStarted) {
+            document.dispatchEvent(new CustomEvent('speechEnded'));
+        }
+    }
+}
+
+// Signal the start of speech for the first sentence of a reply
+function markSpeechStarted() {
+    if (!speechQueue.started) {
+        speechQueue.started = true;
+        console.info('Speech started');
+        document.dispatchEvent(new CustomEvent('speechStarted'));
+    }
+}
+
+// Server text-to-speech (/api/tts), used when the browser has no speech
+// synthesis or window.USE_SERVER_TTS is set. Each sentence is requested as
+// soon as it is known and its audio is scheduled through Web Audio while it
+// streams in, right after the audio queued before it.
+const serverSpeech = {
+    context: null,
+    nextStartTime: 0,
+    chain: Promise.resolve(),
+    controllers: new Set(),
+    sources: new Set(),
+    generation: 0
+};
+
+function useServerSpeech() {
+    return Boolean(window.USE_SERVER_TTS) || !window.speechSynthesis;
+}
+
+function getSpeechContext() {
+    if (!serverSpeech.context) {
+        serverSpeech.context = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    if (serverSpeech.context.state === 'suspended') {
+        serverSpeech.context.resume();
+    }
+    return serverSpeech.context;
+}
+
+// Schedule 16-bit PCM to play after everything queued before it
+function schedulePCM(bytes, sampleRate) {
+    const context = getSpeechContext();
+    const pcm = new Int16Array(bytes.buffer, bytes.byteOffset, bytes.byteLength / 2);
+    const buffer = context.createBuffer(1, pcm.length, sampleRate);
+    const channel = buffer.getChannelData(0);
+    for (let i = 0; i < pcm.length; i++) {
+        channel[i] = pcm[i] / 32768;
+    }
+
+    const source = context.createBufferSource();
+    source.buffer = buffer;
+    source.connect(context.destination);
+    const startAt = Math.max(context.currentTime + 0.05, serverSpeech.nextStartTime);
+    source.start(startAt);
+    serverSpeech.nextStartTime = startAt + buffer.duration;
+    serverSpeech.sources.add(source);
+    source.addEventListener('ended', () => serverSpeech.sources.delete(source));
+    return source;
+}
+
+// Schedule a /api/tts response chunk by chunk; returns the last audio source
+async function playSpeechResponse(request, generation) {
+    const response = await request;
+    if (!response.ok) {
+        throw new Error(`Speech request failed with status ${response.status}`);
+    }
+    const sampleRate = parseInt(response.headers.get('X-Sample-Rate'), 10) || 22050;
+    const reader = response.body.getReader();
+    let carry = null;
+    let lastSource = null;
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done || generation !== serverSpeech.generation) {
+            break;
+        }
+        // Chunks may split a sample; keep the odd byte for the next chunk
+        let bytes = value;
+        if (carry) {
+            bytes = new Uint8Array(carry.length + value.length);
+            bytes.set(carry);
+            bytes.set(value, carry.length);
+        }
+        const even = bytes.length - (bytes.length % 2);
+        carry = even < bytes.length ? bytes.slice(even) : null;
+        if (even) {
+            lastSource = schedulePCM(bytes.slice(0, even), sampleRate);
+            markSpeechStarted();
+        }
+    }
+    return lastSource;
+}
+
+// Longest text sent as a GET /api/tts query (longer text is POSTed)
+const MAX_TTS_GET_CHARS = 1000;
+
+// Queue one sentence (or a whole reply) for server speech
+function speakSentenceOnServer(text) {
+    const generation = serverSpeech.generation;
+    const controller = new AbortController();
+    serverSpeech.controllers.add(controller);
+
+    // Request right away so synthesis overlaps with earlier sentences playing.
+    // Short text goes in the URL so the browser can cache repeated phrases.
+    const request = text.length <= MAX_TTS_GET_CHARS
+        ? fetch('/api/tts?' + new URLSearchParams({ text, format: 'pcm' }), { signal: controller.signal })
+        : fetch('/api/tts', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ text, format: 'pcm' }),
+            signal: controller.signal
+        });
+
+    speechQueue.pending += 1;
+    currentSpeechSynthesis = request;
+    document.getElementById('stopButton').disabled = false;
+
+    const onDone = () => {
+        serverSpeech.controllers.delete(controller);
+        if (generation !== serverSpeech.generation) {
+            return;
+        }
+        speechQueue.pending = Math.max(0, speechQueue.pending - 1);
+        checkSpeechQueueEnded();
+    };
+
+    // Responses are read in order, so sentences never overtake each other
+    serverSpeech.chain = serverSpeech.chain
+        .then(() => playSpeechResponse(request, generation))
+        .then((lastSource) => {
+            if (lastSource) {
+                lastSource.addEventListener('ended', onDone);
+            } else {
+                onDone();
+            }
+        })
+        .catch((error) => {
+            if (error.name !== 'AbortError') {
+                console.error('Server speech error:', error);
+            }
+            onDone();
+        });
+    return true;
+}
+
+// Cancel server speech requests and silence queued audio
+function stopServerSpeech() {
+    serverSpeech.generation += 1;
+    serverSpeech.controllers.forEach((controller) => controller.abort());
+    serverSpeech.controllers.clear();
+    serverSpeech.sources.forEach((source) => source.stop());
+    serverSpeech.sources.clear();
+    serverSpeech.nextStartTime = 0;
+}
+
+// Queue one sentence for speaking without interrupting earlier sentences
+function speakSentence(text) {
+    if (!text) {
+        return false;
+    }
+    if (useServerSpeech()) {
+        return speakSentenceOnServer(text);
+    }
+
+    const utterance = new SpeechSynthesisUtterance(text);
+    const voice = selectVoice();
+    if (voice) {
+        utterance.voice = voice;
+    }
+    utterance.rate = 1.0;
+    utterance.pitch = 1.0;
+
+    speechQueue.pending += 1;
+    currentSpeechSynthesis = utterance;
+    document.getElementById('stopButton').disabled = false;
+
+    utterance.onstart = markSpeechStarted;
+
+    const onDone = () => {
+        speechQueue.pending = Math.max(0, speechQueue.pending - 1);
+        checkSpeechQueueEnded();
+    };
+    utterance.onend = onDone;
+    utterance.onerror = onDone;
+
+    window.speechSynthesis.speak(utterance);
+    return true;
+}
+
+// Mark the sentence queue as complete (no more sentences will be added)
+function finishSpeechQueue() {
+    speechQueue.finished = true;
+    if (!speechQueue.started && speechQueue.pending === 0) {
+        // Nothing was spoken, still let the app resume listening
+        speechQueue.started = true;
+    }
+    checkSpeechQueueEnded();
+}
+
 // Function to stop speech
 function stopSpeech() {
     console.info('Stopping speech');
     
-    if (window.speechSynthesis) {
+    // Stop generating the rest of the reply on the server
+    abortChatRequest();
+    
+    const speaking = Boolean(window.speechSynthesis) || serverSpeech.context !== null;
+    stopServerSpeech();
+    
+    if (speaking) {
         // Cancel all speech
-        window.speechSynthesis.cancel();
+        if (window.speechSynthesis) {
+            window.speechSynthesis.cancel();
+        }
         
-        // Reset the current speech
+        // Reset the current speech and the sentence queue
         currentSpeechSynthesis = null;
+        speechQueue.pending = 0;
+        speechQueue.started = false;
+        speechQueue.finished = false;
         
         // Disable the stop button
         document.getElementById('stopButton').disabled = true;
@@ -329,6 +690,10 @@ async function initSpeechSynthesis() {
 // Export the functions (used by app.js)
 window.testAPI = testAPI;
 window.sendMessage = sendMessage;
+window.streamMessage = streamMessage;
+window.resetConversation = resetConversation;
 window.textToSpeech = textToSpeech;
 window.stopSpeech = stopSpeech;
+window.speakSentence = speakSentence;
+window.finishSpeechQueue = finishSpeechQueue;
 window.initSpeechSynthesis = initSpeechSynthesis;
\ No newline at end of file
@@ -179,6 +179,7 @@ const appState = {
     isListening: false,
     isProcessingReply: false,
     avatarState: 'idle', // idle, listening, thinking, speaking
+    speechStopped: false,
     messages: []
 };
 
@@ -287,6 +288,7 @@ function initSpeechEvents() {
     // Listen for speech manually stopped event
     document.addEventListener('speechStopped', () => {
         log('info', 'Speech manually stopped');
+        appState.speechStopped = true;
         log('info', 'Avatar state changed to: idle');
         setAvatarState('idle');
         
@@ -333,6 +335,12 @@ async function processUserInput(text) {
             ...appState.messages
         ];
         
+        // Stream the bot response, speaking each sentence as soon as it arrives
+        if (typeof streamMessage === 'function') {
+            await processStreamedResponse(messages);
+            return;
+        }
+        
         // Get bot response
         const botResponse = await sendMessage(messages);
         log('info', `Bot response: "${botResponse.substring(0, 30)}..."`);
@@ -355,6 +363,68 @@ async function processUserInput(text) {
     }
 }
 
+// Stream the bot's response and speak it sentence by sentence
+async function processStreamedResponse(messages) {
+    let messageContent = null;
+    appState.speechStopped = false;
+    
+    try {
+        const botResponse = await streamMessage(messages, {
+            onToken: (token) => {
+                // Create the bot message bubble on the first token
+                if (!messageContent) {
+                    messageContent = createBotMessageElement();
+                }
+                messageContent.textContent += token;
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            },
+            onSentence: (sentence) => {
+                if (appState.speechStopped) {
+                    return;
+                }
+                setAvatarState('speaking');
+                speakSentence(sentence);
+            }
+        });
+        
+        log('info', `Bot response: "${botResponse.substring(0, 30)}..."`);
+        
+        // Keep the final text in the state (and UI, if no token was rendered)
+        appState.messages.push({
+            role: 'assistant',
+            content: botResponse
+        });
+        if (!messageContent) {
+            messageContent = createBotMessageElement();
+        }
+        messageContent.textContent = botResponse;
+        
+    } catch (error) {
+        if (error.name === 'AbortError') {
+            log('info', 'Response stream cancelled');
+            return;
+        }
+        log('error', `Error streaming response: ${error.message}`);
+        if (!messageContent) {
+            addBotMessage("I'm sorry, I couldn't process your request. Please try again.");
+        }
+    } finally {
+        appState.isProcessingReply = false;
+        
+        // Speech events resume listening once the last sentence is spoken
+        finishSpeechQueue();
+    }
+}
+
+// Create an empty bot message element and return its content node
+function createBotMessageElement() {
+    const messageElement = document.createElement('div');
+    messageElement.className = 'message assistant';
+    messageElement.innerHTML = '<div class="message-content"></div>';
+    messagesContainer.appendChild(messageElement);
+    return messageElement.querySelector('.message-content');
+}
+
 // Process the bot's response
 async function processBotResponse(response) {
     try {
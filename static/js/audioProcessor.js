@@ -225,19 +225,204 @@ let recognition;
 let recognitionCallback;
 let isRecognitionSupported = false;
 
+// Streaming recognition on the server, used where the browser has no Web Speech API
+const STREAM_SAMPLE_RATE = 16000;
+const STREAM_SPEECH_LEVEL = 0.01; // RMS level treated as speech
+const STREAM_SILENCE_MS = 1200; // Silence after speech that ends the utterance
+const STREAM_NO_SPEECH_MS = 8000; // Give up if nothing is said
+
+// Average float samples down to the target rate as 16-bit PCM
+function downsampleToPCM16(samples, fromRate, toRate) {
+    const ratio = Math.max(1, fromRate / toRate);
+    const length = Math.floor(samples.length / ratio);
+    const pcm = new Int16Array(length);
+    for (let i = 0; i < length; i++) {
+        const start = Math.floor(i * ratio);
+        const end = Math.min(samples.length, Math.floor((i + 1) * ratio));
+        let sum = 0;
+        for (let j = start; j < end; j++) {
+            sum += samples[j];
+        }
+        const value = Math.max(-1, Math.min(1, sum / (end - start)));
+        pcm[i] = value < 0 ? value * 0x8000 : value * 0x7fff;
+    }
+    return pcm;
+}
+
+// Streams microphone audio to /api/speech/stream; behaves like a
+// non-continuous SpeechRecognition (one utterance per start())
+class ServerSpeechRecognition {
+    constructor() {
+        this.onstart = null;
+        this.onresult = null;
+        this.onerror = null;
+        this.onend = null;
+        this.active = false;
+    }
+
+    start() {
+        if (this.active) {
+            throw new Error('Recognition already started');
+        }
+        this.active = true;
+        this.ending = false;
+        this._connect();
+    }
+
+    async _connect() {
+        try {
+            this.stream = await navigator.mediaDevices.getUserMedia({ audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true } });
+        } catch (error) {
+            this._fail('not-allowed');
+            return;
+        }
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        this.socket = new WebSocket(`${protocol}//${window.location.host}/api/speech/stream`);
+        this.socket.binaryType = 'arraybuffer';
+        this.socket.onopen = () => {
+            this.socket.send(JSON.stringify({ type: 'start', sample_rate: STREAM_SAMPLE_RATE }));
+            this._startCapture();
+        };
+        this.socket.onmessage = (event) => this._handleMessage(JSON.parse(event.data));
+        this.socket.onerror = () => this._fail('network');
+        this.socket.onclose = () => this._finish();
+    }
+
+    stop() {
+        if (this.active && !this.ending) {
+            this._endUtterance();
+        }
+    }
+
+    _startCapture() {
+        this.context = new (window.AudioContext || window.webkitAudioContext)();
+        const source = this.context.createMediaStreamSource(this.stream);
+        this.processor = this.context.createScriptProcessor(4096, 1, 1);
+        this.processor.onaudioprocess = (event) => this._processAudio(event.inputBuffer.getChannelData(0));
+        source.connect(this.processor);
+        this.processor.connect(this.context.destination);
+        this.heardSpeech = false;
+        this.startedAt = this.lastSpeechAt = performance.now();
+        if (this.onstart) {
+            this.onstart();
+        }
+    }
+
+    _stopCapture() {
+        if (this.processor) {
+            this.processor.disconnect();
+            this.processor = null;
+        }
+        if (this.context) {
+            this.context.close();
+            this.context = null;
+        }
+        if (this.stream) {
+            this.stream.getTracks().forEach((track) => track.stop());
+            this.stream = null;
+        }
+    }
+
+    _processAudio(samples) {
+        if (this.ending || !this.socket || this.socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        this.socket.send(downsampleToPCM16(samples, this.context.sampleRate, STREAM_SAMPLE_RATE).buffer);
+
+        // End the utterance after a pause (simple energy-based detection)
+        let energy = 0;
+        for (let i = 0; i < samples.length; i++) {
+            energy += samples[i] * samples[i];
+        }
+        const now = performance.now();
+        if (Math.sqrt(energy / samples.length) >= STREAM_SPEECH_LEVEL) {
+            this.heardSpeech = true;
+            this.lastSpeechAt = now;
+        }
+        if (this.heardSpeech && now - this.lastSpeechAt > STREAM_SILENCE_MS) {
+            this._endUtterance();
+        } else if (!this.heardSpeech && now - this.startedAt > STREAM_NO_SPEECH_MS) {
+            this._fail('no-speech');
+        }
+    }
+
+    _endUtterance() {
+        this.ending = true;
+        this._stopCapture();
+        if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+            // The final transcript arrives before the socket is closed
+            this.socket.send(JSON.stringify({ type: 'end' }));
+        } else {
+            this._close();
+        }
+    }
+
+    _handleMessage(message) {
+        if (message.type === 'partial') {
+            document.dispatchEvent(new CustomEvent('recognitionPartial', { detail: message.text }));
+        } else if (message.type === 'final') {
+            const transcript = message.text.trim();
+            if (transcript && this.onresult) {
+                this.onresult({ results: [[{ transcript }]] });
+            }
+            if (this.ending) {
+                this._close();
+            }
+        } else if (message.type === 'error') {
+            console.error('Server recognition error:', message.detail);
+            this._fail('network');
+        }
+    }
+
+    _fail(error) {
+        if (!this.active) {
+            return;
+        }
+        if (this.onerror) {
+            this.onerror({ error });
+        }
+        this._close();
+    }
+
+    _close() {
+        this.ending = true;
+        this._stopCapture();
+        if (this.socket && this.socket.readyState <= WebSocket.OPEN) {
+            this.socket.close();
+        } else {
+            this._finish();
+        }
+    }
+
+    _finish() {
+        if (!this.active) {
+            return;
+        }
+        this._stopCapture();
+        this.active = false;
+        this.socket = null;
+        if (this.onend) {
+            this.onend();
+        }
+    }
+}
+
 // Initialize speech recognition
 function setupSpeechRecognition(callback) {
     return new Promise((resolve) => {
         try {
-            // Check if the browser supports speech recognition
-            if (!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) {
-                console.error('Speech recognition not supported in this browser');
-                resolve(false);
-                return;
+            // Use the browser's speech recognition if it has one, otherwise stream to the server
+            let SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
+            if (!SpeechRecognition || window.USE_SERVER_SPEECH_RECOGNITION) {
+                if (!window.WebSocket || !navigator.mediaDevices) {
+                    console.error('Speech recognition not supported in this browser');
+                    resolve(false);
+                    return;
+                }
+                console.info('Using server speech recognition');
+                SpeechRecognition = ServerSpeechRecognition;
             }
-            
-            // Create a new SpeechRecognition instance
-            const SpeechRecognition = window.SpeechRecognition || window.webkitSpeechRecognition;
             recognition = new SpeechRecognition();
             
             // Configure speech recognition